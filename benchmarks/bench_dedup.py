@@ -0,0 +1,77 @@
+"""Near-duplicate detection (dedup.py): accuracy and cost on synthetic meeting threads.
+
+Each conversation is an original summary followed by replies (a few new lines
+on top of the quoted original, as mail clients send them) and forwards (the
+original under forwarded-message headers). Everything goes through one
+SimHashIndex, oldest first, and the run reports how many messages collapse
+onto their conversation's original, how many unrelated messages were wrongly
+merged, and what fingerprinting and index lookups cost per message, so the
+work left for MCP2 (analysis + enrichment) scales with conversations, not messages.
+
+Usage: python benchmarks/bench_dedup.py [conversations] [replies_per_conversation] [words_per_original]
+"""
+import os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp_common'))
+
+from mcp_common.dedup import SimHashIndex, simhash
+
+VOCABULARY = [f"w{i}" for i in range(5000)]
+
+
+def sentence(rng, n=14):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(n)).capitalize() + "."
+
+
+def make_threads(conversations, replies, words, seed=0):
+    """[(key, conversation, text)] in send order: every original, then its replies / forwards."""
+    rng = random.Random(seed)
+    messages = []
+    for c in range(conversations):
+        original = "\n".join(sentence(rng) for _ in range(max(1, words // 14)))
+        messages.append((f"c{c}-0", c, original))
+        for r in range(1, replies + 1):
+            if r % 3 == 0:
+                text = (f"FYI\n---------- Forwarded message ---------\nFrom: Alice <alice@example.com>\n"
+                        f"Subject: Meeting summary {c}\n\n{original}")
+            else:
+                new = "\n".join(sentence(rng, rng.randint(4, 14)) for _ in range(rng.randint(1, 2)))
+                quoted = "\n".join("> " + line for line in original.splitlines())
+                text = f"{new}\n\nOn Mon, Jan 6, 2025 at 10:00 Alice <alice@example.com> wrote:\n{quoted}"
+            messages.append((f"c{c}-{r}", c, text))
+    return messages
+
+
+if __name__ == '__main__':
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    replies = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    words = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    messages = make_threads(conversations, replies, words)
+    print(f"{conversations} conversations x (1 original + {replies} replies/forwards), ~{words} words each "
+          f"-> {len(messages)} messages")
+
+    start = time.perf_counter()
+    fingerprints = [simhash(text) for _, _, text in messages]
+    fingerprint_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimHashIndex(os.path.join(tmp, 'dedup.sqlite3'))
+        owner = {}   # canonical key -> conversation it was first seen in
+        collapsed = wrong = 0
+        start = time.perf_counter()
+        for (key, conversation, _), fp in zip(messages, fingerprints):
+            canonical = index.canonical_for(key, fp)
+            owner.setdefault(canonical, conversation)
+            if canonical != key:
+                collapsed += 1
+                wrong += owner[canonical] != conversation
+        lookup_s = time.perf_counter() - start
+        stats = index.stats()
+
+    duplicates = len(messages) - conversations
+    print(f"fingerprint     {fingerprint_s / len(messages) * 1e3:8.3f} ms/message")
+    print(f"index lookup    {lookup_s / len(messages) * 1e3:8.3f} ms/message (insert included, {len(messages)} stored)")
+    print(f"collapsed       {collapsed} of {duplicates} replies/forwards ({collapsed / max(duplicates, 1):.1%}), "
+          f"{wrong} merged into the wrong conversation")
+    print(f"to summarize    {stats['distinct']} distinct of {stats['messages']} messages "
+          f"({stats['messages'] / max(stats['distinct'], 1):.1f}x fewer analyses / enrichments)")
@@ -0,0 +1,32 @@
+"""Compare serial, pooled and batched message fetching against the fake Gmail service.
+
+Usage: python benchmarks/bench_fetch.py [n_messages] [latency_seconds]
+"""
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp1_gmail_extractor'))
+
+from fake_gmail import FakeGmailService
+from gmail_fetch import list_message_ids, fetch_messages
+
+
+def serial(service, ids):
+    return [service.users().messages().get(userId='me', id=i, format='full').execute() for i in ids]
+
+
+def run(label, service, fetch, n):
+    start = time.perf_counter()
+    ids = list_message_ids(service, 'subject:meeting', n)
+    messages = fetch(service, ids)
+    elapsed = time.perf_counter() - start
+    assert [m['id'] for m in messages] == ids, "results out of order"
+    print(f"{label:<8} {len(messages):>5} msgs  {elapsed * 1000:8.1f} ms  "
+          f"round-trips={service.round_trips:<4} calls={dict(service.calls)}")
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    run('serial', FakeGmailService(n, latency), serial, n)
+    run('pooled', FakeGmailService(n, latency, batch=False), fetch_messages, n)
+    run('batched', FakeGmailService(n, latency), fetch_messages, n)
@@ -0,0 +1,84 @@
+"""Single-pass MIME walker vs. the old three-pass parsing, on large synthetic messages.
+
+The legacy path is reproduced here as it was in mcp1_server.py: a recursive
+text/plain search, then two more top-level scans of payload.parts to classify
+attachments (which also misses nested ones).
+
+Usage: python benchmarks/bench_mime.py [n_messages] [body_kb] [attachments] [attachment_kb]
+"""
+import base64, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp1_gmail_extractor'))
+
+from fake_gmail import make_message
+from mime import walk_payload
+
+WORD = ["application/msword", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
+
+
+def _subfolder(part):
+    if part.get('mimeType', '').startswith("image/"):
+        return "image"
+    elif part.get('mimeType', '') == "application/pdf":
+        return "pdf"
+    elif part.get('mimeType', '') in WORD:
+        return "word"
+    return "misc"
+
+
+def legacy(msg_data):
+    def find_text_part(parts_list):
+        for part in parts_list:
+            if part.get('mimeType') == 'text/plain':
+                return part['body'].get('data')
+            if part.get('parts'):
+                result = find_text_part(part['parts'])
+                if result:
+                    return result
+        return None
+
+    parts = msg_data['payload'].get('parts', [])
+    body_data = find_text_part(parts) or msg_data['payload']['body'].get('data')
+    body = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='ignore') if body_data else ""
+    downloads = [(part, _subfolder(part)) for part in parts]                        # download pass
+    attachments = [(part['filename'], _subfolder(part)) for part in parts if part.get('filename')]  # metadata pass
+    return body, downloads, attachments
+
+
+def single_pass(msg_data):
+    mime_parts = walk_payload(msg_data['payload'])
+    return mime_parts.body(), mime_parts.attachment_parts, mime_parts.attachments()
+
+
+def manifest_only(msg_data):
+    # callers that only need the attachment list never pay for the body decode
+    return walk_payload(msg_data['payload']).attachments()
+
+
+def run(label, fn, corpus, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in corpus:
+            fn(msg)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<12} {best * 1e3:9.2f} ms for {len(corpus)} msgs  ({best / len(corpus) * 1e6:7.1f} us/msg)")
+    return best
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    body_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    n_att = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+    att_kb = int(sys.argv[4]) if len(sys.argv) > 4 else 256
+    mix = ['application/pdf', 'image/png', WORD[1], 'text/csv']
+    attachments = [(mix[k % len(mix)], att_kb * 1024, k) for k in range(n_att)]
+    corpus = [make_message(i, body_kb * 1024, attachments, inline=True, nest_depth=i % 2) for i in range(n)]
+
+    nested = [m for i, m in enumerate(corpus) if i % 2 == 1]
+    print(f"legacy sees {len(legacy(nested[0])[2])} attachments in a nested message, "
+          f"walker sees {len(single_pass(nested[0])[2])}")
+    legacy_t = run('legacy', legacy, corpus)
+    walker_t = run('single-pass', single_pass, corpus)
+    manifest_t = run('manifest', manifest_only, corpus)
+    print(f"full parse x{legacy_t / walker_t:.2f}, manifest only x{legacy_t / manifest_t:.2f} vs legacy")
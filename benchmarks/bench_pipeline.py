@@ -0,0 +1,257 @@
+"""End-to-end benchmark of the extract -> summarize pipeline, fully offline.
+
+Builds a throwaway workspace (resources/, secrets/ and a far-future token) in a
+temp dir, then:
+  - imports MCP1 in-process with its Gmail service replaced by FakeGmailService
+    (synthetic multipart mail: --messages, --body-size, --attachments mix, --gmail-latency)
+    behind the real GmailServiceHolder + rate limiter;
+  - starts MCP2 under uvicorn in a subprocess, with YouTube / CSE pointed at
+    StubGoogleServer (--api-latency).
+Scenarios, each with --concurrency callers:
+  get_email_details        MCP1 tool: list + fetch + parse + attachment download
+  fetch_meeting_summaries  MCP1 tool: --batch messages per call
+  send_to_mcp2             enqueue --messages emails (with their stored attachments) and
+                           time until the job workers have delivered all of them to MCP2
+  app                      POST /tools/summarize_context straight at MCP2's ASGI app
+and reports throughput, p50/p95/p99 latency and peak RSS of both servers.
+The Gmail quota limiter is lifted unless --real-quota, so the numbers track
+the code rather than GMAIL_UNITS_PER_SECOND. Data is deterministic; --json
+writes the report for comparing runs.
+
+Usage: python benchmarks/bench_pipeline.py [--messages 200] [--requests 200] [--concurrency 8] [--json out.json]
+"""
+import argparse, asyncio, datetime, json, os, pickle, resource, shutil, socket, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+MCP1_DIR = os.path.join(REPO_DIR, 'mcp1_gmail_extractor')
+MCP2_DIR = os.path.join(REPO_DIR, 'mcp2_summarizer')
+COMMON_DIR = os.path.join(REPO_DIR, 'mcp_common')  # for an interpreter without the package installed
+sys.path[:0] = [MCP1_DIR, COMMON_DIR]
+
+import requests
+from fake_gmail import FakeGmailService
+from stub_google import StubGoogleServer
+
+ATTACHMENT_TYPES = {'pdf': 'application/pdf', 'png': 'image/png', 'csv': 'text/csv', 'zip': 'application/zip'}
+
+
+class _Ctx:
+    def info(self, *args, **kwargs):
+        pass
+    debug = error = info
+
+
+# ----------------- Measurement -----------------
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def summarize(name, latencies, elapsed, errors, unit='calls'):
+    ordered = sorted(latencies)
+    row = {"scenario": name, "ops": len(latencies), "errors": errors, "seconds": round(elapsed, 3),
+           "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0, "unit": unit,
+           **{f"p{int(q * 100)}_ms": round(percentile(ordered, q) * 1000, 2) for q in (0.5, 0.95, 0.99)}}
+    print(f"{name:<24} {row['ops']:>6} {unit:<6} {row['throughput']:>9.1f}/s  p50 {row['p50_ms']:>8.1f} ms  "
+          f"p95 {row['p95_ms']:>8.1f} ms  p99 {row['p99_ms']:>8.1f} ms  errors={errors}")
+    return row
+
+
+def load(name, fn, n, concurrency):
+    """Call fn(i) for i in range(n) from `concurrency` threads; per-call latencies."""
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            fn(i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(timed, range(n)))
+    elapsed = time.perf_counter() - start
+    failures = [e for _, e in outcomes if e is not None]
+    if failures:
+        print(f"  first error: {failures[0]!r}")
+    return summarize(name, [t for t, e in outcomes if e is None], elapsed, len(failures))
+
+
+def peak_rss_kb(pid):
+    """Sum of VmHWM over `pid` and its descendants (Linux /proc)."""
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next((int(line.split()[1]) for line in f if line.startswith('VmHWM:')), 0)
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return total
+
+
+# ----------------- Workspace -----------------
+def attachment_mix(spec):
+    """'pdf:200000,png:50000' -> per-message (mime_type, size, seed) lists with unique content."""
+    kinds = []
+    for item in filter(None, spec.split(',')):
+        ext, size = item.split(':')
+        kinds.append((ATTACHMENT_TYPES.get(ext, 'application/octet-stream'), int(size), ext))
+    return lambda i: [(mime_type, size, f'{i}-{ext}') for mime_type, size, ext in kinds]
+
+
+def make_workspace(root, api_base):
+    for name in ('resources', 'secrets', 'mcp1', 'mcp2'):
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+    from google.oauth2.credentials import Credentials
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    with open(os.path.join(root, 'secrets', 'token.pickle'), 'wb') as f:
+        pickle.dump(Credentials(token='bench-token', expiry=expiry), f)
+    with open(os.path.join(root, 'secrets', 'mcp2.json'), 'w') as f:
+        json.dump({"YOUTUBE_API_KEY": "bench", "GOOGLE_CX": "bench", "GOOGLE_API_BASE": api_base}, f)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def common_env():
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [COMMON_DIR, os.environ.get('PYTHONPATH')])))
+
+
+def start_mcp2(root, port):
+    # cwd <root>/mcp2 makes MCP2's "../resources" and "../secrets" resolve into the workspace
+    log = open(os.path.join(root, 'mcp2.log'), 'wb')
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'mcp2_server:app', '--port', str(port),
+                             '--app-dir', MCP2_DIR, '--log-level', 'warning'],
+                            cwd=os.path.join(root, 'mcp2'), stdout=log, stderr=subprocess.STDOUT, env=common_env())
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"MCP2 exited early, see {log.name}")
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/metrics', timeout=1).status_code == 200:
+                return proc
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("MCP2 did not start within 60s")
+
+
+def load_mcp1(root, fake, real_quota):
+    os.chdir(os.path.join(root, 'mcp1'))  # MCP1's relative paths resolve into the workspace too
+    import mcp1_server
+    mcp1_server.gmail._build = lambda creds: fake
+    if not real_quota:
+        mcp1_server.gmail_limiter.bucket.rate = mcp1_server.gmail_limiter.bucket.capacity = 1e9
+    return mcp1_server
+
+
+# ----------------- Scenarios -----------------
+def run_send_to_mcp2(mcp1, emails, timeout):
+    ctx = _Ctx()
+    start = time.perf_counter()
+    queued = mcp1.send_to_mcp2({"emails": emails}, ctx)
+    enqueued = time.perf_counter() - start
+    queue = mcp1.get_job_pool().queue
+    while time.perf_counter() - start < timeout:
+        counts = queue.counts()
+        if counts['queued'] == counts['running'] == 0:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    jobs = [queue.get(job_id) for job_id in queued["job_ids"]]
+    latencies = [job['updated_at'] - job['created_at'] for job in jobs if job['status'] == 'done']
+    print(f"  enqueued {len(emails)} emails in {enqueued * 1000:.1f} ms")
+    return summarize('send_to_mcp2', latencies, elapsed, len(jobs) - len(latencies), unit='jobs')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--messages', type=int, default=200, help='messages in the fake mailbox')
+    parser.add_argument('--body-size', type=int, default=4_000, help='bytes of body text per message')
+    parser.add_argument('--attachments', default='pdf:60000,png:40000', help='per-message mix, ext:bytes,...')
+    parser.add_argument('--gmail-latency', type=float, default=0.01, help='seconds per Gmail round-trip')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='seconds per YouTube/CSE request')
+    parser.add_argument('--requests', type=int, default=200, help='calls per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=25, help='max_results for fetch_meeting_summaries')
+    parser.add_argument('--real-quota', action='store_true', help="keep MCP1's Gmail quota limiter")
+    parser.add_argument('--json', help='write the report here')
+    parser.add_argument('--keep', action='store_true', help='keep the temp workspace')
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)  # MCP1 runs with the workspace as cwd
+
+    root = tempfile.mkdtemp(prefix='mcp-bench-')
+    stub = StubGoogleServer(latency=args.api_latency).start()
+    make_workspace(root, stub.base_url)
+    port = free_port()
+    mcp2 = start_mcp2(root, port)
+    mcp2_url = f'http://127.0.0.1:{port}'
+    report = {"config": vars(args), "scenarios": []}
+    try:
+        fake = FakeGmailService(args.messages, latency=args.gmail_latency, body_size=args.body_size,
+                                attachments=attachment_mix(args.attachments))
+        mcp1 = load_mcp1(root, fake, args.real_quota)
+        mcp1.MCP2_BATCH_URL = mcp2_url + '/tools/summarize_batch'
+        ctx = _Ctx()
+        print(f"workspace {root}  messages={args.messages} attachments={args.attachments!r} "
+              f"concurrency={args.concurrency}")
+
+        details = lambda i: asyncio.run(mcp1.get_email_details(ctx))
+        report["scenarios"].append(load('get_email_details', details, args.requests, args.concurrency))
+
+        meetings = lambda i: asyncio.run(mcp1.fetch_meeting_summaries('lead@example.com', ctx,
+                                                                      max_results=args.batch))
+        report["scenarios"].append(load('fetch_meeting_summaries', meetings, args.requests, args.concurrency))
+
+        # every message with its own attachments downloaded, as get_email_details would leave them
+        records = [mcp1.parse_message(fake.messages[m]) for m in fake.message_ids]
+        emails = []
+        for record in records:
+            stored = mcp1.downloader.submit(mcp1.gmail.service, record['message_id'],
+                                            record['attachment_parts']).result()
+            emails.append({"id": record['message_id'], "message_id": record['message_id'],
+                           "subject": record['headers'].get('Subject', ''), "body": record['body'],
+                           "attachments": stored})
+        report["scenarios"].append(run_send_to_mcp2(mcp1, emails, timeout=600))
+
+        session = requests.Session()
+
+        def summarize_context(i):
+            email = emails[i % len(emails)]
+            payload = {"keywords": ["quarterly", "roadmap", f"topic{i % 20}"], "body": email["body"],
+                       "message_id": email["message_id"],
+                       "attachments": [a["relative_path"] for a in email["attachments"] if a.get("relative_path")]}
+            response = session.post(mcp2_url + '/tools/summarize_context', json=payload, timeout=120)
+            response.raise_for_status()
+        report["scenarios"].append(load('app summarize_context', summarize_context, args.requests,
+                                        args.concurrency))
+
+        report["peak_rss_kb"] = {"mcp1": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                 "mcp2": peak_rss_kb(mcp2.pid)}
+        report["stub_requests"] = dict(stub.requests)
+        report["gmail_round_trips"] = fake.round_trips
+        print(f"peak RSS: MCP1 {report['peak_rss_kb']['mcp1'] / 1024:.1f} MiB, "
+              f"MCP2 {report['peak_rss_kb']['mcp2'] / 1024:.1f} MiB (incl. extraction workers)")
+        print(f"Gmail round-trips={fake.round_trips}  stub API requests={report['stub_requests']}")
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        mcp2.terminate()
+        mcp2.wait(10)
+        stub.stop()
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
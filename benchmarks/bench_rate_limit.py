@@ -0,0 +1,135 @@
+"""Gmail rate limiter against a fake service that throttles.
+
+Three scenarios on FakeGmailService:
+  quota     - server-side budget of `quota` units/s, 32 pooled workers (no batching);
+              the limiter is set 25% above it, as if another client shared the quota
+  schedule  - every 7th call / batch sub-request answers 429, batched fetch
+  listing   - paged messages.list + get with a 429 burst on calls 5..9
+Each runs once without the limiter (where the first 429 aborts the fetch)
+and once through GmailRateLimiter.wrap, printing throughput and stats().
+
+Then the limiter's behaviour is checked; the script exits 1 when a check fails:
+every limited run fetches all messages with no failures, a 429 cuts the
+concurrency limit, every batch callback fires exactly once (after its
+sub-request's retries) and Retry-After waits are capped at max_delay.
+
+Usage: python benchmarks/bench_rate_limit.py [n_messages] [quota_units_per_second]
+"""
+import os, sys, time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp1_gmail_extractor'))
+
+from fake_gmail import FakeGmailService, FakeHttpError, every
+from gmail_fetch import fetch_messages, list_message_ids
+from rate_limit import GmailRateLimiter
+
+
+def run(label, service, fn, limiter=None):
+    target = limiter.wrap(service) if limiter else service
+    start = time.perf_counter()
+    n = None
+    try:
+        n = len(fn(target))
+        outcome = f"{n} msgs"
+    except Exception as e:
+        outcome = f"FAILED ({e})"
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed * 1e3:9.1f} ms  {outcome:<28} server-side 429s={service.throttled}")
+    if limiter:
+        stats = limiter.stats()
+        print(f"{'':<22} limit={stats['concurrency_limit']} throttles={stats['throttle_events']} "
+              f"retries={stats['retries']} failures={stats['failures']} "
+              f"bucket_wait={stats['bucket_wait_seconds']}s rate={stats['units_per_second']} u/s")
+    return n
+
+
+failures = []
+
+def check(ok, what):
+    print(f"{'✅' if ok else '❌'} {what}")
+    if not ok:
+        failures.append(what)
+
+
+def check_limited(label, n, expected, service, limiter):
+    stats = limiter.stats()
+    check(n == expected and stats['failures'] == 0 and service.throttled > 0,
+          f"{label}: all {expected} fetched through {service.throttled} server-side 429s "
+          f"(got {n}, failures={stats['failures']})")
+
+
+def check_throttle_cuts_limit():
+    service = FakeGmailService(1, throttle=lambda call_number, method: call_number == 1)
+    limiter = GmailRateLimiter(initial_concurrency=8, base_delay=0.001)
+    limiter.wrap(service).users().messages().get(userId='me', id='msg000000').execute()
+    stats = limiter.stats()
+    check(stats['throttle_events'] == 1 and stats['retries'] == 1 and stats['concurrency_limit'] < 8,
+          f"a 429 cuts the concurrency limit (8 -> {stats['concurrency_limit']}) and is retried")
+
+
+def check_batch_callbacks(n=60):
+    service = FakeGmailService(n, throttle=every(3))
+    limiter = GmailRateLimiter(units_per_second=1e6, burst=1e6, base_delay=0.001)
+    calls, errors = Counter(), []
+
+    def callback(request_id, response, exception):
+        calls[request_id] += 1
+        if exception is not None:
+            errors.append(exception)
+    gmail = limiter.wrap(service)
+    batch = gmail.new_batch_http_request()
+    for i in range(n):
+        batch.add(gmail.users().messages().get(userId='me', id=f'msg{i:06d}'), callback=callback,
+                  request_id=f'msg{i:06d}')
+    batch.execute()
+    check(sorted(calls) == [f'msg{i:06d}' for i in range(n)] and set(calls.values()) == {1} and not errors,
+          f"batch of {n}: each callback fired once, no errors, through {service.throttled} throttled sub-requests")
+
+
+def check_retry_after_cap():
+    limiter = GmailRateLimiter(max_delay=2.0)
+    delay = limiter.backoff(0, FakeHttpError(retry_after=3600))
+    check(delay == 2.0, f"Retry-After: 3600 waits max_delay (got {delay}s)")
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    quota = float(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    ids = [f'msg{i:06d}' for i in range(n)]
+
+    pooled = lambda svc: fetch_messages(svc, ids, max_workers=32)
+    for limited in (False, True):
+        service = FakeGmailService(n, latency=0.01, batch=False, quota_per_second=quota)
+        limiter = GmailRateLimiter(units_per_second=quota * 1.25, burst=quota, max_concurrency=32,
+                                   base_delay=0.05) if limited else None
+        got = run(f"quota {'limited' if limited else 'raw'}", service, pooled, limiter)
+        if limited:
+            quota_result = got, service, limiter
+
+    batched = lambda svc: fetch_messages(svc, ids)
+    for limited in (False, True):
+        service = FakeGmailService(n, latency=0.01, throttle=every(7))
+        limiter = GmailRateLimiter(units_per_second=1e6, burst=1e6, base_delay=0.02) if limited else None
+        got = run(f"schedule {'limited' if limited else 'raw'}", service, batched, limiter)
+        if limited:
+            schedule_result = got, service, limiter
+
+    listing = lambda svc: fetch_messages(svc, list_message_ids(svc, '', n), max_workers=8)
+    for limited in (False, True):
+        service = FakeGmailService(n, latency=0.005, batch=False, throttle=lambda c, m: 5 <= c <= 9)
+        limiter = GmailRateLimiter(units_per_second=1e6, burst=1e6, base_delay=0.02) if limited else None
+        got = run(f"listing {'limited' if limited else 'raw'}", service, listing, limiter)
+        if limited:
+            listing_result = got, service, limiter
+
+    print()
+    # the quota scenario only throttles when the limiter is set above the server's budget
+    for label, (got, service, limiter) in (("quota", quota_result), ("schedule", schedule_result),
+                                           ("listing", listing_result)):
+        check_limited(label, got, n, service, limiter)
+    check_throttle_cuts_limit()
+    check_batch_callbacks()
+    check_retry_after_cap()
+    if failures:
+        sys.exit(1)
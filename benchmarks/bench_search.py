@@ -0,0 +1,76 @@
+"""Lookup latency of the local search index over a large synthetic mailbox.
+
+Builds a throwaway FTS5 index with `n_messages` generated emails (subjects,
+senders, ~80-word bodies, attachment text on every fifth one) spread over two
+years, then times ranked, phrase, prefix, field and date-range queries.
+
+Usage: python benchmarks/bench_search.py [n_messages] [repeats]
+"""
+import os, random, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp_common'))
+
+from mcp_common.search_index import SearchIndex
+
+TOPICS = ["lambda", "dynamodb", "kubernetes", "budget", "hiring", "roadmap", "billing", "migration", "security",
+          "latency", "terraform", "invoice", "onboarding", "quarterly", "incident", "postmortem", "vendor"]
+FILLER = ("the team agreed to follow up next week on open items and share notes with stakeholders before "
+          "the review while owners update tickets dashboards and estimates").split()
+START_MS = 1_672_531_200_000  # 2023-01-01
+SPAN_MS = 2 * 365 * 86_400_000
+
+
+def make_records(n, seed=7):
+    rng = random.Random(seed)
+    for i in range(n):
+        topic = rng.sample(TOPICS, 3)
+        words = [rng.choice(FILLER) for _ in range(70)] + topic * 3 + [f"ticket{i}"]
+        rng.shuffle(words)
+        yield {
+            'message_id': f"m{i:08d}",
+            'internal_date': START_MS + rng.randrange(SPAN_MS),
+            'headers': {'Subject': f"Meeting summary: {topic[0]} {topic[1]}",
+                        'From': f"user{rng.randrange(500)}@example.com", 'To': "team@example.com"},
+            'body': ' '.join(words),
+        }
+
+
+def timed(label, fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        hits = fn()
+        samples.append((time.perf_counter() - start) * 1e3)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<28} p50 {statistics.median(samples):7.2f} ms  p95 {p95:7.2f} ms  ({len(hits)} hits)")
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(os.path.join(tmp, 'search.sqlite3'))
+        start = time.perf_counter()
+        batch = []
+        for record in make_records(n):
+            batch.append(record)
+            if len(batch) == 5000:
+                index.add_records(batch)
+                batch = []
+        index.add_records(batch)
+        index.set_attachment_text((f"m{i:08d}", "invoice total and vendor terms for terraform modules")
+                                  for i in range(0, n, 5))
+        index.optimize()
+        print(f"indexed {index.count()} messages in {time.perf_counter() - start:.1f} s")
+
+        timed("ranked 'lambda'", lambda: index.search('lambda', limit=20), repeats)
+        timed("ranked 'lambda billing'", lambda: index.search('lambda billing', limit=20), repeats)
+        timed("rare 'ticket12345'", lambda: index.search('ticket12345'), repeats)
+        timed("phrase + prefix", lambda: index.search('"meeting summary" post*'), repeats)
+        timed("subject: + from:", lambda: index.search('subject:kubernetes from:user42'), repeats)
+        timed("attachments:vendor", lambda: index.search('attachments:vendor', limit=20), repeats)
+        timed("ranked + 30-day range", lambda: index.search('security', after='2024-03-01',
+                                                           before='2024-03-31'), repeats)
+        timed("date only, newest 20", lambda: index.search(after='2024-06-01'), repeats)
+        timed("by date 'incident'", lambda: index.search('incident', order='date'), repeats)
@@ -0,0 +1,46 @@
+"""Cold vs warm overhead of getting a Gmail service object.
+
+"cold" repeats what the tools used to do on every call (unpickle the token and
+run discovery.build); "warm" goes through the shared GmailServiceHolder. Uses a
+throwaway token with a far-future expiry, so no network access is needed.
+
+Usage: python benchmarks/bench_service.py [iterations]
+"""
+import datetime, os, pickle, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp1_gmail_extractor'))
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from gmail_auth import GmailServiceHolder
+
+
+def cold(token_path):
+    with open(token_path, 'rb') as token_file:
+        creds = pickle.load(token_file)
+    return build('gmail', 'v1', credentials=creds)
+
+
+def timed(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call = (time.perf_counter() - start) / iterations
+    print(f"{label:<6} {per_call * 1e3:9.3f} ms/call")
+    return per_call
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        token_path = os.path.join(tmp, 'token.pickle')
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        with open(token_path, 'wb') as f:
+            pickle.dump(Credentials(token='bench-token', expiry=expiry), f)
+
+        holder = GmailServiceHolder(token_path, None, ['https://www.googleapis.com/auth/gmail.readonly'])
+        holder.service()  # first call pays the build once
+
+        cold_t = timed('cold', lambda: cold(token_path), iterations)
+        warm_t = timed('warm', holder.service, iterations)
+        print(f"speedup x{cold_t / warm_t:,.0f}")
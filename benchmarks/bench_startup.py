@@ -0,0 +1,123 @@
+"""Import time and cold-start time of both servers.
+
+Each measurement runs in a fresh interpreter (cwd = the server's folder, like
+the start commands in the README):
+  framework  - `import mcp.server.fastmcp` alone, the floor neither server can go below
+  import     - `import mcp1_server` / `import mcp2_server`, and which of the heavy
+               libraries (numpy, scipy, PyPDF2, docx, googleapiclient, ...) it pulled in
+  first GET  - MCP2 under uvicorn: process start until GET /metrics answers; the
+               warm-up (topic model, HTTP loop, parser workers) runs after that, and its
+               duration is read back from the warm_up spans on /metrics
+Medians over --runs. The timings are for reading, not gating: on a shared
+machine they swing by more than a server's own import cost. With --check the
+script exits 1 only on the deterministic regressions: a heavy library imported
+at module load (also covered by tests/test_startup_imports.py) or MCP2 never
+answering under uvicorn.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--check]
+"""
+import argparse, json, os, re, socket, statistics, subprocess, sys, tempfile, time
+from urllib.request import urlopen
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVERS = {'mcp1_server': os.path.join(REPO_DIR, 'mcp1_gmail_extractor'),
+           'mcp2_server': os.path.join(REPO_DIR, 'mcp2_summarizer')}
+COMMON_DIR = os.path.join(REPO_DIR, 'mcp_common')  # for an interpreter without the package installed
+DEFERRED = ('numpy', 'scipy', 'PyPDF2', 'docx', 'googleapiclient', 'google_auth_oauthlib',
+            'google.auth.transport.requests', 'requests', 'httplib2')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def common_env():
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [COMMON_DIR, os.environ.get('PYTHONPATH')])))
+
+
+def probe(module, cwd):
+    out = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, deferred=DEFERRED)],
+                         cwd=cwd, capture_output=True, text=True, check=True, env=common_env()).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def median_ms(samples):
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def mcp2_cold_start(timeout=60):
+    """Seconds until MCP2 under uvicorn answers, and the warm-up time it reports once done."""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as root:
+        cwd = os.path.join(root, 'mcp2')  # keeps ../resources and ../secrets inside the temp dir
+        os.makedirs(cwd)
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'mcp2_server:app', '--port', str(port),
+                                 '--app-dir', SERVERS['mcp2_server'], '--log-level', 'warning'],
+                                cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=common_env())
+        try:
+            first_response = None
+            while time.perf_counter() - start < timeout:
+                try:
+                    text = urlopen(f'http://127.0.0.1:{port}/metrics', timeout=1).read().decode()
+                except OSError:
+                    time.sleep(0.02)
+                    continue
+                if first_response is None:
+                    first_response = time.perf_counter() - start
+                steps = re.findall(r'_stage_duration_seconds_sum\{stage="warm_up",step="[^"]+"\} ([0-9.]+)', text)
+                if len(steps) == 4:
+                    return first_response, sum(map(float, steps))
+                time.sleep(0.1)
+            return first_response, None
+        finally:
+            proc.terminate()
+            proc.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='exit 1 on a startup regression')
+    args = parser.parse_args()
+
+    framework = median_ms([probe('mcp.server.fastmcp', REPO_DIR)['seconds'] for _ in range(args.runs)])
+    print(f"{'framework (FastMCP)':<22} {framework:8.1f} ms")
+    failures = []
+    for module, cwd in SERVERS.items():
+        results = [probe(module, cwd) for _ in range(args.runs)]
+        own = median_ms([r['seconds'] for r in results])
+        loaded = sorted({m for r in results for m in r['loaded']})
+        print(f"{'import ' + module:<22} {own:8.1f} ms  (+{own - framework:.1f} ms over framework)  "
+              f"heavy modules at import: {', '.join(loaded) or 'none'}")
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)} at module load")
+
+    starts = [mcp2_cold_start() for _ in range(args.runs)]
+    first = [s for s, _ in starts if s is not None]
+    warm = [w for _, w in starts if w is not None]
+    if first:
+        print(f"{'mcp2 first GET':<22} {median_ms(first):8.1f} ms  (uvicorn spawn -> /metrics answered)")
+    else:
+        failures.append("mcp2 never answered under uvicorn")
+    if warm:
+        print(f"{'mcp2 warm-up':<22} {median_ms(warm):8.1f} ms  (background, after the port is serving)")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
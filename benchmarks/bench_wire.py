@@ -0,0 +1,128 @@
+"""MCP1 -> MCP2 hand-off cost: the old JSON path vs. wire.py, on a synthetic digest.
+
+The legacy path is reproduced as it was: MCP1 posts `json=` with attachment
+paths, MCP2 accumulates the body with `body += chunk`, `json.loads`es the decoded
+text and answers with `json.dumps(ensure_ascii=False)`. The wire.py variants use
+content-hash attachment refs, the preallocated body reader of mcp2_server and
+every format / encoding installed here (orjson backs JSON when available;
+msgpack and zstandard are skipped when missing). Per variant: bytes on the wire
+for the request and the response, and the CPU time of encode + read + decode on
+both sides (no network, so compression shows its CPU cost, not its transfer win).
+
+Usage: python benchmarks/bench_wire.py [emails] [body_kb] [attachments_per_email] [chunk_kb]
+"""
+import asyncio, hashlib, json, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp2_summarizer'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mcp_common'))
+
+from mcp_common import wire
+from mcp2_server import _read_body  # the server defers its heavy imports, so this is cheap
+
+WORDS = ("quarterly review lambda migration budget customer release rollout incident latency "
+         "storage invoice roadmap hiring sprint retro dashboard alerting capacity vendor").split()
+
+
+def make_digest(n_emails, body_kb, n_attachments, seed=0):
+    rng = random.Random(seed)
+    emails = []
+    for i in range(n_emails):
+        body = " ".join(rng.choice(WORDS) for _ in range(body_kb * 1024 // 7))[:body_kb * 1024]
+        attachments = []
+        for k in range(n_attachments):
+            sha = hashlib.sha256(f"{i}-{k}".encode()).hexdigest()
+            attachments.append({"filename": f"report-{k}.pdf", "sha256": sha,
+                                "relative_path": os.path.join("blobs", sha[:2], sha + ".pdf")})
+        emails.append({"id": f"id-{i}", "message_id": f"m{i:08x}", "subject": f"Meeting summary: {rng.choice(WORDS)} ✓",
+                       "from": "alice@example.com", "to": "team@example.com", "body": body,
+                       "attachments": attachments})
+    return emails
+
+
+def make_results(emails):
+    return {"status": "success", "result": {"results": [
+        {"id": e["id"], "message_id": e["message_id"], "subject": e["subject"],
+         "summary": "🧩 Summary based on keywords: " + e["body"][:2000], "keywords": WORDS[:5],
+         "topics": WORDS[:8], "key_sentences": [e["body"][:200]] * 3,
+         "attachments": [a["relative_path"] for a in e["attachments"]],
+         "youtube_videos": [{"title": w, "url": f"https://youtu.be/{w}"} for w in WORDS[:3]],
+         "web_resources": [{"title": w, "url": f"https://example.com/{w}"} for w in WORDS[:3]]}
+        for e in emails]}}
+
+
+def chunked(body, chunk_size):
+    return [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+
+
+# ----------------- Reading the request body -----------------
+async def read_legacy(chunks):
+    body = b""
+    for chunk in chunks:
+        body += chunk
+    return body
+
+
+async def read_preallocated(chunks, content_length):
+    messages = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+    return await _read_body(receive, content_length, max_size=1 << 40)
+
+
+# ----------------- The two paths -----------------
+def legacy_roundtrip(emails, results, chunk_size):
+    # MCP1
+    payload = {"emails": [dict(e, attachments=[a["relative_path"] for a in e["attachments"]]) for e in emails]}
+    request = json.dumps(payload).encode("utf-8")   # what requests does for json=
+    # MCP2
+    body = asyncio.run(read_legacy(chunked(request, chunk_size)))
+    json.loads(body.decode("utf-8"))
+    response = json.dumps(results, ensure_ascii=False).encode("utf-8")
+    # MCP1
+    json.loads(response)
+    return len(request), len(response)
+
+
+def wire_roundtrip(emails, results, chunk_size, content_type, encoding):
+    # MCP1
+    payload = {"emails": [dict(e, attachments=[wire.attachment_ref(a) for a in e["attachments"]]) for e in emails]}
+    request, headers = wire.pack(payload, content_type, encoding)
+    # MCP2
+    body = asyncio.run(read_preallocated(chunked(request, chunk_size), len(request)))
+    received = wire.unpack(body, headers["Content-Type"], headers.get("Content-Encoding"))
+    [wire.attachment_path(ref) for e in received["emails"] for ref in e["attachments"]]
+    response, response_headers = wire.pack(results, content_type, encoding)
+    # MCP1
+    wire.unpack(response, response_headers["Content-Type"], response_headers.get("Content-Encoding"))
+    return len(request), len(response)
+
+
+def run(label, fn, repeat=5):
+    best, sizes = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sizes = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {best * 1e3:9.2f} ms   request {sizes[0] / 1024:9.1f} KiB   response {sizes[1] / 1024:9.1f} KiB")
+    return best
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    body_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    n_att = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    chunk_kb = int(sys.argv[4]) if len(sys.argv) > 4 else 64
+    emails = make_digest(n, body_kb, n_att)
+    results = make_results(emails)
+    chunk_size = chunk_kb * 1024
+    print(f"{n} emails x {body_kb} KiB body, {n_att} attachments each, {chunk_kb} KiB ASGI chunks; "
+          f"orjson={'yes' if wire.orjson else 'no'} msgpack={'yes' if wire.msgpack else 'no'} "
+          f"zstandard={'yes' if wire.zstandard else 'no'}")
+
+    baseline = run("legacy json", lambda: legacy_roundtrip(emails, results, chunk_size))
+    for content_type in wire.formats()[::-1]:
+        for encoding in [None, *wire.encodings()[::-1]]:
+            label = f"{content_type.split('/')[1]}{' + ' + encoding if encoding else ''}"
+            took = run(label, lambda: wire_roundtrip(emails, results, chunk_size, content_type, encoding))
+            print(f"{'':<28} {baseline / took:9.2f}x vs legacy")
@@ -0,0 +1,300 @@
+"""In-process stand-in for the googleapiclient Gmail service.
+
+Implements just enough of `users().messages()` and `new_batch_http_request`
+for the MCP1 fetch code, counts every round-trip and sleeps `latency` seconds
+per round-trip so batching/concurrency gains show up in wall-clock time.
+
+Throttling can be scripted with `throttle(call_number, method) -> bool` (e.g.
+`every(7)`), or modelled with `quota_per_second`, a server-side budget in
+Gmail quota units; throttled calls and batch sub-requests raise FakeHttpError
+429 like the real API.
+
+`attachments` is a list of (mime_type, size, seed) for every message, or a
+function of the message number returning one, for a mixed mailbox. PDF
+attachments are small but valid PDFs (real text pages), so MCP2's
+extractor has genuine parsing work to do; other types are filler bytes.
+"""
+import base64, random, threading, time
+from collections import Counter
+
+
+QUOTA_COSTS = {'messages.list': 5, 'messages.get': 5, 'attachments.get': 5, 'history.list': 2, 'getProfile': 1}
+
+
+class _Response(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient.errors.HttpError: `.resp.status` and a JSON `.content`."""
+    def __init__(self, status=429, reason='rateLimitExceeded', retry_after=None):
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.resp = _Response(status, headers)
+        self.content = ('{"error": {"code": %d, "errors": [{"reason": "%s"}]}}' % (status, reason)).encode()
+        super().__init__(f"<HttpError {status} {reason}>")
+
+
+def every(n):
+    """Throttle schedule: every n-th counted call fails."""
+    return lambda call_number, method: call_number % n == 0
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+PDF_WORDS = ("budget", "review", "quarterly", "roadmap", "lambda", "latency", "migration", "customer",
+             "release", "incident", "forecast", "hiring", "security", "pipeline", "retention", "pricing")
+
+
+def make_pdf(seed, size):
+    """A valid PDF of roughly `size` bytes whose pages hold deterministic text for `seed`."""
+    rng = random.Random(str(seed))
+    lines = [f"Attachment {seed}: " + " ".join(rng.choice(PDF_WORDS) for _ in range(10)) + "."
+             for _ in range(max(1, size // 112))]
+    pages = [lines[k:k + 40] for k in range(0, len(lines), 40)]
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        stream = "BT /F1 9 Tf 11 TL 36 800 Td " + " ".join(
+            "(" + row.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '" for row in page) + " ET"
+        data = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref)
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_message(i, body_size=2_000, attachments=(), inline=False, nest_depth=0):
+    """Synthetic multipart message.
+
+    The body is a multipart/alternative (text/plain + text/html) followed by
+    `attachments`, a list of (mime_type, size_bytes, seed); equal seeds give
+    identical content. Attachments are fetched via attachmentId unless `inline`,
+    and are wrapped in `nest_depth` levels of multipart/mixed.
+    """
+    body = (f"Meeting summary #{i}. " * (body_size // 20 + 1))[:body_size]
+    html_body = f"<html><body><p>{body}</p></body></html>"
+    msg = {
+        'id': f'msg{i:06d}',
+        'threadId': f'thr{i:06d}',
+        'internalDate': str(1_760_000_000_000 - i * 60_000),  # listed newest first, like Gmail
+        'payload': {
+            'mimeType': 'multipart/mixed',
+            'headers': [
+                {'name': 'Subject', 'value': f'Meeting summary {i}'},
+                {'name': 'From', 'value': 'lead@example.com'},
+                {'name': 'To', 'value': 'team@example.com'},
+                {'name': 'Date', 'value': 'Mon, 6 Oct 2025 10:00:00 +0000'},
+            ],
+            'body': {'size': 0},
+            'parts': [{'partId': '0', 'mimeType': 'multipart/alternative', 'filename': '', 'body': {'size': 0},
+                       'parts': [
+                           {'partId': '0.0', 'mimeType': 'text/plain', 'filename': '',
+                            'body': {'size': len(body), 'data': _b64(body.encode())}},
+                           {'partId': '0.1', 'mimeType': 'text/html', 'filename': '',
+                            'body': {'size': len(html_body), 'data': _b64(html_body.encode())}},
+                       ]}],
+        },
+    }
+    container = msg['payload']['parts']
+    for depth in range(nest_depth):
+        nested = {'partId': f'n{depth}', 'mimeType': 'multipart/mixed', 'filename': '', 'body': {'size': 0}, 'parts': []}
+        container.append(nested)
+        container = nested['parts']
+    ext = {'application/pdf': '.pdf', 'image/png': '.png'}
+    for n, (mime_type, size, seed) in enumerate(attachments, start=1):
+        if mime_type == 'application/pdf':
+            raw = make_pdf(seed, size)
+        else:
+            raw = (f"attachment-{seed}|".encode() * (size // 12 + 1))[:size]
+        size, content = len(raw), _b64(raw)
+        part = {'partId': str(n), 'mimeType': mime_type,
+                'filename': f'file{n}{ext.get(mime_type, ".bin")}',
+                'body': {'size': size, 'data': content} if inline else
+                        {'size': size, 'attachmentId': f'{msg["id"]}-att{n}'}}
+        part['_content'] = content
+        container.append(part)
+    return msg
+
+
+class _Request:
+    def __init__(self, service, method, fn):
+        self._service, self.method, self._fn = service, method, fn
+
+    def execute(self):
+        self._service._round_trip(self.method)
+        self._service._maybe_throttle(self.method)
+        return self._fn()
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self._service, self._callback, self._requests = service, callback, []
+
+    def add(self, request, request_id=None, callback=None):
+        self._requests.append((request_id or str(len(self._requests)), request, callback))
+
+    def execute(self):
+        self._service._round_trip('batch')
+        for request_id, request, callback in self._requests:
+            self._service._count(request.method)
+            try:
+                self._service._maybe_throttle(request.method)
+                response, exception = request._fn(), None
+            except Exception as e:
+                response, exception = None, e
+            (callback or self._callback)(request_id, response, exception)
+
+
+class _Messages:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId, q=None, maxResults=100, pageToken=None):
+        def run():
+            ids = self._service.message_ids
+            start = int(pageToken or 0)
+            end = min(start + min(maxResults, 500), len(ids))
+            result = {'messages': [{'id': m, 'threadId': m} for m in ids[start:end]],
+                      'resultSizeEstimate': len(ids)}
+            if end < len(ids):
+                result['nextPageToken'] = str(end)
+            return result
+        return _Request(self._service, 'messages.list', run)
+
+    def get(self, userId, id, format='full'):
+        return _Request(self._service, 'messages.get', lambda: self._service.messages[id])
+
+    def attachments(self):
+        return _Attachments(self._service)
+
+
+class _Attachments:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, userId, messageId, id):
+        def run():
+            stack = [self._service.messages[messageId]['payload']]
+            while stack:
+                part = stack.pop()
+                stack.extend(part.get('parts', []))
+                if part.get('body', {}).get('attachmentId') == id:
+                    return {'size': part['body']['size'], 'data': part['_content']}
+            raise KeyError(id)
+        return _Request(self._service, 'attachments.get', run)
+
+
+class _History:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId, startHistoryId, historyTypes=None, pageToken=None, maxResults=100):
+        def run():
+            log = [h for h in self._service.history if h['id'] > int(startHistoryId)]
+            start = int(pageToken or 0)
+            result = {'history': log[start:start + maxResults], 'historyId': str(self._service.history_id)}
+            if start + maxResults < len(log):
+                result['nextPageToken'] = str(start + maxResults)
+            return result
+        return _Request(self._service, 'history.list', run)
+
+
+class _Users:
+    def __init__(self, service):
+        self._service = service
+
+    def messages(self):
+        return _Messages(self._service)
+
+    def history(self):
+        return _History(self._service)
+
+    def getProfile(self, userId):
+        return _Request(self._service, 'getProfile',
+                        lambda: {'emailAddress': 'me@example.com', 'historyId': str(self._service.history_id)})
+
+
+class FakeGmailService:
+    def __init__(self, n_messages=50, latency=0.0, batch=True, body_size=2_000, attachments=(),
+                 throttle=None, quota_per_second=None):
+        self.latency = latency
+        self.throttle = throttle
+        self.quota_per_second = quota_per_second
+        self.throttled = 0
+        self._call_number = 0
+        self._quota = quota_per_second or 0.0
+        self._quota_at = time.monotonic()
+        self.messages = {}
+        for i in range(n_messages):
+            msg = make_message(i, body_size, attachments(i) if callable(attachments) else attachments)
+            self.messages[msg['id']] = msg
+        self.message_ids = list(self.messages)
+        self.history_id = 1000
+        self.history = []
+        self.calls = Counter()
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        if not batch:
+            self.new_batch_http_request = None
+
+    def add_message(self, body_size=2_000):
+        """Deliver a new message and record it in the mailbox history."""
+        msg = make_message(len(self.messages), body_size)
+        self.messages[msg['id']] = msg
+        self.message_ids.insert(0, msg['id'])
+        self.history_id += 1
+        self.history.append({'id': self.history_id, 'messagesAdded': [{'message': {'id': msg['id']}}]})
+        return msg
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def _round_trip(self, method):
+        with self._lock:
+            self.round_trips += 1
+            if method != 'batch':
+                self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _maybe_throttle(self, method):
+        with self._lock:
+            self._call_number += 1
+            throttled = bool(self.throttle and self.throttle(self._call_number, method))
+            if self.quota_per_second and not throttled:
+                now = time.monotonic()
+                self._quota = min(self.quota_per_second, self._quota + (now - self._quota_at) * self.quota_per_second)
+                self._quota_at = now
+                cost = QUOTA_COSTS.get(method, 5)
+                throttled = self._quota < cost
+                if not throttled:
+                    self._quota -= cost
+            self.throttled += throttled
+        if throttled:
+            raise FakeHttpError(429)
+
+    def users(self):
+        return _Users(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
@@ -0,0 +1,90 @@
+"""Local stand-in for the YouTube Data API and Google Custom Search endpoints.
+
+Serves /youtube/v3/search, /youtube/v3/videos and /customsearch/v1 with
+deterministic fake results after an optional per-request delay, and counts
+requests per path. Point MCP2 at it with "GOOGLE_API_BASE" in secrets/mcp2.json
+or by passing base_url to EnrichmentClient.
+
+Usage: python benchmarks/stub_google.py [port] [latency_seconds]
+"""
+import json, sys, threading, time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoints
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        stub.count(url.path)
+        if stub.latency:
+            time.sleep(stub.latency)
+        if url.path == "/youtube/v3/search":
+            n = int(params.get("maxResults", 5))
+            body = {"items": [{"id": {"videoId": f"vid{i}-{params.get('q', '')[:8]}"}} for i in range(n)]}
+        elif url.path == "/youtube/v3/videos":
+            ids = params.get("id", "").split(",")
+            body = {"items": [{"id": vid, "snippet": {"title": f"Video {vid}"},
+                               "statistics": {"viewCount": str(1000 * (i + 1))}}
+                              for i, vid in enumerate(ids) if vid]}
+        elif url.path == "/customsearch/v1":
+            q = params.get("q", "")
+            body = {"items": [{"title": f"{q} result {i}", "link": f"https://example.com/{q}/{i}",
+                               "snippet": f"About {q}"} for i in range(3)]}
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubGoogleServer:
+    def __init__(self, port=0, latency=0.0):
+        self.latency = latency
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    server = StubGoogleServer(port, latency).start()
+    print(f"Stub Google APIs on {server.base_url} (latency {latency}s). Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
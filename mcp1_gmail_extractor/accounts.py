@@ -0,0 +1,96 @@
+"""Registry of the Gmail accounts MCP1 monitors.
+
+Accounts are listed in a JSON file mapping an account id (usually the mailbox
+address) to its OAuth token, e.g.
+
+    {"alice@example.com": "tokens/alice.pickle",
+     "bob@example.com": {"token": "tokens/bob.pickle"}}
+
+Relative token paths are resolved against the registry file's folder. The
+`default_account` always exists and uses `default_token`, so a deployment
+without a registry file keeps working with the single `token.pickle`. The file
+is re-read when its mtime changes, so accounts can be added without a restart.
+
+Each account gets its own `GmailServiceHolder` (built by `make_holder`, which
+should give it its own rate limiter: Gmail meters quota per user) and its own
+data folder, where the per-account message store and sync cursor live.
+"""
+import json, os, re, threading
+
+
+class UnknownAccount(KeyError):
+    pass
+
+
+def account_dir_name(account_id):
+    """A filesystem-safe folder name for `account_id`."""
+    return re.sub(r'[^A-Za-z0-9@._-]', '_', account_id)
+
+
+class AccountRegistry:
+    def __init__(self, path, default_account, default_token, make_holder, data_dir):
+        self.path = path
+        self.default_account = default_account
+        self.default_token = default_token
+        self.make_holder = make_holder
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._tokens = {default_account: default_token}
+        self._mtime = None
+        self._holders = {}
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        tokens = {self.default_account: self.default_token}
+        if mtime is not None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            base = os.path.dirname(os.path.abspath(self.path))
+            for account_id, entry in entries.items():
+                token = entry['token'] if isinstance(entry, dict) else entry
+                tokens[account_id] = os.path.join(base, token)
+        self._tokens, self._mtime = tokens, mtime
+
+    def ids(self):
+        with self._lock:
+            self._load()
+            return sorted(self._tokens)
+
+    def token_path(self, account_id):
+        with self._lock:
+            self._load()
+            try:
+                return self._tokens[account_id]
+            except KeyError:
+                raise UnknownAccount(f"Unknown account: {account_id}") from None
+
+    def has_token(self, account_id):
+        return os.path.exists(self.token_path(account_id))
+
+    def holder(self, account_id):
+        """This account's (cached) GmailServiceHolder."""
+        token_path = self.token_path(account_id)
+        with self._lock:
+            holder = self._holders.get(account_id)
+            if holder is None or holder.token_path != token_path:
+                holder = self._holders[account_id] = self.make_holder(token_path)
+            return holder
+
+    def service(self, account_id, interactive=False):
+        return self.holder(account_id).service(interactive=interactive)
+
+    def holders(self):
+        """Holders built so far in this process, by account id."""
+        with self._lock:
+            return dict(self._holders)
+
+    def data_path(self, account_id, filename):
+        """`filename` inside this account's data folder (created on demand)."""
+        folder = os.path.join(self.data_dir, account_dir_name(account_id))
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, filename)
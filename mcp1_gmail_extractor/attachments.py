@@ -0,0 +1,124 @@
+"""Shared attachment download pool with content-addressed storage.
+
+Every attachment part becomes one task on a bounded worker pool. The base64url
+payload is decoded chunk by chunk straight into a temp file while it is hashed,
+then moved to `blobs/<sha[:2]>/<sha256><ext>` under the resource dir, so the
+same file attached to many messages is stored once. `submit` returns a
+DownloadHandle that can be awaited (or `.result()`-ed) for the stored paths.
+With `metrics`, each task is timed as `attachment.download` (from the moment it
+runs on a worker, so queueing behind other downloads is excluded).
+"""
+import asyncio, base64, hashlib, os, tempfile, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+DECODE_CHUNK = 1 << 20  # base64 characters per decode step, must be a multiple of 4
+BLOB_DIR = 'blobs'
+KNOWN_PARTS_LIMIT = 10_000  # (message, part) -> stored blob entries remembered to skip re-downloads
+
+
+# ----------------- Content-addressed storage -----------------
+def store_base64(data, resource_dir, ext=''):
+    """Decode base64url `data` into the blob store; return (sha256, relative_path, size)."""
+    blob_root = os.path.join(resource_dir, BLOB_DIR)
+    os.makedirs(blob_root, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    fd, tmp_path = tempfile.mkstemp(dir=blob_root, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for i in range(0, len(data), DECODE_CHUNK):
+                piece = data[i:i + DECODE_CHUNK]
+                chunk = base64.urlsafe_b64decode(piece + '=' * (-len(piece) % 4))
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        sha = digest.hexdigest()
+        relative_path = os.path.join(BLOB_DIR, sha[:2], sha + ext)
+        final_path = os.path.join(resource_dir, relative_path)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha, relative_path, size
+
+
+# ----------------- Completion handle -----------------
+class DownloadHandle:
+    """Per-part futures for one message; results come back in part order."""
+    def __init__(self, futures):
+        self.futures = futures
+
+    def done(self):
+        return all(f.done() for f in self.futures)
+
+    def result(self, timeout=None):
+        return [f.result(timeout) for f in self.futures]
+
+    def __await__(self):
+        return asyncio.gather(*(asyncio.wrap_future(f) for f in self.futures)).__await__()
+
+
+# ----------------- Download pool -----------------
+class AttachmentDownloader:
+    def __init__(self, resource_dir, max_workers=4, metrics=None):
+        self.resource_dir = resource_dir
+        self.metrics = metrics
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='attachments')
+        self._known = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _timed_download(self, service_factory, msg_id, part, user_id):
+        span = self.metrics.span('attachment.download') if self.metrics is not None else nullcontext()
+        with span:
+            result = self._download(service_factory, msg_id, part, user_id)
+        if self.metrics is not None:
+            self.metrics.inc('attachments', outcome='error' if 'error' in result else 'stored')
+        return result
+
+    def _download(self, service_factory, msg_id, part, user_id):
+        filename = part['filename']
+        key = (msg_id, part.get('partId') or filename)
+        with self._lock:
+            if key in self._known:
+                return self._known[key]
+
+        result = {"filename": filename,
+                  "mime_type": part.get('mimeType', 'application/octet-stream'),
+                  "size_bytes": part.get('body', {}).get('size', 0)}
+        try:
+            data = part.get('body', {}).get('data')
+            if not data and 'attachmentId' in part.get('body', {}):
+                att = service_factory().users().messages().attachments().get(
+                    userId=user_id, messageId=msg_id, id=part['body']['attachmentId']
+                ).execute()
+                data = att.get('data')
+            if not data:
+                result["error"] = "no attachment data"
+                return result
+            ext = os.path.splitext(filename)[1].lower()
+            sha, relative_path, size = store_base64(data, self.resource_dir, ext)
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+
+        result.update({"sha256": sha, "relative_path": relative_path, "size_bytes": size})
+        with self._lock:
+            self._known[key] = result
+            if len(self._known) > KNOWN_PARTS_LIMIT:
+                self._known.popitem(last=False)
+        return result
+
+    def submit(self, service_factory, msg_id, parts, user_id='me'):
+        """Queue every named part of a message; `service_factory` is called on the worker thread."""
+        futures = [self._pool.submit(self._timed_download, service_factory, msg_id, part, user_id)
+                   for part in parts if part.get('filename')]
+        return DownloadHandle(futures)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,108 @@
+"""Resumable date-range backfill over every page of a Gmail query.
+
+`iter_backfill` walks `messages().list` page by page and yields parsed
+records in chunks of at most `chunk_size`, so memory stays at one page of ids
+plus one chunk of messages however many years the range covers. After each
+chunk has been consumed, the position (page token + offset into the page) is
+saved as a JSON checkpoint in the MailStore `state` table; calling it again
+with the same query resumes from there, which is also how a run bounded by
+`max_seconds` continues: past the deadline it stops before the next chunk. If Gmail no longer accepts the saved
+page token, the walk restarts just before the oldest message seen so far.
+"""
+import calendar, json, re, time
+from gmail_fetch import LIST_PAGE_SIZE, fetch_messages
+
+CHECKPOINT_PREFIX = 'backfill:'
+_DATE = re.compile(r'^(\d{4})[-/](\d{1,2})[-/](\d{1,2})$')
+
+
+def gmail_date(value):
+    """'2024-01-31' / '2024/1/31' -> '2024/01/31'; epoch seconds pass through."""
+    value = str(value).strip()
+    match = _DATE.match(value)
+    if match:
+        year, month, day = match.groups()
+        return f"{year}/{int(month):02d}/{int(day):02d}"
+    if value.isdigit():
+        return value
+    raise ValueError(f"Unrecognised date: {value!r} (use YYYY-MM-DD)")
+
+
+def epoch_ms(value):
+    """The same inputs as gmail_date as epoch milliseconds (dates at 00:00 UTC), for the local store."""
+    value = gmail_date(value)
+    if value.isdigit():
+        return int(value) * 1000
+    return calendar.timegm(tuple(map(int, value.split('/'))) + (0, 0, 0)) * 1000
+
+
+def build_query(query, after=None, before=None):
+    parts = [query] if query else []
+    if after:
+        parts.append(f"after:{gmail_date(after)}")
+    if before:
+        parts.append(f"before:{gmail_date(before)}")
+    return ' '.join(parts)
+
+
+def load_checkpoint(store, query):
+    raw = store.get_state(CHECKPOINT_PREFIX + query)
+    return json.loads(raw) if raw else None
+
+
+def _save_checkpoint(store, query, state):
+    store.set_state(CHECKPOINT_PREFIX + query, json.dumps(state))
+
+
+def _is_bad_page_token(error):
+    return getattr(getattr(error, 'resp', None), 'status', None) in (400, 404)
+
+
+def iter_backfill(service, query, parse, store, chunk_size=100, user_id='me', restart=False, max_seconds=None):
+    """Yield lists of parsed records for every message matching `query`, newest first."""
+    state = None if restart else load_checkpoint(store, query)
+    if state is None:
+        state = {'page_token': None, 'offset': 0, 'oldest': None, 'processed': 0, 'done': False}
+    if state['done']:
+        return
+
+    deadline = time.monotonic() + max_seconds if max_seconds is not None else None
+    recovered = False  # one token fallback per stretch of progress, never a loop
+    progressed = False  # at least one chunk per call, however short max_seconds is
+    while True:
+        list_query = query
+        if state.get('resume_before'):
+            list_query = f"{query} before:{state['resume_before']}"
+        params = {'userId': user_id, 'q': list_query, 'maxResults': LIST_PAGE_SIZE}
+        if state['page_token']:
+            params['pageToken'] = state['page_token']
+        try:
+            response = service.users().messages().list(**params).execute()
+        except Exception as e:
+            if recovered or not (state['page_token'] and state['oldest'] and _is_bad_page_token(e)):
+                raise
+            # the page token expired; everything newer than `oldest` is already done
+            state.update(page_token=None, offset=0, resume_before=state['oldest'] + 1)
+            recovered = True
+            continue
+
+        ids = [m['id'] for m in response.get('messages', [])]
+        for start in range(state['offset'], len(ids), chunk_size):
+            if progressed and deadline is not None and time.monotonic() >= deadline:
+                return  # checkpointed up to `start`; the next call picks up from here
+            records = [parse(m) for m in fetch_messages(service, ids[start:start + chunk_size], user_id=user_id)]
+            yield records
+            dates = [r['internal_date'] // 1000 for r in records if r.get('internal_date')]
+            if dates:
+                state['oldest'] = min(dates + ([state['oldest']] if state['oldest'] else []))
+            state['offset'] = min(start + chunk_size, len(ids))
+            state['processed'] += len(records)
+            _save_checkpoint(store, query, state)
+            recovered = False
+            progressed = True
+
+        state.update(page_token=response.get('nextPageToken'), offset=0)
+        state['done'] = not state['page_token']
+        _save_checkpoint(store, query, state)
+        if state['done'] or (progressed and deadline is not None and time.monotonic() >= deadline):
+            return
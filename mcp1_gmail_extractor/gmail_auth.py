@@ -0,0 +1,113 @@
+"""Process-wide Gmail credential and service cache.
+
+Credentials are unpickled once and refreshed lazily shortly before they
+expire. Each thread gets its own service object (httplib2 connections are not
+thread-safe) built once and reused, so its keep-alive connection survives
+across tool calls. The discovery document comes from the bundled static copy,
+or from a cached JSON file when one is configured. With a `limiter`, every
+service is returned wrapped so its calls share one quota budget.
+
+The Google client libraries are imported on first use (googleapiclient alone
+costs ~100 ms), so importing the server stays cheap.
+"""
+import datetime, os, pickle, threading
+
+REFRESH_SKEW = datetime.timedelta(minutes=5)
+
+
+def _utcnow():
+    # google-auth stores `expiry` as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class GmailServiceHolder:
+    def __init__(self, token_path, client_secret_path, scopes,
+                 discovery_path=None, save_token=False, limiter=None):
+        self.token_path = token_path
+        self.client_secret_path = client_secret_path
+        self.scopes = scopes
+        self.discovery_path = discovery_path
+        self.save_token = save_token
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._creds = None
+        self._discovery_doc = None
+        self._generation = 0
+
+    # ----------------- Credentials -----------------
+    def _load_credentials(self, interactive):
+        creds = None
+        if os.path.exists(self.token_path):
+            try:
+                with open(self.token_path, 'rb') as token:
+                    creds = pickle.load(token)
+            except Exception as e:
+                print(f"Error loading token.pickle: {e}")
+        if creds is None:
+            if not interactive:
+                raise FileNotFoundError(f"Token file missing: {self.token_path}")
+            creds = self._run_flow()
+        return creds
+
+    def _run_flow(self):
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_path, self.scopes)
+        creds = flow.run_local_server(port=0)
+        self._save(creds)
+        return creds
+
+    def _save(self, creds):
+        if self.save_token:
+            with open(self.token_path, 'wb') as token:
+                pickle.dump(creds, token)
+
+    @staticmethod
+    def _needs_refresh(creds):
+        if not creds.valid:
+            return True
+        return creds.expiry is not None and creds.expiry - _utcnow() < REFRESH_SKEW
+
+    def credentials(self, interactive=False):
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load_credentials(interactive)
+            creds = self._creds
+            if self._needs_refresh(creds):
+                if creds.refresh_token:
+                    from google.auth.transport.requests import Request
+                    creds.refresh(Request())
+                    self._save(creds)
+                elif interactive:
+                    # reloading the file would only return the same unusable token
+                    self._generation += 1
+                    creds = self._creds = self._run_flow()
+            return creds
+
+    # ----------------- Service -----------------
+    def _build(self, creds):
+        from googleapiclient.discovery import build, build_from_document
+        if self.discovery_path and os.path.exists(self.discovery_path):
+            if self._discovery_doc is None:
+                with open(self.discovery_path, 'r', encoding='utf-8') as f:
+                    self._discovery_doc = f.read()
+            return build_from_document(self._discovery_doc, credentials=creds)
+        return build('gmail', 'v1', credentials=creds, cache_discovery=False, static_discovery=True)
+
+    def service(self, interactive=False):
+        """Return this thread's Gmail service, building it on first use."""
+        creds = self.credentials(interactive)
+        cached = getattr(self._local, 'service', None)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        service = self._build(creds)
+        if self.limiter is not None:
+            service = self.limiter.wrap(service)
+        self._local.service = (self._generation, service)
+        return service
+
+    def reset(self):
+        """Drop cached credentials and services (e.g. after the token file changed)."""
+        with self._lock:
+            self._creds = None
+            self._generation += 1
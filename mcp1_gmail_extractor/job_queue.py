@@ -0,0 +1,191 @@
+"""Durable SQLite job queue and worker pool for the MCP1 -> MCP2 hand-off.
+
+`enqueue` is idempotent on a caller-chosen key (the Gmail message id), so
+re-sending the same email returns the existing job instead of a new one,
+unless that job has failed for good: it is then requeued with a fresh payload
+and attempt count (e.g. after MCP2 was down for longer than the backoff).
+Workers claim small batches of due jobs, hand them to `handler` and either
+store the per-job results or reschedule the batch with exponential backoff
+and jitter (also when the handler returns a different number of results than
+it was given). Jobs left `running` by a crash are re-queued on start. With
+`metrics`, each batch is timed as `jobs.process` and job outcomes are counted.
+"""
+import json, random, sqlite3, threading, time, uuid
+from contextlib import nullcontext
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+# ----------------- Queue -----------------
+class JobQueue:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                idempotency_key TEXT UNIQUE,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_run_at REAL NOT NULL,
+                last_error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_due ON jobs(status, next_run_at);
+        """)
+
+    def enqueue(self, key, payload):
+        """
+        Return (job_id, outcome): 'created' for a new job, 'requeued' when a failed job with
+        the same key was reset to run again, 'existing' when a live or done job is reused.
+        """
+        now = time.time()
+        job_id = str(uuid.uuid4())
+        body = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            cur = self._conn.execute(
+                'INSERT OR IGNORE INTO jobs (id, idempotency_key, payload, status, next_run_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', (job_id, key, body, QUEUED, now, now, now))
+            if cur.rowcount:
+                return job_id, 'created'
+            cur = self._conn.execute(
+                'UPDATE jobs SET status = ?, payload = ?, attempts = 0, next_run_at = ?, updated_at = ? '
+                'WHERE idempotency_key = ? AND status = ?', (QUEUED, body, now, now, key, FAILED))
+            row = self._conn.execute('SELECT id FROM jobs WHERE idempotency_key = ?', (key,)).fetchone()
+            return row[0], 'requeued' if cur.rowcount else 'existing'
+
+    def claim(self, limit):
+        """Atomically mark up to `limit` due jobs as running and return them."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    'SELECT id, payload, attempts FROM jobs WHERE status = ? AND next_run_at <= ? '
+                    'ORDER BY next_run_at LIMIT ?', (QUEUED, now, limit)).fetchall()
+                self._conn.executemany('UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?',
+                                       [(RUNNING, now, r[0]) for r in rows])
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return [{'id': r[0], 'payload': json.loads(r[1]), 'attempts': r[2]} for r in rows]
+
+    def complete(self, job_id, result):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, last_error = NULL, attempts = attempts + 1, updated_at = ? '
+                'WHERE id = ?', (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id))
+
+    def fail(self, job_id, error, retry_at=None):
+        """Record a failed attempt; requeue at `retry_at`, or give up when it is None."""
+        status = QUEUED if retry_at is not None else FAILED
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, last_error = ?, attempts = attempts + 1, next_run_at = ?, updated_at = ? '
+                'WHERE id = ?', (status, error, retry_at or time.time(), time.time(), job_id))
+
+    def recover(self):
+        """Requeue jobs a previous process left running."""
+        with self._lock:
+            return self._conn.execute('UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?',
+                                      (QUEUED, time.time(), RUNNING)).rowcount
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, idempotency_key, status, attempts, next_run_at, last_error, result, created_at, updated_at '
+                'FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ['id', 'idempotency_key', 'status', 'attempts', 'next_run_at', 'last_error', 'result',
+                'created_at', 'updated_at']
+        job = dict(zip(keys, row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)} | dict(rows)
+
+
+# ----------------- Workers -----------------
+class JobWorkerPool:
+    def __init__(self, queue, handler, concurrency=2, batch_size=25, max_attempts=5,
+                 base_delay=1.0, max_delay=300.0, poll_interval=1.0, metrics=None):
+        """`handler(payloads)` returns one result per payload, in order, or raises to retry the batch."""
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.metrics = metrics
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def backoff(self, attempts):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempts))
+        return delay * random.uniform(0.5, 1.0)
+
+    def start(self):
+        if self._threads:
+            return self
+        self.queue.recover()
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._run, name=f'mcp1-jobs-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            jobs = self.queue.claim(self.batch_size)
+            if not jobs:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self.process(jobs)
+
+    def _count(self, outcome, n):
+        if self.metrics is not None:
+            self.metrics.inc('jobs', n, outcome=outcome)
+
+    def process(self, jobs):
+        span = self.metrics.span('jobs.process') if self.metrics is not None else nullcontext()
+        try:
+            with span:
+                results = list(self.handler([job['payload'] for job in jobs]))
+            if len(results) != len(jobs):
+                # Results are matched by position, so a short or long list can't be trusted for any job.
+                raise ValueError(f'handler returned {len(results)} results for {len(jobs)} jobs')
+        except Exception as e:
+            for job in jobs:
+                attempts = job['attempts'] + 1
+                retry_at = time.time() + self.backoff(attempts) if attempts < self.max_attempts else None
+                self.queue.fail(job['id'], str(e), retry_at)
+                self._count('retried' if retry_at else 'failed', 1)
+            return
+        for job, result in zip(jobs, results):
+            self.queue.complete(job['id'], result)
+        self._count('done', len(jobs))
@@ -0,0 +1,235 @@
+"""Local SQLite message store with incremental Gmail sync.
+
+The first sync lists a bootstrap window of the mailbox and records the
+mailbox `historyId`; later syncs only call `users.history.list` from that
+cursor and fetch the messages that were actually added. Tools can then answer
+`from:/to:/subject:` style questions from the store instead of the live API.
+With a `search_index`, every upsert/delete is mirrored into the full-text index
+(under `account_id`, the mailbox this store holds).
+
+A sync holds a lease row in the store for its whole run, so the server and a
+poll worker process never sync the same mailbox at once (the later one would
+write back an older cursor).
+"""
+import json, os, socket, sqlite3, threading, time
+from contextlib import contextmanager
+from gmail_fetch import list_message_ids, fetch_messages
+
+HISTORY_CURSOR_KEY = 'history_id'
+SYNC_LEASE = 'sync'
+SYNC_LEASE_TTL = 600.0      # seconds; the lease of a process that died frees up after this
+SYNC_LEASE_TIMEOUT = 120.0  # how long a sync waits for the one already running
+
+
+# ----------------- Store -----------------
+class MailStore:
+    def __init__(self, path, search_index=None, account_id=None):
+        self.path = path
+        self.search_index = search_index
+        self.account_id = account_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                thread_id TEXT,
+                history_id INTEGER,
+                internal_date INTEGER,
+                sender TEXT,
+                recipients TEXT,
+                subject TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_date ON messages(internal_date);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires REAL);
+        """)
+        self._conn.commit()
+
+    def get_state(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self._lock, self._conn:
+            if value is None:
+                self._conn.execute('DELETE FROM state WHERE key = ?', (key,))
+            else:
+                self._conn.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    # ----------------- Cross-process lease -----------------
+    def try_lease(self, name, owner, ttl):
+        """Take lease `name` for `ttl` seconds unless another owner holds it and it hasn't expired."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')  # the write lock, so only one process decides at a time
+            try:
+                row = self._conn.execute('SELECT owner, expires FROM leases WHERE name = ?', (name,)).fetchone()
+                taken = row is None or row[0] == owner or row[1] < now
+                if taken:
+                    self._conn.execute('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)', (name, owner, now + ttl))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return taken
+
+    def release_lease(self, name, owner):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+
+    @contextmanager
+    def lease(self, name, ttl=SYNC_LEASE_TTL, timeout=None, poll=0.2):
+        """Hold lease `name` for the block, waiting up to `timeout` seconds for another holder (TimeoutError)."""
+        owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.try_lease(name, owner, ttl):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Lease {name!r} on {self.path} is held by another process")
+            time.sleep(poll)
+        try:
+            yield
+        finally:
+            self.release_lease(name, owner)
+
+    def ids(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute('SELECT id FROM messages')]
+
+    def known_ids(self, ids):
+        ids = list(ids)
+        found = set()
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self._conn.execute(
+                    f'SELECT id FROM messages WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+                found.update(r[0] for r in rows)
+        return found
+
+    def upsert(self, records):
+        records = list(records)
+        rows = []
+        for rec in records:
+            headers = rec.get('headers', {})
+            rows.append((rec['message_id'], rec.get('thread_id'), rec.get('history_id', 0),
+                         rec.get('internal_date', 0), headers.get('From', ''),
+                         ' '.join(filter(None, [headers.get('To', ''), headers.get('Cc', '')])),
+                         headers.get('Subject', ''), json.dumps(rec, ensure_ascii=False)))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        if self.search_index is not None:
+            self.search_index.add_records(records, self.account_id)
+        return len(rows)
+
+    def delete(self, ids):
+        ids = list(ids)
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM messages WHERE id = ?', [(i,) for i in ids])
+        if self.search_index is not None:
+            self.search_index.delete(ids)
+        return len(ids)
+
+    def get(self, message_id):
+        with self._lock:
+            row = self._conn.execute('SELECT record FROM messages WHERE id = ?', (message_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, sender=None, recipient=None, subject_terms=None, after=None, before=None, limit=10):
+        """
+        Newest-first records matching the same filters the tools send to Gmail;
+        `after`/`before` bound the internal date (epoch ms, `before` exclusive).
+        """
+        clauses, params = [], []
+        if after is not None:
+            clauses.append('internal_date >= ?')
+            params.append(after)
+        if before is not None:
+            clauses.append('internal_date < ?')
+            params.append(before)
+        if sender:
+            clauses.append('sender LIKE ?')
+            params.append(f'%{sender}%')
+        if recipient:
+            clauses.append('recipients LIKE ?')
+            params.append(f'%{recipient}%')
+        if subject_terms:
+            clauses.append('(' + ' OR '.join('subject LIKE ?' for _ in subject_terms) + ')')
+            params.extend(f'%{t}%' for t in subject_terms)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT record FROM messages {where} ORDER BY internal_date DESC, id DESC LIMIT ?',
+                (*params, limit)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+
+
+# ----------------- Incremental sync -----------------
+def _is_not_found(error):
+    return getattr(getattr(error, 'resp', None), 'status', None) == 404
+
+
+def _full_sync(service, store, parse, user_id, bootstrap_query, bootstrap_limit, cursor_key):
+    # Take the cursor first so nothing that arrives while we list is lost.
+    history_id = service.users().getProfile(userId=user_id).execute()['historyId']
+    ids = list_message_ids(service, bootstrap_query, bootstrap_limit, user_id=user_id)
+    known = store.known_ids(ids)
+    missing = [i for i in ids if i not in known]
+    added = store.upsert(parse(m) for m in fetch_messages(service, missing, user_id=user_id))
+    store.set_state(cursor_key, history_id)
+    return {'mode': 'full', 'added': added, 'deleted': 0, 'history_id': str(history_id)}
+
+
+def sync_mailbox(service, store, parse, user_id='me', bootstrap_query='newer_than:90d',
+                 bootstrap_limit=500, cursor_key=HISTORY_CURSOR_KEY, lease_timeout=SYNC_LEASE_TIMEOUT):
+    """Bring `store` up to date and return counts for what changed; one sync per store at a time, across processes."""
+    with store.lease(SYNC_LEASE, timeout=lease_timeout):
+        return _sync(service, store, parse, user_id, bootstrap_query, bootstrap_limit, cursor_key)
+
+
+def _sync(service, store, parse, user_id, bootstrap_query, bootstrap_limit, cursor_key):
+    start_history_id = store.get_state(cursor_key)
+    if start_history_id is None:
+        return _full_sync(service, store, parse, user_id, bootstrap_query, bootstrap_limit, cursor_key)
+
+    added, deleted = {}, set()
+    history_id, page_token = start_history_id, None
+    try:
+        while True:
+            params = {'userId': user_id, 'startHistoryId': start_history_id,
+                      'historyTypes': ['messageAdded', 'messageDeleted']}
+            if page_token:
+                params['pageToken'] = page_token
+            response = service.users().history().list(**params).execute()
+            for record in response.get('history', []):
+                for item in record.get('messagesAdded', []):
+                    added[item['message']['id']] = True
+                    deleted.discard(item['message']['id'])
+                for item in record.get('messagesDeleted', []):
+                    added.pop(item['message']['id'], None)
+                    deleted.add(item['message']['id'])
+            history_id = response.get('historyId', history_id)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+    except Exception as e:
+        if not _is_not_found(e):
+            raise
+        # The cursor is older than Gmail keeps history for; start over.
+        store.set_state(cursor_key, None)
+        return _full_sync(service, store, parse, user_id, bootstrap_query, bootstrap_limit, cursor_key)
+
+    known = store.known_ids(added)
+    missing = [i for i in added if i not in known]
+    count = store.upsert(parse(m) for m in fetch_messages(service, missing, user_id=user_id))
+    store.delete(deleted)
+    store.set_state(cursor_key, history_id)
+    return {'mode': 'delta', 'added': count, 'deleted': len(deleted), 'history_id': str(history_id)}
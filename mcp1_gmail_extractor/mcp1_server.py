@@ -1,9 +1,21 @@
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.session import ServerSession
-import base64, os, pickle, uuid, json, threading
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import asyncio, os, socket, time, uuid, threading
+from gmail_auth import GmailServiceHolder
+from rate_limit import GmailRateLimiter
+from gmail_fetch import list_message_ids, fetch_messages
+from mail_store import MailStore, sync_mailbox
+from attachments import AttachmentDownloader
+from job_queue import JobQueue, JobWorkerPool
+from mcp_common.output_store import OutputStore
+from mime import walk_payload, classify_mime
+from mcp_common.search_index import SearchIndex
+from backfill import build_query, epoch_ms, iter_backfill, load_checkpoint
+from mcp_common.metrics import Metrics
+from accounts import AccountRegistry, UnknownAccount
+from sharding import ShardScheduler
+from mcp_common import wire
+from mcp_common.dedup import SimHashIndex, simhash
 
 # ----------------- Configuration -----------------
 SHOULD_SAVE_TOKEN = False
@@ -11,144 +23,197 @@ SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 TOKEN_PATH = os.path.abspath('../secrets/token.pickle')
 CLIENT_SECRET_PATH = os.path.abspath('../secrets/client_secret.json')
 RESOURCE_DIR = os.path.abspath("../resources")
+DISCOVERY_CACHE_PATH = os.path.abspath('../secrets/gmail_v1_discovery.json')  # optional, static copy used if absent
+GMAIL_UNITS_PER_SECOND = 200   # below Gmail's 250 quota units/user/second
+GMAIL_BURST_UNITS = 250
+GMAIL_MAX_CONCURRENCY = 16     # AIMD ceiling for in-flight Gmail requests
+SYNC_MODE = False  # answer tools from the local store, kept fresh via users.history.list
+STORE_PATH = os.path.join(RESOURCE_DIR, 'mailstore.sqlite3')
+SEARCH_INDEX_PATH = os.path.join(RESOURCE_DIR, 'search.sqlite3')  # shared with MCP2 (attachment text)
+OUTPUT_STORE_DIR = os.path.join(RESOURCE_DIR, 'store')  # replaces the single data.json
+SYNC_BOOTSTRAP_QUERY = 'newer_than:90d'
+SYNC_BOOTSTRAP_LIMIT = 500
+MEETING_SUBJECT_TERMS = ['meeting', 'summary', 'discussion', 'minutes']
+DEDUP_INDEX_PATH = os.path.join(RESOURCE_DIR, 'dedup.sqlite3')  # body SimHash per message (MCP2 keeps its own)
+DEDUP_MAX_DISTANCE = 6  # fingerprint bits a reply/forward may differ by from the email it quotes
+BACKFILL_CHUNK_SIZE = 100  # messages fetched, parsed and stored per step of a backfill
+BACKFILL_MAX_SECONDS = 20  # one backfill call returns (done: false) after this; the next call resumes
+ATTACHMENT_WORKERS = 4  # concurrent attachment downloads across all messages
+MCP2_BATCH_URL = "http://127.0.0.1:6278/tools/summarize_batch"
+MCP2_TIMEOUT = 120       # seconds per hand-off request
+MCP2_COMPRESS = False    # True when MCP2 runs on another host: zstd (when installed) or gzip both ways
+JOB_DB_PATH = os.path.join(RESOURCE_DIR, 'jobs.sqlite3')
+JOB_WORKERS = 2          # concurrent hand-off requests to MCP2
+JOB_BATCH_SIZE = 25      # emails per hand-off request
+JOB_MAX_ATTEMPTS = 5     # then the job is marked failed
+MCP1_PORT = 6277
+DEFAULT_ACCOUNT = 'me'   # the TOKEN_PATH mailbox; tools use it when no account_id is given
+ACCOUNTS_PATH = os.path.abspath('../secrets/accounts.json')  # optional: account id -> token file
+ACCOUNTS_DIR = os.path.join(RESOURCE_DIR, 'accounts')  # per-account message store and sync cursor
+POLL_WORKERS = 0         # > 0: keep every account synced in the background, sharded over this many processes
+POLL_INTERVAL = 60       # seconds between two rounds of a poll worker
+HASH_RING_VNODES = 64    # points per worker on the consistent-hash ring
+POLL_BUDGET_SHARE = 0.5  # with poll workers: the owning worker's part of an account's quota, the server keeps the rest
+METRICS_NAMESPACE = "mcp1"  # prefix of every series on GET /metrics
 
 # ----------------- Initialize MCP -----------------
 mcp = FastMCP("MCP1_GmailExtractor")
+metrics = Metrics(METRICS_NAMESPACE)
+
+# ----------------- Gmail Service (per account, cached, rate limited) -----------------
+_gmail_budget_share = 1.0  # this process's part of every account's quota
+
+def make_gmail_holder(token_path):
+    # Gmail meters quota per user, so every account gets its own limiter
+    limiter = GmailRateLimiter(units_per_second=GMAIL_UNITS_PER_SECOND * _gmail_budget_share,
+                               burst=GMAIL_BURST_UNITS * _gmail_budget_share,
+                               max_concurrency=GMAIL_MAX_CONCURRENCY, metrics=metrics)
+    return GmailServiceHolder(token_path, CLIENT_SECRET_PATH, SCOPES, discovery_path=DISCOVERY_CACHE_PATH,
+                              save_token=SHOULD_SAVE_TOKEN, limiter=limiter)
+
+accounts = AccountRegistry(ACCOUNTS_PATH, DEFAULT_ACCOUNT, TOKEN_PATH, make_gmail_holder, ACCOUNTS_DIR)
+gmail = accounts.holder(DEFAULT_ACCOUNT)
+gmail_limiter = gmail.limiter
+
+def set_gmail_budget_share(share):
+    """
+    Limit this process to `share` of each account's quota. With poll workers, the server
+    and the worker owning an account both call Gmail for it, each with its own limiter.
+    """
+    global _gmail_budget_share
+    _gmail_budget_share = share
+    for holder in accounts.holders().values():
+        holder.limiter.set_rate(GMAIL_UNITS_PER_SECOND * share, GMAIL_BURST_UNITS * share)
+
+def account_error(account_id):
+    """Why `account_id` can't be used right now, or None."""
+    try:
+        if not accounts.has_token(account_id):
+            return "Token file missing"
+    except UnknownAccount:
+        return f"Unknown account: {account_id}"
+    return None
 
-# ----------------- Gmail Service Resource -----------------
 @mcp.resource("gmail://service")
 def gmail_service():
-    creds = None
-    if os.path.exists(TOKEN_PATH):
-        try:
-            with open(TOKEN_PATH, 'rb') as token:
-                creds = pickle.load(token)
-        except Exception as e:
-            print(f"Error loading token.pickle: {e}")
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-
-    if SHOULD_SAVE_TOKEN:
-        with open(TOKEN_PATH, 'wb') as token:
-            pickle.dump(creds, token)
-
-    service = build('gmail', 'v1', credentials=creds)
-    return service
-
-# ----------------- Helper: Extract email body -----------------
-def extract_body(msg_data):
-    parts = msg_data['payload'].get('parts', [])
-
-    def find_text_part(parts_list):
-        for part in parts_list:
-            if part.get('mimeType') == 'text/plain':
-                return part['body'].get('data')
-            if part.get('parts'):
-                result = find_text_part(part['parts'])
-                if result:
-                    return result
-        return None
-
-    body_data = find_text_part(parts)
-    if not body_data and msg_data['payload']['body'].get('data'):
-        body_data = msg_data['payload']['body'].get('data')
-    if not body_data:
-        return ""
-    return base64.urlsafe_b64decode(body_data).decode('utf-8', errors='ignore')
-
-# ----------------- Async Attachment Handling -----------------
-def save_attachment(service, msg_id, part, subfolder="misc"):
-    filename = part.get('filename')
-    if not filename:
-        return None
-
-    folder = os.path.join(RESOURCE_DIR, subfolder)
-    os.makedirs(folder, exist_ok=True)
-    path = os.path.join(folder, filename)
-
-    data = part['body'].get('data')
-    if not data and 'attachmentId' in part['body']:
-        attachment_id = part['body']['attachmentId']
-        att = service.users().messages().attachments().get(
-            userId='me', messageId=msg_id, id=attachment_id
-        ).execute()
-        data = att.get('data')
-
-    if data:
-        with open(path, 'wb') as f:
-            f.write(base64.urlsafe_b64decode(data))
-
-    return os.path.relpath(path, RESOURCE_DIR)
-
-def download_attachments_async(service, msg_id, parts, ctx):
-    for part in parts:
-        if part.get('mimeType', '').startswith("image/"):
-            save_attachment(service, msg_id, part, "image")
-        elif part.get('mimeType', '') == "application/pdf":
-            save_attachment(service, msg_id, part, "pdf")
-        elif part.get('mimeType', '') in ["application/msword",
-                                         "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-            save_attachment(service, msg_id, part, "word")
-        else:
-            save_attachment(service, msg_id, part, "misc")
-    ctx.info("Attachments downloaded asynchronously.")
+    return gmail.service(interactive=True)
+
+# ----------------- Helper: Parse a Gmail message into a store record -----------------
+def parse_message(msg_data):
+    headers = {h['name']: h['value'] for h in msg_data['payload'].get('headers', [])}
+    mime_parts = walk_payload(msg_data['payload'])
+    body = mime_parts.body()
+    attachment_parts = []
+    for part in mime_parts.attachment_parts:
+        if 'attachmentId' in part.get('body', {}):
+            # the attachment is fetched on demand, don't keep any inline copy
+            part = dict(part, body={k: v for k, v in part['body'].items() if k != 'data'})
+        attachment_parts.append(part)
+    return {
+        "message_id": msg_data['id'],
+        "thread_id": msg_data.get('threadId'),
+        "history_id": int(msg_data.get('historyId') or 0),
+        "internal_date": int(msg_data.get('internalDate') or 0),
+        "headers": headers,
+        "body": body,
+        "body_type": mime_parts.body_type,
+        "attachment_parts": attachment_parts,
+    }
+
+# ----------------- Local full-text search index -----------------
+_search_index = None
+_search_index_lock = threading.Lock()
+
+def get_search_index():
+    global _search_index
+    with _search_index_lock:
+        if _search_index is None:
+            os.makedirs(RESOURCE_DIR, exist_ok=True)
+            _search_index = SearchIndex(SEARCH_INDEX_PATH)
+            if accounts.ids() == [DEFAULT_ACCOUNT]:
+                _search_index.adopt(None, DEFAULT_ACCOUNT)  # single mailbox: everything indexed so far is its mail
+        return _search_index
+
+# ----------------- Local message stores + incremental sync (one per account) -----------------
+_stores = {}
+_sync_locks = {}
+_store_lock = threading.Lock()
+
+def get_store(account_id=DEFAULT_ACCOUNT):
+    with _store_lock:
+        store = _stores.get(account_id)
+        if store is None:
+            os.makedirs(RESOURCE_DIR, exist_ok=True)
+            path = STORE_PATH if account_id == DEFAULT_ACCOUNT else accounts.data_path(account_id, 'mailstore.sqlite3')
+            index = get_search_index()
+            store = _stores[account_id] = MailStore(path, search_index=index, account_id=account_id)
+            index.adopt(store.ids(), account_id)
+            _sync_locks[account_id] = threading.Lock()
+        return store
+
+def sync_store(service, account_id=DEFAULT_ACCOUNT):
+    store = get_store(account_id)
+    with _sync_locks[account_id]:
+        return sync_mailbox(service, store, parse_message,
+                            bootstrap_query=SYNC_BOOTSTRAP_QUERY, bootstrap_limit=SYNC_BOOTSTRAP_LIMIT)
+
+# ----------------- Attachment download pool -----------------
+downloader = AttachmentDownloader(RESOURCE_DIR, max_workers=ATTACHMENT_WORKERS, metrics=metrics)
+
+# ----------------- Output store (one atomic file per message) -----------------
+_email_store = None
+
+def get_email_store():
+    global _email_store
+    if _email_store is None:
+        _email_store = OutputStore(OUTPUT_STORE_DIR, 'emails')
+    return _email_store
 
 # ----------------- Tool: Get structured email details -----------------
+def find_latest_email(account_id, sender_email, receiver_email, max_results):
+    # blocking: rate-limiter waits and retry backoff sleep in the calling thread
+    service = accounts.service(account_id)
+    if SYNC_MODE:
+        sync_store(service, account_id)
+        return get_store(account_id).query(sender=sender_email, recipient=receiver_email, limit=1)
+    query = f'from:{sender_email} to:{receiver_email}'
+    message_ids = list_message_ids(service, query, max_results)
+    records = [parse_message(m) for m in fetch_messages(service, message_ids[:1])]
+    get_search_index().add_records(records, account_id)
+    return records
+
 @mcp.tool()
 async def get_email_details(ctx: Context[ServerSession, None],
                             sender_email: str = "vishal2k4gopal@gmail.com",
                             receiver_email: str = "vishal.g2022@vitstudent.ac.in",
-                            max_results: int = 1):
-    if not os.path.exists(TOKEN_PATH):
-        return {"error": "Token file missing"}
-
-    with open(TOKEN_PATH, 'rb') as token_file:
-        creds = pickle.load(token_file)
-    service = build('gmail', 'v1', credentials=creds)
+                            max_results: int = 1, account_id: str = DEFAULT_ACCOUNT):
+    error = account_error(account_id)
+    if error:
+        return {"error": error}
 
-    query = f'from:{sender_email} to:{receiver_email}'
-    results = service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-    messages = results.get('messages', [])
+    # off the event loop, so a throttled mailbox doesn't stall every other tool call
+    records = await asyncio.to_thread(find_latest_email, account_id, sender_email, receiver_email, max_results)
 
-    if not messages:
+    if not records:
         return {"error": f"No emails found from {sender_email} to {receiver_email}"}
 
-    msg_id = messages[0]['id']
-    msg_data = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-    headers = {h['name']: h['value'] for h in msg_data['payload']['headers']}
-    body = extract_body(msg_data)
-    parts = msg_data['payload'].get('parts', [])
-
-    # Download attachments asynchronously
-    threading.Thread(target=download_attachments_async, args=(service, msg_id, parts, ctx), daemon=True).start()
-
-    attachments = []
-    for part in parts:
-        if part.get('filename'):
-            subfolder = "misc"
-            if part.get('mimeType', '').startswith("image/"):
-                subfolder = "image"
-            elif part.get('mimeType', '') == "application/pdf":
-                subfolder = "pdf"
-            elif part.get('mimeType', '') in ["application/msword",
-                                             "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-                subfolder = "word"
-
-            relative_path = os.path.join(subfolder, part['filename'])
-            attachments.append({
-                "filename": part['filename'],
-                "mime_type": part.get('mimeType', 'application/octet-stream'),
-                "size_bytes": part.get('body', {}).get('size', 0),
-                "relative_path": relative_path
-            })
+    record = records[0]
+    msg_id = record['message_id']
+    headers = record['headers']
+    body = record['body']
+    parts = record['attachment_parts']
+
+    # Download attachments on the shared pool while the rest of the record is built
+    handle = downloader.submit(accounts.holder(account_id).service, msg_id, parts)
+
+    attachments = [dict(stored, category=classify_mime(stored['mime_type'])) for stored in await handle]
+    if attachments:
+        ctx.info(f"Downloaded {len(attachments)} attachment(s) to the blob store.")
 
     email_data = {
         "id": str(uuid.uuid4()),
+        "message_id": msg_id,
+        "account_id": account_id,
         "date": headers.get('Date', ''),
         "subject": headers.get('Subject', ''),
         "from": headers.get('From', ''),
@@ -157,97 +222,392 @@ async def get_email_details(ctx: Context[ServerSession, None],
         "reply_to": headers.get('Reply-To', 'noreply@system.com'),
         "priority": "High",
         "body": body,
-        "body_type": "text/plain",
+        "body_type": record.get('body_type', "text/plain"),
         "attachments": attachments
     }
 
-    os.makedirs(RESOURCE_DIR, exist_ok=True)
-    with open(os.path.join(RESOURCE_DIR, 'data.json'), 'w', encoding='utf-8') as f:
-        json.dump(email_data, f, indent=2)
+    path = get_email_store().put(msg_id, email_data)
 
-    ctx.info("Saved email metadata to data.json.")
+    ctx.info(f"Saved email metadata to {os.path.relpath(path, RESOURCE_DIR)}.")
     return email_data
 
-# ----------------- Tool: Fetch meeting summaries -----------------
+# ----------------- Tool: List stored emails -----------------
 @mcp.tool()
-def fetch_meeting_summaries(sender_email: str, ctx: Context[ServerSession, None], max_results: int = 5):
-    if not os.path.exists(TOKEN_PATH):
-        ctx.error("Token file missing")
-        return []
+def list_stored_emails(ctx: Context[ServerSession, None], limit: int = 20):
+    """Most recently saved email records, newest first, read from the output store index."""
+    store = get_email_store()
+    keys = dict.fromkeys(entry['key'] for entry in store.tail(limit))
+    emails = [store.get(key) for key in keys]
+    return [email for email in emails if email is not None]
+
+# ----------------- Near-duplicate emails (replies / forwards quoting another) -----------------
+_dedup_index = None
+_dedup_lock = threading.Lock()
+
+def get_dedup_index():
+    global _dedup_index
+    with _dedup_lock:
+        if _dedup_index is None:
+            os.makedirs(RESOURCE_DIR, exist_ok=True)
+            _dedup_index = SimHashIndex(DEDUP_INDEX_PATH, max_distance=DEDUP_MAX_DISTANCE)
+        return _dedup_index
+
+def find_duplicates(records):
+    """{message id: canonical message id} for the records whose body near-duplicates an earlier email's."""
+    index = get_dedup_index()
+    duplicates = {}
+    # oldest first, so the original rather than its latest reply becomes the canonical message
+    for record in sorted(records, key=lambda r: r.get('internal_date', 0)):
+        canonical = index.canonical_for(record['message_id'], simhash(record['body']))
+        if canonical != record['message_id']:
+            duplicates[record['message_id']] = canonical
+    return duplicates
 
-    with open(TOKEN_PATH, 'rb') as token_file:
-        creds = pickle.load(token_file)
-    service = build('gmail', 'v1', credentials=creds)
+# ----------------- Tool: Fetch meeting summaries -----------------
+def meeting_query(sender_email, after="", before=""):
+    return build_query(f'from:{sender_email} subject:({" OR ".join(MEETING_SUBJECT_TERMS)})', after, before)
+
+def find_meeting_records(account_id, sender_email, query, after, before, max_results):
+    """(records, {message id: canonical message id}); blocking, like find_latest_email."""
+    service = accounts.service(account_id)
+    if SYNC_MODE:
+        sync_store(service, account_id)
+        records = get_store(account_id).query(
+            sender=sender_email, subject_terms=MEETING_SUBJECT_TERMS, after=epoch_ms(after) if after else None,
+            before=epoch_ms(before) if before else None, limit=max_results)
+    else:
+        message_ids = list_message_ids(service, query, max_results)
+        records = [parse_message(m) for m in fetch_messages(service, message_ids)]
+        get_search_index().add_records(records, account_id)
+    return records, find_duplicates(records)
 
-    query = f'from:{sender_email} subject:(meeting OR summary OR discussion OR minutes)'
-    results = service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-    messages = results.get('messages', [])
+@mcp.tool()
+async def fetch_meeting_summaries(sender_email: str, ctx: Context[ServerSession, None], max_results: int = 5,
+                                  after: str = "", before: str = "", account_id: str = DEFAULT_ACCOUNT,
+                                  collapse_duplicates: bool = False):
+    """
+    Meeting-summary emails from `sender_email`. Replies and forwards that quote an earlier
+    email get "duplicate_of" (its message id); with collapse_duplicates they are left out.
+    """
+    error = account_error(account_id)
+    if error:
+        ctx.error(error)
+        return {"error": error}
 
-    if not messages:
+    try:
+        query = meeting_query(sender_email, after, before)
+    except ValueError as e:
+        ctx.error(str(e))
+        return {"error": str(e)}
+
+    records, duplicates = await asyncio.to_thread(find_meeting_records, account_id, sender_email, query,
+                                                  after, before, max_results)
+    if not records:
         ctx.info(f"No meeting summary emails found for query: {query}")
         return []
 
     emails_data = []
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
-        headers = {h['name']: h['value'] for h in msg_data['payload']['headers']}
-        body = extract_body(msg_data)
-
-        emails_data.append({
+    for record in records:
+        headers = record['headers']
+        duplicate_of = duplicates.get(record['message_id'])
+        if duplicate_of and collapse_duplicates:
+            continue
+
+        email = {
+            'message_id': record['message_id'],
             'subject': headers.get('Subject', ''),
             'from': headers.get('From', ''),
             'date': headers.get('Date', ''),
-            'body': body
-        })
+            'body': record['body']
+        }
+        if duplicate_of:
+            email['duplicate_of'] = duplicate_of
+        emails_data.append(email)
         ctx.debug(f"Processed email: {headers.get('Subject','No Subject')}")
 
-    ctx.info(f"Retrieved {len(emails_data)} email summaries.")
+    ctx.info(f"Retrieved {len(emails_data)} email summaries ({len(duplicates)} near-duplicates"
+             f"{' left out' if collapse_duplicates else ''}).")
     return emails_data
 
+# ----------------- Tool: Backfill meeting summaries over a date range -----------------
+def run_backfill(account_id, query, restart):
+    """(messages stored by this run, checkpoint, messages in the store); blocking."""
+    store = get_store(account_id)
+    stored = 0
+    for records in iter_backfill(accounts.service(account_id), query, parse_message, store,
+                                 chunk_size=BACKFILL_CHUNK_SIZE, restart=restart, max_seconds=BACKFILL_MAX_SECONDS):
+        stored += store.upsert(records)
+    return stored, load_checkpoint(store, query) or {}, store.count()
+
+@mcp.tool()
+async def backfill_meeting_summaries(sender_email: str, ctx: Context[ServerSession, None], after: str = "",
+                                     before: str = "", restart: bool = False, account_id: str = DEFAULT_ACCOUNT):
+    """
+    Fetches every meeting-summary email from `sender_email` between `after` and `before`
+    (YYYY-MM-DD) into the local store and search index, a chunk at a time. Progress is
+    checkpointed (per account), and each call stops after about BACKFILL_MAX_SECONDS with
+    done: false; calling it again with the same arguments continues from the checkpoint.
+    """
+    error = account_error(account_id)
+    if error:
+        ctx.error(error)
+        return {"error": error}
+    try:
+        query = meeting_query(sender_email, after, before)
+    except ValueError as e:
+        ctx.error(str(e))
+        return {"error": str(e)}
+
+    stored, checkpoint, stored_messages = await asyncio.to_thread(run_backfill, account_id, query, restart)
+    ctx.info(f"Backfill {'complete' if checkpoint.get('done') else 'paused'}: stored {stored} messages, "
+             f"{checkpoint.get('processed', 0)} in total.")
+    return {"account_id": account_id, "query": query, "stored_this_run": stored, "processed_total": checkpoint.get("processed", 0),
+            "done": checkpoint.get("done", False), "stored_messages": stored_messages}
+
+# ----------------- Tool: Search processed emails -----------------
+@mcp.tool()
+def search_emails(ctx: Context[ServerSession, None], query: str = "", after: str = "", before: str = "",
+                  order: str = "rank", limit: int = 20, account_id: str = DEFAULT_ACCOUNT):
+    """
+    Full-text search over every email MCP1 has processed for `account_id` (subject, sender,
+    recipients, body and MCP2's attachment text), answered from the local index without calling Gmail.
+    Supports "phrases", prefix*, from:/to:/subject:/body:/attachments: terms, an
+    after/before date range (YYYY-MM-DD or epoch ms) and order = "rank" or "date".
+    """
+    if account_id not in accounts.ids():
+        ctx.error(f"Unknown account: {account_id}")
+        return {"error": f"Unknown account: {account_id}"}
+    try:
+        results = get_search_index().search(query, after=after or None, before=before or None,
+                                            order=order, limit=limit, account_id=account_id)
+    except ValueError as e:
+        ctx.error(str(e))
+        return {"error": str(e)}
+    ctx.info(f"{len(results)} matches for {query!r}.")
+    return results
+
+# ----------------- Tool: Sync the local message store -----------------
+def sync_account(account_id):
+    stats = sync_store(accounts.service(account_id), account_id)
+    stats["account_id"] = account_id
+    stats["stored_messages"] = get_store(account_id).count()
+    return stats
+
+@mcp.tool()
+async def sync_mailbox_now(ctx: Context[ServerSession, None], account_id: str = DEFAULT_ACCOUNT):
+    error = account_error(account_id)
+    if error:
+        ctx.error(error)
+        return {"error": error}
+
+    stats = await asyncio.to_thread(sync_account, account_id)
+    ctx.info(f"Mailbox sync of {account_id} ({stats['mode']}): +{stats['added']} / -{stats['deleted']} messages.")
+    return stats
+
+# ----------------- Tool: Gmail quota usage -----------------
+@mcp.tool()
+def gmail_rate_stats(ctx: Context[ServerSession, None], account_id: str = DEFAULT_ACCOUNT):
+    try:
+        stats = accounts.holder(account_id).limiter.stats()
+    except UnknownAccount:
+        ctx.error(f"Unknown account: {account_id}")
+        return {"error": f"Unknown account: {account_id}"}
+    ctx.info(f"Gmail ({account_id}): {stats['units_per_second']} units/s, concurrency {stats['concurrency_limit']}, "
+             f"{stats['throttle_events']} throttles.")
+    return stats
+
+# ----------------- MCP2 hand-off: durable queue + workers -----------------
+_job_pool = None
+_job_pool_lock = threading.Lock()
+
+# msgpack when installed, else JSON; downgraded to JSON + gzip if MCP2 answers 415 (it lacks msgpack / zstd)
+_mcp2_wire = {"format": wire.formats()[0], "encoding": wire.encodings()[0] if MCP2_COMPRESS else None}
+
+def post_batch_to_mcp2(emails):
+    import requests
+    while True:
+        content_type, encoding = _mcp2_wire["format"], _mcp2_wire["encoding"]
+        body, headers = wire.pack({"emails": emails}, content_type, encoding)
+        headers["Accept"] = ", ".join(wire.formats())
+        headers["Accept-Encoding"] = ", ".join(wire.encodings()) if MCP2_COMPRESS else "identity"
+        with metrics.span("external", call="mcp2.summarize_batch"):
+            response = requests.post(MCP2_BATCH_URL, data=body, headers=headers, timeout=MCP2_TIMEOUT, stream=True)
+            if response.status_code == 200:
+                # read the body as sent: wire decompresses it (requests would only handle gzip)
+                data = response.raw.read(decode_content=False)
+        if response.status_code == 415 and (content_type, encoding) != (wire.JSON, "gzip" if encoding else None):
+            _mcp2_wire.update(format=wire.JSON, encoding="gzip" if encoding else None)
+            continue
+        if response.status_code != 200:
+            raise RuntimeError(f"MCP2 responded with {response.status_code}: {response.text[:200]}")
+        payload = wire.unpack(data, response.headers.get("Content-Type"), response.headers.get("Content-Encoding"))
+        return payload["result"]["results"]
+
+def get_job_pool():
+    global _job_pool
+    with _job_pool_lock:
+        if _job_pool is None:
+            os.makedirs(RESOURCE_DIR, exist_ok=True)
+            _job_pool = JobWorkerPool(JobQueue(JOB_DB_PATH), post_batch_to_mcp2,
+                                      concurrency=JOB_WORKERS, batch_size=JOB_BATCH_SIZE,
+                                      max_attempts=JOB_MAX_ATTEMPTS, metrics=metrics).start()
+        return _job_pool
+
 @mcp.tool()
 def send_to_mcp2(payload: dict, ctx: Context[ServerSession, None]):
     ctx.info("Preparing data to send to MCP2...")
 
     emails = payload.get("emails", [])
-    filtered_payload = []
+    pool = get_job_pool()
+    job_ids, outcomes = [], {"created": 0, "requeued": 0, "existing": 0}
 
     for email in emails:
-        filtered_payload.append({
+        filtered_email = {
             "id": email.get("id"),
+            "message_id": email.get("message_id"),
             "subject": email.get("subject"),
             "from": email.get("from"),
             "to": email.get("to"),
             "body": email.get("body"),
-            "attachments": [att["relative_path"] for att in email.get("attachments", [])]
-        })
-
-    ctx.info(f"Sending {len(filtered_payload)} emails to MCP2...")
+            # by content hash; MCP2 reads the same blob store
+            "attachments": [wire.attachment_ref(att) for att in email.get("attachments", []) if att.get("relative_path")]
+        }
+        key = email.get("message_id") or email.get("id") or str(uuid.uuid4())
+        job_id, outcome = pool.queue.enqueue(key, filtered_email)
+        job_ids.append(job_id)
+        outcomes[outcome] += 1
+
+    pool.wake()
+    ctx.info(f"Queued {len(job_ids)} emails for MCP2 ({outcomes['existing']} already queued or sent, "
+             f"{outcomes['requeued']} previously failed and retried).")
+    return {"status": "queued", "job_ids": job_ids, "already_queued": outcomes["existing"],
+            "requeued_failed": outcomes["requeued"]}
+
+# ----------------- Tool: MCP2 job status -----------------
+@mcp.tool()
+def get_job_status(ctx: Context[ServerSession, None], job_id: str = ""):
+    queue = get_job_pool().queue
+    if not job_id:
+        return {"counts": queue.counts()}
+    job = queue.get(job_id)
+    if job is None:
+        ctx.error(f"Unknown job id: {job_id}")
+        return {"error": f"Unknown job id: {job_id}"}
+    return job
+
+
+# ----------------- Multi-account mode: sharded background polling -----------------
+_poller = None
+_poller_lock = threading.Lock()
+
+def list_account_ids():
+    return accounts.ids()
+
+def init_poll_worker():
+    set_gmail_budget_share(POLL_BUDGET_SHARE)
+
+def poll_account(account_id):
+    """One incremental sync of `account_id`; runs inside a poll worker process."""
+    if account_error(account_id):
+        return
+    stats = sync_store(accounts.service(account_id), account_id)
+    if stats['added'] or stats['deleted']:
+        print(f"{account_id}: sync ({stats['mode']}) +{stats['added']} / -{stats['deleted']} messages")
+
+def get_poller(workers=None):
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            set_gmail_budget_share(1.0 - POLL_BUDGET_SHARE)
+            _poller = ShardScheduler(list_account_ids, poll_account, workers=workers or POLL_WORKERS,
+                                     interval=POLL_INTERVAL, vnodes=HASH_RING_VNODES,
+                                     init=init_poll_worker).start()
+        return _poller
 
-    try:
-        # Send request to MCP2 server
-        import requests
-        response = requests.post(
-            "http://127.0.0.1:6278/tools/summarize_context",
-            json={"emails": filtered_payload}
-        )
+@mcp.tool()
+def list_accounts(ctx: Context[ServerSession, None]):
+    """Registered accounts, whether their token is present and which poll worker owns each."""
+    ids = accounts.ids()
+    owners = _poller.assignments(ids) if _poller is not None else {}
+    result = [{"account_id": account_id, "token_present": accounts.has_token(account_id),
+               "poll_worker": owners.get(account_id)} for account_id in ids]
+    ctx.info(f"{len(result)} account(s), {_poller.workers if _poller else 0} poll worker(s).")
+    return {"accounts": result, "poller": _poller.stats() if _poller is not None else None}
 
-        if response.status_code == 200:
-            ctx.info("✅ MCP2 accepted the payload successfully.")
-            return {"status": "success", "response": response.json()}
-        else:
-            ctx.error(f"❌ MCP2 responded with error: {response.status_code}")
-            return {"status": "error", "code": response.status_code, "text": response.text}
+@mcp.tool()
+def set_poll_workers(workers: int, ctx: Context[ServerSession, None]):
+    """
+    Starts background polling of every account with `workers` processes, or resizes it.
+    Accounts are assigned by consistent hashing, so only the accounts whose owner
+    changed move to another worker; each continues from its own sync cursor.
+    """
+    if workers < 1:
+        ctx.error("workers must be at least 1")
+        return {"error": "workers must be at least 1"}
+    ids = accounts.ids()
+    before = _poller.assignments(ids) if _poller is not None else {}
+    poller = get_poller(workers)
+    poller.resize(workers)
+    after = poller.assignments(ids)
+    moved = sum(1 for account_id in ids if before.get(account_id) != after[account_id]) if before else 0
+    ctx.info(f"{workers} poll worker(s); {moved} of {len(ids)} account(s) moved.")
+    return {"workers": workers, "accounts": len(ids), "moved": moved}
+
+
+# ----------------- Metrics (Prometheus text on GET /metrics) -----------------
+def metrics_gauges():
+    holders = accounts.holders()
+    gauges = {"accounts": len(accounts.ids())}
+    for name, key in (("gmail_units_per_second", "units_per_second"),
+                      ("gmail_concurrency_limit", "concurrency_limit"), ("gmail_in_flight", "in_flight")):
+        gauges[name] = {(("account", account_id),): holder.limiter.stats()[key]
+                        for account_id, holder in holders.items()}
+    if _poller is not None:
+        gauges["poll_workers"] = _poller.workers
+    if _job_pool is not None:
+        gauges["jobs"] = {(("status", status),): n for status, n in _job_pool.queue.counts().items()}
+    return gauges
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    from starlette.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(metrics_gauges()), media_type="text/plain; version=0.0.4")
 
-    except Exception as e:
-        ctx.error(f"⚠️ Failed to connect to MCP2: {e}")
-        return {"status": "failed", "error": str(e)}
+@mcp.tool()
+def get_metrics(ctx: Context[ServerSession, None]):
+    snapshot = metrics.snapshot()
+    ctx.info(f"{len(snapshot['stages'])} timed stages, {len(snapshot['counters'])} counters.")
+    return snapshot
 
 
-# ----------------- Main -----------------
-if __name__ == "__main__":
-    print("Starting MCP1 Email Companion in DEV mode on port 6277...")
+# ----------------- Background warm-up -----------------
+def wait_for_port(port, host="127.0.0.1", timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def warm_up(port=None):
+    """
+    Runs once the server accepts connections (when `port` is given): builds the Gmail
+    service, opens the local stores, resumes left-over hand-off jobs, then preloads
+    the last two emails for the Inspector.
+    """
+    if port is not None and not wait_for_port(port):
+        print(f"⚠️ Port {port} never opened; skipping warm-up.")
+        return
+    for name, step in (("Gmail service", gmail.service), ("search index", get_search_index),
+                       ("hand-off jobs", get_job_pool)):
+        try:
+            with metrics.span("warm_up", step=name):
+                step()
+        except Exception as e:
+            print(f"⚠️ Warm-up of {name} failed: {e}")
 
-    # Preload last 2 emails manually
     from asyncio import run
 
     async def preload_last_two_emails():
@@ -266,7 +626,18 @@ if __name__ == "__main__":
         print(f"✅ Preloaded {len(preloaded_emails)} emails for Inspector.")
         return preloaded_emails
 
-    preloaded_emails = run(preload_last_two_emails())
+    return run(preload_last_two_emails())
+
+
+# ----------------- Main -----------------
+if __name__ == "__main__":
+    print(f"Starting MCP1 Email Companion in DEV mode on port {MCP1_PORT}...")
+
+    # Gmail service, stores, job resume and the email preload happen once the port is serving
+    threading.Thread(target=warm_up, args=(MCP1_PORT,), name="mcp1-warm-up", daemon=True).start()
+
+    if POLL_WORKERS > 0:
+        get_poller()
 
     # Run MCP server
-    mcp.run(dev_mode=True, port=6277)
+    mcp.run(dev_mode=True, port=MCP1_PORT)
@@ -0,0 +1,100 @@
+"""Single-pass MIME walker for Gmail `format=full` payloads.
+
+One iterative traversal collects, in document order, the text/plain and
+text/html leaves and every part that carries a filename (at any nesting
+depth, e.g. attachments inside a forwarded message/rfc822 or a nested
+multipart/mixed). Nothing is base64-decoded during the walk: `body()` decodes
+only the chosen text part on first use, and attachment parts are handed to the
+downloader as-is, which decodes them straight to disk.
+"""
+import base64, html, re
+
+WORD_MIME_TYPES = ("application/msword",
+                   "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+
+_SCRIPT_STYLE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_BREAKS = re.compile(r'<\s*(br|/p|/div|/li|/tr|/h[1-6])\b[^>]*>', re.IGNORECASE)
+_TAGS = re.compile(r'<[^>]+>')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+def classify_mime(mime_type):
+    """Attachment category (the old resources/<subfolder> name) for a MIME type."""
+    mime_type = mime_type or ''
+    if mime_type.startswith("image/"):
+        return "image"
+    if mime_type == "application/pdf":
+        return "pdf"
+    if mime_type in WORD_MIME_TYPES:
+        return "word"
+    return "misc"
+
+
+def html_to_text(markup):
+    text = _SCRIPT_STYLE.sub('', markup)
+    text = _BREAKS.sub('\n', text)
+    text = html.unescape(_TAGS.sub('', text))
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+def _decode(data):
+    pad = -len(data) % 4
+    if pad:  # only copy the string when Gmail left the padding off
+        data += '=' * pad
+    return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+
+
+class MessageParts:
+    def __init__(self, text_parts, html_parts, attachment_parts):
+        self.text_parts = text_parts
+        self.html_parts = html_parts
+        self.attachment_parts = attachment_parts
+        self._body = None
+        self.body_type = "text/plain"
+
+    def body(self):
+        """First non-empty text/plain leaf, falling back to text/html converted to text."""
+        if self._body is None:
+            self._body = ""
+            for part in self.text_parts:
+                data = part.get('body', {}).get('data')
+                if data:
+                    self._body = _decode(data)
+                    break
+            else:
+                for part in self.html_parts:
+                    data = part.get('body', {}).get('data')
+                    if data:
+                        self._body, self.body_type = html_to_text(_decode(data)), "text/html"
+                        break
+        return self._body
+
+    def attachments(self):
+        """Metadata for every named part; no attachment data is touched."""
+        return [{
+            "filename": part['filename'],
+            "mime_type": part.get('mimeType', 'application/octet-stream'),
+            "size_bytes": part.get('body', {}).get('size', 0),
+            "category": classify_mime(part.get('mimeType')),
+            "part_id": part.get('partId'),
+        } for part in self.attachment_parts]
+
+
+def walk_payload(payload):
+    """Walk a Gmail payload once, depth first in document order."""
+    text_parts, html_parts, attachment_parts = [], [], []
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        children = part.get('parts')
+        if children:
+            stack.extend(reversed(children))
+            continue
+        mime_type = part.get('mimeType', '')
+        if part.get('filename'):
+            attachment_parts.append(part)
+        elif mime_type == 'text/plain':
+            text_parts.append(part)
+        elif mime_type == 'text/html':
+            html_parts.append(part)
+    return MessageParts(text_parts, html_parts, attachment_parts)
@@ -0,0 +1,320 @@
+"""Quota-aware rate limiting and adaptive concurrency for Gmail API calls.
+
+Gmail meters each user in quota units per second (messages.get and .list
+cost 5, history.list 2, ...). `GmailRateLimiter.wrap(service)` returns a
+proxy of the service whose requests all go through one shared limiter:
+
+- a token bucket, refilled at `units_per_second`, charged the unit cost of
+  each method (the sum of the sub-requests for a batch);
+- an AIMD concurrency limit: +1 slot per window of successful calls, halved
+  (at most once per `cooldown`) when Gmail answers 429 / 403
+  rateLimitExceeded;
+- retries with exponential backoff and full jitter, honouring Retry-After
+  (capped at `max_delay`), for throttling and transient 5xx errors,
+  including throttled sub-requests inside a batch.
+
+`stats()` reports the current unit rate, concurrency limit and throttle counts.
+With `metrics`, every HTTP round-trip is timed as an `external` span labelled
+with the Gmail method (bucket and concurrency waits are not included).
+"""
+import random, threading, time
+from collections import Counter, deque
+from contextlib import nullcontext
+
+# Gmail API quota units per method (https://developers.google.com/gmail/api/reference/quota)
+METHOD_COSTS = {
+    'messages.list': 5, 'messages.get': 5, 'messages.attachments.get': 5, 'messages.modify': 5,
+    'messages.batchModify': 50, 'messages.send': 100, 'history.list': 2, 'getProfile': 1,
+    'threads.get': 10, 'threads.list': 10, 'labels.list': 1, 'labels.get': 1,
+}
+DEFAULT_COST = 5
+THROTTLE_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded')
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+RATE_WINDOW = 10.0  # seconds over which stats() averages the unit rate
+
+
+def _status(error):
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+def is_throttle(error):
+    status = _status(error)
+    if status == 429:
+        return True
+    if status == 403:
+        content = getattr(error, 'content', b'') or b''
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', errors='ignore')
+        return any(reason in content for reason in THROTTLE_REASONS)
+    return False
+
+
+def is_retryable(error):
+    return is_throttle(error) or _status(error) in TRANSIENT_STATUSES
+
+
+def retry_after(error):
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if hasattr(resp, 'get') else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# ----------------- Token bucket -----------------
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost):
+        """Block until `cost` units are available (a cost above capacity waits for a full bucket)."""
+        cost = min(cost, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # reserve now, possibly going negative, so waiters queue in FIFO order
+            self._tokens -= cost
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def configure(self, rate, capacity):
+        with self._lock:
+            self.rate, self.capacity = rate, capacity
+            self._tokens = min(self._tokens, capacity)
+
+
+# ----------------- AIMD concurrency -----------------
+class AIMDController:
+    def __init__(self, initial=8, minimum=1, maximum=32, decrease=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def _throttled(self):
+        now = time.monotonic()
+        # one cut per cooldown: a burst of 429s from the same window is one signal
+        if now - self._last_decrease >= self.cooldown:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self._last_decrease = now
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._throttled()
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def signal_throttle(self):
+        """Throttle feedback that didn't come from a call holding a slot (a batch sub-request)."""
+        with self._cond:
+            self._throttled()
+
+
+# ----------------- Limiter -----------------
+class GmailRateLimiter:
+    def __init__(self, units_per_second=200, burst=250, initial_concurrency=8, max_concurrency=32,
+                 max_retries=5, base_delay=0.5, max_delay=32.0, metrics=None):
+        self.bucket = TokenBucket(units_per_second, burst)
+        self.controller = AIMDController(initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._spent = deque()  # (monotonic time, units) for the rate window
+        self.calls = Counter()
+        self.throttles = Counter()
+        self.retries = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+
+    def set_rate(self, units_per_second, burst):
+        """Change the unit budget in place (e.g. when another process starts sharing this user's quota)."""
+        self.bucket.configure(units_per_second, burst)
+
+    @staticmethod
+    def cost(method):
+        return METHOD_COSTS.get(method, DEFAULT_COST)
+
+    def backoff(self, attempt, error=None):
+        hinted = retry_after(error) if error is not None else None
+        if hinted is not None:
+            return min(max(hinted, 0.0), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _record(self, method, units, waited):
+        now = time.monotonic()
+        with self._lock:
+            self.calls[method] += 1
+            self.wait_seconds += waited
+            self._spent.append((now, units))
+            while self._spent and now - self._spent[0][0] > RATE_WINDOW:
+                self._spent.popleft()
+
+    def record_throttle(self, method):
+        with self._lock:
+            self.throttles[method] += 1
+
+    def count_retries(self, n):
+        with self._lock:
+            self.retries += n
+
+    def call(self, method, fn, units=None):
+        """Run `fn()` (one HTTP round-trip) under the bucket and the concurrency limit, retrying throttles."""
+        units = self.cost(method) if units is None else units
+        for attempt in range(self.max_retries + 1):
+            self.controller.acquire()
+            throttled = False
+            try:
+                self._record(method, units, self.bucket.acquire(units))
+                with self._span(method):
+                    return fn()
+            except Exception as e:
+                throttled = is_throttle(e)
+                if throttled:
+                    self.record_throttle(method)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                error = e
+            finally:
+                self.controller.release(throttled)
+            self.count_retries(1)
+            time.sleep(self.backoff(attempt, error))
+
+    def _span(self, method):
+        return self.metrics.span('external', call=f'gmail.{method}') if self.metrics is not None else nullcontext()
+
+    def wrap(self, service):
+        return _ServiceProxy(self, service)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            recent = [(t, units) for t, units in self._spent if now - t <= RATE_WINDOW]
+            return {
+                "units_per_second": round(sum(units for _, units in recent) / RATE_WINDOW, 2),
+                "calls_per_second": round(len(recent) / RATE_WINDOW, 2),
+                "concurrency_limit": round(self.controller.limit, 2),
+                "in_flight": self.controller.in_flight,
+                "throttle_events": sum(self.throttles.values()),
+                "throttles_by_method": dict(self.throttles),
+                "retries": self.retries,
+                "failures": self.failures,
+                "calls": dict(self.calls),
+                "bucket_wait_seconds": round(self.wait_seconds, 3),
+            }
+
+
+# ----------------- Service proxy -----------------
+def _method_name(path):
+    return '.'.join(p for p in path if p != 'users')
+
+
+class _RequestProxy:
+    def __init__(self, limiter, request, method):
+        self._limiter, self._request, self.method = limiter, request, method
+
+    def execute(self, *args, **kwargs):
+        return self._limiter.call(self.method, lambda: self._request.execute(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+
+class _ResourceProxy:
+    def __init__(self, limiter, resource, path):
+        self._limiter, self._resource, self._path = limiter, resource, path
+
+    def __getattr__(self, name):
+        attr = getattr(self._resource, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                return _RequestProxy(self._limiter, result, _method_name(self._path + (name,)))
+            return _ResourceProxy(self._limiter, result, self._path + (name,))
+        return call
+
+
+class _ServiceProxy(_ResourceProxy):
+    def __init__(self, limiter, service):
+        super().__init__(limiter, service, ())
+        batch_factory = getattr(service, 'new_batch_http_request', None)
+        if not callable(batch_factory):
+            self.new_batch_http_request = None  # keep the no-batch fallback visible to callers
+
+    def new_batch_http_request(self, callback=None):
+        return _BatchProxy(self._limiter, self._resource, callback)
+
+
+class _BatchProxy:
+    """
+    Collects sub-requests, then sends them as real batches charged their summed
+    cost. Throttled or transient sub-request failures are re-sent in a new
+    batch after a backoff; every callback fires once with the final outcome.
+    """
+    def __init__(self, limiter, service, callback):
+        self._limiter, self._service, self._callback = limiter, service, callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self._requests))
+        self._requests.append((request_id, request, callback))
+
+    def execute(self):
+        pending = list(self._requests)
+        for attempt in range(self._limiter.max_retries + 1):
+            outcomes, retry = {}, []
+
+            def collect(request_id, response, exception):
+                outcomes[request_id] = (response, exception)
+
+            batch = self._service.new_batch_http_request(callback=collect)
+            for request_id, request, _ in pending:
+                batch.add(getattr(request, '_request', request), request_id=request_id)
+            units = sum(self._limiter.cost(getattr(r, 'method', None)) for _, r, _ in pending)
+            self._limiter.call('batch', batch.execute, units=units)
+
+            last = attempt == self._limiter.max_retries
+            for request_id, request, callback in pending:
+                response, exception = outcomes.get(request_id, (None, None))
+                if exception is not None and is_throttle(exception):
+                    self._limiter.record_throttle(getattr(request, 'method', 'batch'))
+                if exception is not None and is_retryable(exception) and not last:
+                    retry.append((request_id, request, callback))
+                else:
+                    (callback or self._callback)(request_id, response, exception)
+            if not retry:
+                return
+            throttled = [outcomes[r[0]][1] for r in retry if is_throttle(outcomes[r[0]][1])]
+            if throttled:
+                self._limiter.controller.signal_throttle()  # one signal for the whole batch
+            self._limiter.count_retries(len(retry))
+            time.sleep(self._limiter.backoff(attempt, throttled[0] if throttled else None))
+            pending = retry
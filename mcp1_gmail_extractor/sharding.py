@@ -0,0 +1,149 @@
+"""Sharded background polling of many accounts across worker processes.
+
+`HashRing` places each worker at `vnodes` points of a 64-bit hash ring and
+assigns an account to the first worker point at or after the account's hash.
+Going from N to N+1 workers therefore moves only ~1/(N+1) of the accounts
+(the ones the new worker's points now cover); the rest keep their worker.
+
+`ShardScheduler` runs one process per worker. Every round a worker re-reads
+the account list, polls the accounts the ring assigns to it, then sleeps for
+`interval`. The worker count is shared with the processes, so `resize()`
+rebalances them in place: new workers are started, removed ones exit after
+their current account, and the others switch to the new ring between two
+accounts. Because each account's sync cursor lives in that account's own
+store, whichever worker owns an account next simply continues from it.
+
+`list_accounts`, `poll(account_id)` and the optional `init()` (run once when
+a worker starts) run inside the worker processes, so they must be picklable
+(module-level functions).
+"""
+import bisect, hashlib, multiprocessing, threading
+
+
+def _hash(key):
+    # not hash(): it is salted per process, and every worker must agree on the ring
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+def worker_name(index):
+    return f"worker-{index}"
+
+
+# ----------------- Consistent hashing -----------------
+class HashRing:
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self._points = []   # sorted (hash, node)
+        self._hashes = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            bisect.insort(self._points, (_hash(f"{node}#{i}"), node))
+        self._hashes = [h for h, _ in self._points]
+
+    def remove(self, node):
+        self._points = [p for p in self._points if p[1] != node]
+        self._hashes = [h for h, _ in self._points]
+
+    def nodes(self):
+        return sorted({node for _, node in self._points})
+
+    def node_for(self, key):
+        if not self._points:
+            raise LookupError("the hash ring has no nodes")
+        i = bisect.bisect_left(self._hashes, _hash(key)) % len(self._points)
+        return self._points[i][1]
+
+    def assignments(self, keys):
+        return {key: self.node_for(key) for key in keys}
+
+
+def ring_for(workers, vnodes=64):
+    return HashRing([worker_name(i) for i in range(workers)], vnodes)
+
+
+# ----------------- Worker processes -----------------
+def _run_worker(index, worker_count, stop, list_accounts, poll, interval, vnodes, init=None):
+    me = worker_name(index)
+    if init is not None:
+        init()
+    ring, ring_size = None, None
+    while not stop.is_set():
+        size = worker_count.value
+        if index >= size:
+            return  # scaled down
+        if size != ring_size:
+            ring, ring_size = ring_for(size, vnodes), size
+        try:
+            account_ids = list_accounts()
+        except Exception as e:
+            print(f"⚠️ {me}: could not list accounts: {e}")
+            account_ids = []
+        for account_id in account_ids:
+            if stop.is_set() or worker_count.value != ring_size:
+                break  # stopping, or the ring changed: restart the round with the new one
+            if ring.node_for(account_id) != me:
+                continue
+            try:
+                poll(account_id)
+            except Exception as e:
+                print(f"⚠️ {me}: polling {account_id} failed: {e}")
+        else:
+            stop.wait(interval)
+
+
+class ShardScheduler:
+    def __init__(self, list_accounts, poll, workers=4, interval=60.0, vnodes=64, init=None):
+        self.list_accounts = list_accounts
+        self.poll = poll
+        self.init = init
+        self.workers = workers
+        self.interval = interval
+        self.vnodes = vnodes
+        # spawn, not fork: the server process already runs threads (HTTP loop, job workers)
+        self._mp = multiprocessing.get_context('spawn')
+        self._count = self._mp.Value('i', 0)
+        self._stop = self._mp.Event()
+        self._procs = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.resize(self.workers)
+        return self
+
+    def resize(self, workers):
+        """Change the number of worker processes; only the accounts whose ring owner changed move."""
+        with self._lock:
+            self.workers = workers
+            self._count.value = workers
+            for index in range(workers):
+                proc = self._procs.get(index)
+                if proc is None or not proc.is_alive():
+                    proc = self._mp.Process(
+                        target=_run_worker, name=f"mcp1-{worker_name(index)}", daemon=True,
+                        args=(index, self._count, self._stop, self.list_accounts, self.poll,
+                              self.interval, self.vnodes, self.init))
+                    proc.start()
+                    self._procs[index] = proc
+            for index in [i for i in self._procs if i >= workers]:
+                del self._procs[index]  # exits on its own once it sees the new count
+
+    def ring(self):
+        return ring_for(self.workers, self.vnodes)
+
+    def assignments(self, account_ids):
+        return self.ring().assignments(account_ids)
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "interval": self.interval,
+                    "alive": sorted(worker_name(i) for i, p in self._procs.items() if p.is_alive())}
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        with self._lock:
+            procs, self._procs = list(self._procs.values()), {}
+        for proc in procs:
+            proc.join(timeout)
@@ -0,0 +1,199 @@
+"""Async, pooled HTTP client for the YouTube and web (Google CSE) enrichment.
+
+All requests run on one background event loop that owns a keep-alive
+`httpx.AsyncClient`, so connections survive across summarize calls made from
+any thread. YouTube view counts for all search hits come from a single
+multi-id `videos` call, CSE lookups for several keywords run concurrently,
+and every request goes through a per-host concurrency cap. `enrich` runs the
+YouTube and web lookups side by side under one overall deadline. With a
+`cache` (see enrichment_cache.py) each YouTube query and each CSE keyword is
+looked up there first, and failures are remembered briefly. Identical lookups
+that are in flight at the same time share one request. With `metrics`, every
+HTTP call is timed as an `external` span and lookup timeouts are counted.
+"""
+import asyncio, threading
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+import httpx
+from enrichment_cache import EnrichmentCache
+from mcp_common.metrics import bind
+
+GOOGLE_API_BASE = "https://www.googleapis.com"
+
+
+class EnrichmentClient:
+    def __init__(self, api_key, cx, base_url=GOOGLE_API_BASE, total_timeout=8.0,
+                 request_timeout=5.0, per_host_limit=8, max_connections=32, cache=None, metrics=None):
+        self.api_key = api_key
+        self.cx = cx
+        self.base_url = base_url.rstrip("/")
+        self.total_timeout = total_timeout
+        self.request_timeout = request_timeout
+        self.per_host_limit = per_host_limit
+        self.max_connections = max_connections
+        self.cache = cache
+        self.metrics = metrics
+        self._loop = None
+        self._client = None
+        self._host_limits = {}
+        self._inflight = {}
+        self._start_lock = threading.Lock()
+
+    # ----------------- Background loop -----------------
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._client = httpx.AsyncClient(
+                    timeout=self.request_timeout,
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections))
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name="mcp2-enrichment", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    def start(self):
+        """Start the loop and HTTP client now instead of on the first lookup."""
+        self._ensure_loop()
+        return self
+
+    def submit(self, coro):
+        """Schedule `coro` on the client loop and return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(bind(coro), self._ensure_loop())
+
+    def run(self, coro):
+        """Blocking helper for sync callers (never call it from the client loop itself)."""
+        return self.submit(coro).result()
+
+    def close(self):
+        if self._loop is None:
+            return
+        self.run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    # ----------------- HTTP -----------------
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    def _span(self, call):
+        return self.metrics.span("external", call=call) if self.metrics is not None else nullcontext()
+
+    async def _get_json(self, path, params, call):
+        url = self.base_url + path
+        async with self._host_limit(url):
+            with self._span(call):
+                resp = await self._client.get(url, params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    # ----------------- Cache -----------------
+    async def _cached(self, key, fetch):
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        task = self._inflight[key] = asyncio.ensure_future(fetch())
+        try:
+            value = await asyncio.shield(task)
+        except Exception:
+            if self.cache is not None:
+                self.cache.put(key, [], failed=True)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        if self.cache is not None:
+            self.cache.put(key, value)
+        return value
+
+    # ----------------- Lookups -----------------
+    async def youtube_videos(self, keywords, max_results=5):
+        if not self.api_key:
+            return []
+        key = EnrichmentCache.key("youtube", keywords, max_results)
+        return await self._cached(key, lambda: self._youtube_videos(keywords, max_results))
+
+    async def _youtube_videos(self, keywords, max_results):
+        search = await self._get_json("/youtube/v3/search", {
+            "part": "snippet", "type": "video", "q": " ".join(keywords),
+            "key": self.api_key, "maxResults": max_results}, "youtube.search")
+        video_ids = [item["id"]["videoId"] for item in search.get("items", [])
+                     if item.get("id", {}).get("videoId")]
+        if not video_ids:
+            return []
+        stats = await self._get_json("/youtube/v3/videos", {
+            "part": "statistics,snippet", "id": ",".join(video_ids), "key": self.api_key}, "youtube.videos")
+        videos = []
+        for info in stats.get("items", []):
+            videos.append({
+                "title": info["snippet"]["title"],
+                "url": f"https://www.youtube.com/watch?v={info['id']}",
+                "views": int(info.get("statistics", {}).get("viewCount", 0)),
+            })
+        videos.sort(key=lambda x: x["views"], reverse=True)
+        return videos[:max_results]
+
+    async def web_search(self, keyword):
+        key = EnrichmentCache.key("web", keyword)
+        return await self._cached(key, lambda: self._web_search(keyword))
+
+    async def _web_search(self, keyword):
+        resp = await self._get_json("/customsearch/v1", {"key": self.api_key, "cx": self.cx, "q": keyword}, "cse")
+        return [{"title": item.get("title"), "url": item.get("link"), "snippet": item.get("snippet", "")}
+                for item in resp.get("items", [])]
+
+    async def web_resources(self, keywords, max_results=5):
+        if not self.cx:
+            return []
+        results = await asyncio.gather(*(self.web_search(kw) for kw in keywords[:3]), return_exceptions=True)
+        web_resources = []
+        for kw, result in zip(keywords[:3], results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Web search error for '{kw}': {result}")
+                continue
+            web_resources.extend(result)
+        return web_resources[:max_results]
+
+    async def guarded(self, name, coro, timeout=None):
+        """Await one lookup; an error or running past `timeout` yields []."""
+        timeout = self.total_timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ {name} lookup timed out after {timeout}s")
+            if self.metrics is not None:
+                self.metrics.inc("enrichment_timeouts", lookup=name)
+        except Exception as e:
+            print(f"⚠️ {name} lookup error: {e}")
+            if self.metrics is not None:
+                self.metrics.inc("enrichment_errors", lookup=name)
+        return []
+
+    def submit_lookups(self, keywords, max_results=5):
+        """Start the YouTube and web lookups separately: {name: concurrent future}."""
+        return {
+            "youtube_videos": self.submit(self.guarded("youtube_videos", self.youtube_videos(keywords, max_results))),
+            "web_resources": self.submit(self.guarded("web_resources", self.web_resources(keywords, max_results))),
+        }
+
+    async def enrich(self, keywords, max_results=5):
+        """YouTube and web results side by side; a lookup that fails or misses the deadline yields []."""
+        youtube_videos, web_resources = await asyncio.gather(
+            self.guarded("youtube_videos", self.youtube_videos(keywords, max_results)),
+            self.guarded("web_resources", self.web_resources(keywords, max_results)))
+        return {"youtube_videos": youtube_videos, "web_resources": web_resources}
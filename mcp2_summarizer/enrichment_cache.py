@@ -0,0 +1,174 @@
+"""TTL + LRU cache for enrichment lookups, with negative caching.
+
+Keys are normalized word sets ("AWS, serverless" == "serverless aws"), so
+repeated meeting topics don't spend YouTube/CSE quota again. Empty or failed
+lookups are cached with a much shorter TTL so an outage doesn't turn into a
+retry storm. Entries live in a bounded in-memory LRU (entry count and
+approximate bytes) with an optional SQLite file behind it that survives
+restarts. Disk writes are write-behind: `put` only updates memory and a pending
+map, and a writer thread commits the pending rows in batches, so callers on an
+event loop never wait on an fsync. `close()` flushes what is left. `stats()`
+exposes hit/miss counters for sizing.
+"""
+import json, os, re, sqlite3, threading, time
+from collections import OrderedDict
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+_PUNCTUATION = "\"'.:!?()[]{}"
+
+
+def normalize_keywords(keywords):
+    words = (word.strip(_PUNCTUATION) for kw in keywords if kw for word in _SEPARATORS.split(kw.lower()))
+    return " ".join(sorted({word for word in words if word}))
+
+
+class EnrichmentCache:
+    def __init__(self, ttl=6 * 3600, negative_ttl=120, max_entries=4096,
+                 max_bytes=32 * 1024 * 1024, disk_path=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = self.misses = self.negative_hits = self.evictions = 0
+        self._db = self._writer_db = None
+        self._pending = {}              # key -> (encoded, expires), not in SQLite yet
+        self._write_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._closed = False
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            self._db = self._connect(disk_path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+            self._db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            self._db.commit()
+            self._writer_db = self._connect(disk_path)
+            threading.Thread(target=self._write_behind, name="mcp2-enrichment-cache", daemon=True).start()
+
+    @staticmethod
+    def _connect(path):
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; a crash only loses the last commits
+        return db
+
+    @staticmethod
+    def key(kind, keywords, max_results=None):
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        return f"{kind}|{max_results}|{normalize_keywords(keywords)}"
+
+    # ----------------- Lookup -----------------
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                self._drop(key)
+                entry = None
+            if entry is None and key in self._pending:
+                encoded, expires = self._pending[key]
+                if expires >= now:
+                    self._insert(key, json.loads(encoded), expires, len(encoded))
+                    entry = self._entries[key]
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+                if row and row[1] >= now:
+                    value = json.loads(row[0])
+                    self._insert(key, value, row[1], len(row[0]))
+                    entry = self._entries[key]
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if not entry[1]:
+                self.negative_hits += 1
+            return entry[1]
+
+    # ----------------- Store -----------------
+    def put(self, key, value, failed=False):
+        """Cache `value`; empty or failed results use the short negative TTL."""
+        ttl = self.negative_ttl if (failed or not value) else self.ttl
+        expires = time.time() + ttl
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._insert(key, value, expires, len(encoded))
+            if self._db is not None:
+                self._pending[key] = (encoded, expires)
+                self._dirty.set()
+
+    def _insert(self, key, value, expires, size):
+        self._entries[key] = (expires, value, size)
+        self._bytes += size
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    # ----------------- Disk writer -----------------
+    def _write_behind(self):
+        while not self._closed:
+            self._dirty.wait()
+            self._dirty.clear()
+            self.flush()
+
+    def flush(self):
+        """Commit the pending disk writes now, in the calling thread."""
+        if self._writer_db is None:
+            return
+        with self._write_lock:
+            with self._lock:
+                rows = [(key, encoded, expires) for key, (encoded, expires) in self._pending.items()]
+                self._pending.clear()
+            if not rows:
+                return
+            with self._writer_db:
+                self._writer_db.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", rows)
+                self._puts += len(rows)
+                if self._puts >= 256:
+                    self._puts = 0
+                    self._writer_db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+
+    def close(self):
+        """Flush pending writes and stop the writer thread."""
+        if self._writer_db is None or self._closed:
+            return
+        self._closed = True
+        self._dirty.set()
+        self.flush()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self._bytes = 0
+        if self._db is not None:
+            with self._write_lock, self._writer_db:
+                self._writer_db.execute("DELETE FROM cache")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "persistent": self._db is not None,
+                "pending_writes": len(self._pending),
+            }
@@ -0,0 +1,400 @@
+"""Attachment text extraction with a content-hash cache and a process pool.
+
+Parsed text is cached per (sha256 of the file, mtime): an in-memory LRU in
+front of one `<sha>.txt` file per entry on disk, both bounded in total size.
+The disk total is scanned once at start and then tracked on each put; the
+directory is only listed again when a put takes it over the cap.
+Cache misses are parsed in a process pool because PDF parsing is CPU bound and
+holds the GIL. Workers come from a forkserver (spawn where there is none), never
+a fork of the server: it already runs threads (uvicorn, the enrichment loop,
+to_thread workers), and a forked child can deadlock on a lock one of them held.
+With `metrics`, each parse is recorded as `extract.parse` (timed inside the
+worker, so pool queueing is excluded) labelled with the file type.
+
+Documents are read page by page (paragraph by paragraph for DOCX) and parsing
+stops as soon as a `max_chars` / `max_pages` budget is met, so a summary of a
+300-page PDF only pays for the first pages; `max_chars=None` gives the full
+text (for the search index). Budgeted results are cached under their own key;
+a document that fit inside the budget is also cached as its full text. Each
+file gets `timeout` seconds (checked between pages, and enforced with SIGALRM
+inside a page on Unix) and each worker a `memory_limit` of extra address space.
+A worker that dies outright (a segfault or an allocation failure inside a C
+parser) breaks the pool: it is replaced, and the files it was parsing are
+parsed again one at a time so only the one that kills a worker again is
+marked cut="error".
+"""
+import hashlib, multiprocessing, os, signal, threading, time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+HASH_CHUNK = 1 << 20
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+PARSEABLE_EXTENSIONS = (".pdf", ".docx", ".doc")
+
+
+# ----------------- Parsing (runs in worker processes) -----------------
+class ExtractionTimeout(Exception):
+    pass
+
+
+def load_parsers():
+    """Import the parser libraries ahead of the first parse (they are imported lazily, not by the server)."""
+    import docx, PyPDF2
+
+
+def limit_memory(limit_bytes):
+    """Worker initializer: cap the address space at its current size + `limit_bytes` (Linux only),
+    so a malformed document raises MemoryError in its worker instead of exhausting the host."""
+    try:
+        import resource
+        with open('/proc/self/status') as f:
+            current = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmSize:'))
+        hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+        soft = current + limit_bytes
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    except (ImportError, OSError, ValueError, StopIteration):
+        pass
+
+
+def init_worker(memory_limit=None):
+    """Pool initializer. Make sure no server SIGTERM/SIGINT handler (which only sets a flag in a server
+    loop that isn't running here) is in place: restore Python's defaults so the worker can be stopped."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    if memory_limit:
+        limit_memory(memory_limit)
+
+
+def iter_text(full_path):
+    """Yield a PDF's text page by page, or a DOC(X)'s paragraph by paragraph, parsing only as far as consumed."""
+    lower = full_path.lower()
+    if lower.endswith(".pdf"):
+        from PyPDF2 import PdfReader
+        for page in PdfReader(full_path).pages:
+            yield page.extract_text() or ""
+    elif lower.endswith(".docx") or lower.endswith(".doc"):
+        import docx
+        for para in docx.Document(full_path).paragraphs:
+            yield para.text
+
+
+@contextmanager
+def _alarm(timeout):
+    """Interrupt a parse stuck inside a single page (needs SIGALRM and the main thread, i.e. a Unix worker)."""
+    if not timeout or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise ExtractionTimeout()
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def extract_text(full_path, max_chars=None, max_pages=None, timeout=None):
+    """
+    Read one PDF/DOC(X) file until a budget is met: returns (text, cut) where `cut`
+    is None when the whole document was read, else why reading stopped early
+    ("chars", "pages", "timeout", "memory" or "error"). Text read before a cut is kept.
+    """
+    pieces, total, cut = [], 0, None
+    deadline = time.monotonic() + timeout if timeout else None
+    kind = "PDF" if full_path.lower().endswith(".pdf") else "DOC"
+    if kind != "PDF":
+        max_pages = None  # DOCX has no pages, only paragraphs
+    try:
+        with _alarm(timeout):
+            for n, piece in enumerate(iter_text(full_path)):
+                if max_pages is not None and n >= max_pages:
+                    cut = "pages"
+                    break
+                if max_chars is not None and total + len(piece) >= max_chars:
+                    pieces.append(piece[:max_chars - total])
+                    cut = "chars"
+                    break
+                pieces.append(piece)
+                total += len(piece) + 1
+                if deadline is not None and time.monotonic() > deadline:
+                    raise ExtractionTimeout()
+    except ExtractionTimeout:
+        print(f"Timed out reading {kind} {full_path} after {timeout}s; keeping {total} chars")
+        cut = "timeout"
+    except MemoryError:
+        pieces = []
+        print(f"Memory limit hit reading {kind} {full_path}")
+        cut = "memory"
+    except Exception as e:
+        print(f"Error reading {kind} {full_path}: {e}")
+        cut = "error"
+    return " ".join(pieces).strip(), cut
+
+
+def timed_extract_text(full_path, max_chars=None, max_pages=None, timeout=None):
+    start = time.perf_counter()
+    text, cut = extract_text(full_path, max_chars, max_pages, timeout)
+    return text, cut, time.perf_counter() - start
+
+
+def file_sha256(full_path):
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ----------------- Cache -----------------
+class ExtractionCache:
+    def __init__(self, cache_dir, max_memory_bytes=64 << 20, max_disk_bytes=512 << 20):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()   # key -> text
+        self._memory_bytes = 0
+        self._hashes = {}              # (path, size, mtime_ns) -> sha256, avoids re-hashing unchanged files
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self.hits = self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = sum(size for _, size, _ in self._disk_entries())  # kept up to date by put/evict
+
+    def key_for(self, full_path):
+        st = os.stat(full_path)
+        stat_key = (full_path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            sha = self._hashes.get(stat_key)
+        if sha is None:
+            sha = file_sha256(full_path)
+            with self._lock:
+                if len(self._hashes) > 10_000:
+                    self._hashes.clear()
+                self._hashes[stat_key] = sha
+        return f"{sha}-{st.st_mtime_ns}"
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    def get(self, key):
+        text = self.peek(key)
+        self.record(text is not None)
+        return text
+
+    def peek(self, key):
+        """Like `get`, without counting a hit or miss (for a lookup that tries several keys)."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)  # mtime doubles as last-use time for disk eviction
+        except OSError:
+            return None
+        self._remember(key, text)
+        return text
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, text):
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = text.encode('utf-8')
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        try:
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_bytes += len(data) - replaced
+            over = self._disk_bytes > self.max_disk_bytes
+        self._remember(key, text)
+        if over:
+            self._evict_disk()
+
+    def _remember(self, key, text):
+        size = len(text.encode('utf-8'))
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = text
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, old = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old.encode('utf-8'))
+
+    def _disk_entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.txt'):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _evict_disk(self):
+        """Remove least recently used files down to 90% of the cap, so the next puts don't scan again."""
+        if not self._evict_lock.acquire(blocking=False):
+            return  # another thread is already evicting
+        try:
+            entries = self._disk_entries()
+            total = sum(size for _, size, _ in entries)
+            target = self.max_disk_bytes * 0.9
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            with self._lock:
+                self._disk_bytes = total  # resync with what is really on disk
+        finally:
+            self._evict_lock.release()
+
+
+# ----------------- Cached, parallel extraction -----------------
+class Extractor:
+    def __init__(self, cache, max_workers=None, metrics=None, timeout=30.0, memory_limit=1 << 30):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.metrics = metrics
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker,
+                                                 initargs=(self.memory_limit,),
+                                                 mp_context=multiprocessing.get_context(START_METHOD))
+            return self._pool
+
+    def _drop_pool(self, broken):
+        """Forget a pool whose worker died; the next `_get_pool` starts a fresh one."""
+        with self._pool_lock:
+            if self._pool is broken:
+                self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, full_path, max_chars, max_pages):
+        """(pool, future) for one parse, replacing a pool that another call already found broken."""
+        pool = self._get_pool()
+        try:
+            return pool, pool.submit(timed_extract_text, full_path, max_chars, max_pages, self.timeout)
+        except BrokenProcessPool:
+            self._drop_pool(pool)
+            pool = self._get_pool()
+            return pool, pool.submit(timed_extract_text, full_path, max_chars, max_pages, self.timeout)
+
+    def _result(self, future, full_path):
+        """(text, cut, seconds); seconds is None when the worker never reported back."""
+        try:
+            # backstop for a worker that could not be interrupted (no SIGALRM on Windows)
+            return future.result(timeout=self.timeout * 2 + 5 if self.timeout else None)
+        except FutureTimeout:
+            print(f"Gave up waiting for {full_path}")
+            return "", "timeout", None
+
+    def warm_up(self):
+        """Start the worker processes and import the parsers in them before the first real parse."""
+        pool = self._get_pool()
+        for future in [pool.submit(load_parsers) for _ in range(self.max_workers or os.cpu_count() or 1)]:
+            future.result()
+
+    def _lookup(self, key, budget_key, max_chars):
+        if budget_key == key:
+            return self.cache.get(key)
+        text = self.cache.peek(budget_key)
+        if text is None:
+            # a full text parsed earlier (e.g. for the search index) serves any budget
+            text = self.cache.peek(key)
+            if text is not None and max_chars is not None:
+                text = text[:max_chars]
+        self.cache.record(text is not None)  # one hit or miss per file, however many keys were tried
+        return text
+
+    def extract_many(self, full_paths, max_chars=None, max_pages=None):
+        """Texts for `full_paths` in order, each read only up to the budget; cache misses are parsed in parallel."""
+        budget = f"-c{max_chars}p{max_pages}" if (max_chars, max_pages) != (None, None) else ""
+        texts = [None] * len(full_paths)
+        pending = {}   # key -> (full_path, budget key, [indexes])
+        for i, full_path in enumerate(full_paths):
+            key = self.cache.key_for(full_path)
+            text = self._lookup(key, key + budget, max_chars)
+            if text is not None:
+                texts[i] = text
+            elif key in pending:
+                pending[key][2].append(i)
+            else:
+                pending[key] = (full_path, key + budget, [i])
+
+        if not pending:
+            return texts
+        submitted = {key: self._submit(full_path, max_chars, max_pages) for key, (full_path, _, _) in pending.items()}
+        crashed = []
+        for key, (pool, future) in submitted.items():
+            try:
+                outcome = self._result(future, pending[key][0])
+            except BrokenProcessPool:
+                self._drop_pool(pool)
+                crashed.append(key)
+                continue
+            self._store(key, pending[key], outcome, texts)
+        # a broken pool fails every file it held, not just the one that killed the worker:
+        # parse those again one at a time and only mark the file that breaks a pool again
+        for key in crashed:
+            full_path = pending[key][0]
+            pool, future = self._submit(full_path, max_chars, max_pages)
+            try:
+                outcome = self._result(future, full_path)
+            except BrokenProcessPool:
+                print(f"A parser worker died reading {full_path}")
+                self._drop_pool(pool)
+                outcome = "", "error", None
+            self._store(key, pending[key], outcome, texts)
+        return texts
+
+    def _store(self, key, entry, outcome, texts):
+        (full_path, budget_key, indexes), (text, cut, seconds) = entry, outcome
+        if self.metrics is not None:
+            kind = os.path.splitext(full_path)[1].lower().lstrip('.') or 'unknown'
+            if seconds is not None:
+                self.metrics.observe('extract.parse', seconds, kind=kind)
+            if cut is not None:
+                self.metrics.inc('extract_cutoffs', reason=cut, kind=kind)
+        if cut not in ("timeout", "memory"):
+            # a timed-out or oversized file is retried on the next request rather than cached truncated
+            self.cache.put(budget_key, text)
+            if cut is None and budget_key != key:
+                self.cache.put(key, text)
+        for i in indexes:
+            texts[i] = text
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
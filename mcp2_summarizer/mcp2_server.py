@@ -1,40 +1,88 @@
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.session import ServerSession
-import os, json, requests, pickle, docx
-from PyPDF2 import PdfReader
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import os, json, pickle, threading, uuid
+from concurrent.futures import ThreadPoolExecutor
+from extraction import ExtractionCache, Extractor, PARSEABLE_EXTENSIONS
+from enrichment import EnrichmentClient, GOOGLE_API_BASE
+from enrichment_cache import EnrichmentCache
+from mcp_common.output_store import OutputStore
+from mcp_common.search_index import SearchIndex
+from mcp_common.metrics import Metrics, collect
+from mcp_common import wire
+from mcp_common.dedup import SimHashIndex, simhash
 
 # ----------------- Configuration -----------------
 RESOURCE_DIR = os.path.abspath("../resources")
 CLIENT_SECRET_PATH = "../secrets/client_secret.json"
 TOKEN_PATH = "../secrets/token_mcp2.pickle"
-
-# ----------------- Load YouTube + Google CSE keys -----------------
-KEY_FILE = "../secrets/mcp2.json"
-if not os.path.exists(KEY_FILE):
-    print(f"⚠️ Warning: API key file not found at expected path: {KEY_FILE}. Continuing without external keys.")
-    key_data = {}
-else:
-    try:
-        with open(KEY_FILE, "r") as f:
-            key_data = json.load(f)
-    except Exception as e:
-        print(f"⚠️ Error reading {KEY_FILE}: {e}. Continuing without external keys.")
-        key_data = {}
-
-YOUTUBE_API_KEY = key_data.get("YOUTUBE_API_KEY", "")
-GOOGLE_CX = key_data.get("GOOGLE_CX", "")
-
-if not YOUTUBE_API_KEY:
-    print("⚠️ YOUTUBE_API_KEY not provided; YouTube enrichment will be skipped.")
+EXTRACT_CACHE_DIR = os.path.join(RESOURCE_DIR, ".cache", "extract")
+OUTPUT_STORE_DIR = os.path.join(RESOURCE_DIR, "store")  # replaces the single summary.json
+SEARCH_INDEX_PATH = os.path.join(RESOURCE_DIR, "search.sqlite3")  # shared with MCP1's search_emails
+EXTRACT_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+EXTRACT_CACHE_DISK_BYTES = 512 * 1024 * 1024
+EXTRACT_WORKERS = None  # process pool size, None = CPU count
+EXTRACT_SUMMARY_CHARS = 20_000   # attachment text read for summaries/topics; parsing stops there
+EXTRACT_SUMMARY_PAGES = 30       # PDF pages read for summaries/topics
+EXTRACT_FULL_CHARS = 5_000_000   # full-text mode (search index), bounded per file
+EXTRACT_TIMEOUT = 30.0           # seconds per file, then the text read so far is kept
+EXTRACT_MEMORY_LIMIT = 1 << 30   # extra address space per extraction worker (Linux)
+TOPIC_MODEL_PATH = os.path.join(RESOURCE_DIR, ".cache", "topics.npz")  # document frequencies across all mail
+TOPIC_KEYWORDS = 8      # extracted keywords per email
+TOPIC_SENTENCES = 3     # key sentences per email
+DEDUP_INDEX_PATH = os.path.join(RESOURCE_DIR, ".cache", "dedup.sqlite3")  # SimHash of every summarized email
+DEDUP_MAX_DISTANCE = 6  # fingerprint bits a reply/forward may differ by and still reuse the original's summary
+METRICS_NAMESPACE = "mcp2"  # prefix of every series on GET /metrics
+TIMINGS_HEADER = b"x-mcp2-timings"  # or ?timings=1: add a per-request stage breakdown to the response
+MAX_REQUEST_BYTES = 64 * 1024 * 1024  # per tool request body, before and after decompression (else 413)
+
+KEY_FILE = "../secrets/mcp2.json"  # YOUTUBE_API_KEY, GOOGLE_CX, optional GOOGLE_API_BASE (read on first use)
+ENRICH_TOTAL_TIMEOUT = 8.0      # seconds for YouTube + web lookups together
+ENRICH_REQUEST_TIMEOUT = 5.0    # seconds per HTTP request
+ENRICH_PER_HOST_LIMIT = 8       # concurrent requests per API host
+ENRICH_CACHE_TTL = 6 * 3600     # seconds a non-empty lookup stays cached
+ENRICH_CACHE_NEGATIVE_TTL = 120 # seconds an empty/failed lookup stays cached
+ENRICH_CACHE_MAX_ENTRIES = 4096
+ENRICH_CACHE_MAX_BYTES = 32 * 1024 * 1024
+ENRICH_CACHE_PATH = os.path.join(RESOURCE_DIR, ".cache", "enrichment.sqlite3")  # None = memory only
 
 # ----------------- Initialize MCP -----------------
 mcp = FastMCP("MCP2_Summarizer")
+metrics = Metrics(METRICS_NAMESPACE)
+
+# ----------------- Load YouTube + Google CSE keys (on first use) -----------------
+_api_keys = None
+_api_keys_lock = threading.Lock()
+
+def api_keys():
+    global _api_keys
+    with _api_keys_lock:
+        if _api_keys is not None:
+            return _api_keys
+        if not os.path.exists(KEY_FILE):
+            print(f"⚠️ Warning: API key file not found at expected path: {KEY_FILE}. Continuing without external keys.")
+            key_data = {}
+        else:
+            try:
+                with open(KEY_FILE, "r") as f:
+                    key_data = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Error reading {KEY_FILE}: {e}. Continuing without external keys.")
+                key_data = {}
+        _api_keys = {
+            "YOUTUBE_API_KEY": key_data.get("YOUTUBE_API_KEY", ""),
+            "GOOGLE_CX": key_data.get("GOOGLE_CX", ""),
+            "GOOGLE_API_BASE": key_data.get("GOOGLE_API_BASE", GOOGLE_API_BASE),  # a local stub for tests/benchmarks
+        }
+        if not _api_keys["YOUTUBE_API_KEY"]:
+            print("⚠️ YOUTUBE_API_KEY not provided; YouTube enrichment will be skipped.")
+        return _api_keys
+
 
 # ----------------- Google Resource Auth -----------------
 @mcp.resource("google://mcp2-service")
 def google_service():
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
     SCOPES = [
         "https://www.googleapis.com/auth/youtube.readonly",
         "https://www.googleapis.com/auth/drive.readonly",
@@ -63,117 +111,412 @@ def google_service():
 
 
 # ----------------- Helper: Extract text from attachments -----------------
-def extract_text_from_file(filepath):
-    full_path = os.path.join(RESOURCE_DIR, filepath)
-    text = ""
-    if not os.path.exists(full_path):
-        return f"[File not found: {filepath}]"
+_extractor = None
+_extractor_lock = threading.Lock()
 
-    if filepath.endswith(".pdf"):
-        try:
-            reader = PdfReader(full_path)
-            for page in reader.pages:
-                text += page.extract_text() + " "
-        except Exception as e:
-            print(f"Error reading PDF {filepath}: {e}")
-    elif filepath.endswith(".docx") or filepath.endswith(".doc"):
-        try:
-            doc = docx.Document(full_path)
-            for para in doc.paragraphs:
-                text += para.text + " "
-        except Exception as e:
-            print(f"Error reading DOC {filepath}: {e}")
-    return text.strip()
+def get_extractor():
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            cache = ExtractionCache(EXTRACT_CACHE_DIR, EXTRACT_CACHE_MEMORY_BYTES, EXTRACT_CACHE_DISK_BYTES)
+            _extractor = Extractor(cache, max_workers=EXTRACT_WORKERS, metrics=metrics,
+                                   timeout=EXTRACT_TIMEOUT, memory_limit=EXTRACT_MEMORY_LIMIT)
+        return _extractor
 
 
-# ----------------- Helper: Generate summary -----------------
-def generate_summary(keywords, attachment_texts):
-    combined_text = " ".join(attachment_texts)
-    summary = f"🧩 Summary based on keywords: {', '.join(keywords)}.\n\n"
-    if combined_text:
-        summary += "📄 Attachment Highlights:\n" + combined_text[:700] + "..."
-    else:
-        summary += "No attachment content found."
-    return summary
+def attachment_paths(refs):
+    """Blob paths for the attachments of a payload, which MCP1 sends as content-hash refs (see wire.py)."""
+    return [wire.attachment_path(ref) for ref in refs or []]
 
 
-# ----------------- Helper: Fetch top YouTube videos -----------------
-def fetch_youtube_videos(keywords, max_results=5):
-    query = " ".join(keywords)
-    url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&type=video&q={query}&key={YOUTUBE_API_KEY}&maxResults={max_results}"
+def extract_texts(filepaths, full=False):
+    """
+    Text for each attachment path (relative to RESOURCE_DIR), cached by content hash.
+    Only the first EXTRACT_SUMMARY_CHARS / EXTRACT_SUMMARY_PAGES are read unless `full`.
+    """
+    texts = [""] * len(filepaths)
+    to_parse = []
+    for i, filepath in enumerate(filepaths):
+        full_path = os.path.join(RESOURCE_DIR, filepath)
+        if not os.path.exists(full_path):
+            texts[i] = f"[File not found: {filepath}]"
+        elif filepath.lower().endswith(PARSEABLE_EXTENSIONS):
+            to_parse.append((i, full_path))
+    if to_parse:
+        if full:
+            budget = {"max_chars": EXTRACT_FULL_CHARS}
+        else:
+            budget = {"max_chars": EXTRACT_SUMMARY_CHARS, "max_pages": EXTRACT_SUMMARY_PAGES}
+        with metrics.span("extract.full" if full else "extract"):
+            parsed = get_extractor().extract_many([full_path for _, full_path in to_parse], **budget)
+        for (i, _), text in zip(to_parse, parsed):
+            texts[i] = text
+    return texts
+
+
+# ----------------- Helper: Attachment text -> MCP1's search index -----------------
+_search_index = None
+_search_index_lock = threading.Lock()
+
+def get_search_index():
+    global _search_index
+    with _search_index_lock:
+        if _search_index is None:
+            os.makedirs(RESOURCE_DIR, exist_ok=True)
+            _search_index = SearchIndex(SEARCH_INDEX_PATH)
+        return _search_index
+
+
+_index_executor = None
+_index_executor_lock = threading.Lock()
+
+def index_attachments(items):
+    """
+    (message_id, [attachment paths]) pairs: full-text extraction and indexing run on a
+    background thread, off the request path. Emails without a Gmail id or attachments are skipped.
+    """
+    global _index_executor
+    items = [(message_id, list(paths)) for message_id, paths in items if message_id and paths]
+    if not items:
+        return
+    with _index_executor_lock:
+        if _index_executor is None:
+            _index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcp2-index")
+    _index_executor.submit(_index_attachments, items)
+
+
+def _index_attachments(items):
     try:
-        resp = requests.get(url).json()
-        items = resp.get("items", [])
-        videos = []
-        for item in items:
-            video_id = item["id"]["videoId"]
-            stats_url = f"https://www.googleapis.com/youtube/v3/videos?part=statistics,snippet&id={video_id}&key={YOUTUBE_API_KEY}"
-            stats_resp = requests.get(stats_url).json()
-            if stats_resp.get("items"):
-                info = stats_resp["items"][0]
-                title = info["snippet"]["title"]
-                views = int(info["statistics"].get("viewCount", 0))
-                url = f"https://www.youtube.com/watch?v={video_id}"
-                videos.append({"title": title, "url": url, "views": views})
-        videos.sort(key=lambda x: x["views"], reverse=True)
-        return videos[:max_results]
+        paths = list(dict.fromkeys(path for _, message_paths in items for path in message_paths))
+        texts = dict(zip(paths, extract_texts(paths, full=True)))
+        rows = [(message_id, "\n\n".join(texts[p] for p in message_paths
+                                          if texts[p] and not texts[p].startswith("[File not found")))
+                for message_id, message_paths in items]
+        with metrics.span("index"):
+            get_search_index().set_attachment_text(rows)
     except Exception as e:
-        print(f"⚠️ YouTube API error: {e}")
-        return []
-
-
-# ----------------- Helper: Web search (Google CSE) -----------------
-def fetch_web_resources(keywords, max_results=5):
-    if not GOOGLE_CX:
-        print("⚠️ GOOGLE_CX not provided — skipping web search.")
-        return []
-    web_resources = []
-    for kw in keywords[:3]:
-        url = f"https://www.googleapis.com/customsearch/v1?key={YOUTUBE_API_KEY}&cx={GOOGLE_CX}&q={kw}"
+        print(f"⚠️ Attachment indexing failed: {e}")
+
+
+# ----------------- Helper: Topic extraction (local TF-IDF) -----------------
+_topic_model = None
+_topic_lock = threading.Lock()
+
+def get_topic_model():
+    global _topic_model
+    with _topic_lock:
+        if _topic_model is None:
+            from topics import TopicModel  # numpy + scipy, ~200 ms to import
+            _topic_model = TopicModel(TOPIC_MODEL_PATH)
+        return _topic_model
+
+
+def extract_topics(body, attachment_texts, doc_id=None):
+    """Keywords and key sentences from the email body plus its parsed attachments."""
+    texts = [body or "", *(t for t in attachment_texts if not t.startswith("[File not found"))]
+    with metrics.span("topics"):
+        return get_topic_model().analyze("\n\n".join(t for t in texts if t),
+                                         top_k=TOPIC_KEYWORDS, n_sentences=TOPIC_SENTENCES, doc_id=doc_id)
+
+
+# ----------------- Helper: Near-duplicate emails (SimHash) -----------------
+_dedup_index = None
+_dedup_lock = threading.Lock()
+REUSED_FIELDS = ("summary", "keywords", "topics", "key_sentences", "youtube_videos", "web_resources")
+
+def get_dedup_index():
+    global _dedup_index
+    with _dedup_lock:
+        if _dedup_index is None:
+            os.makedirs(os.path.dirname(DEDUP_INDEX_PATH), exist_ok=True)
+            _dedup_index = SimHashIndex(DEDUP_INDEX_PATH, max_distance=DEDUP_MAX_DISTANCE)
+        return _dedup_index
+
+
+def canonical_key(source, attachment_texts):
+    """
+    Key of the earlier email `source` near-duplicates (a reply or forward quoting it), by
+    a SimHash of its body plus attachment text, or None when it is new (or has no id).
+    """
+    key = source.get("message_id") or source.get("id")
+    if not key:
+        return None
+    texts = [source.get("body") or "", *(t for t in attachment_texts if not t.startswith("[File not found"))]
+    with metrics.span("dedup"):
+        canonical = get_dedup_index().canonical_for(key, simhash("\n\n".join(texts)))
+    return canonical if canonical != key else None
+
+
+def find_duplicate(source, attachment_texts):
+    """(canonical key, its stored summary) when `source` duplicates an email summarized before, else None."""
+    canonical = canonical_key(source, attachment_texts)
+    stored = get_summary_store().get(canonical) if canonical else None
+    if stored is None:
+        return None
+    metrics.inc("duplicates")
+    return canonical, stored
+
+
+def reused_summary(canonical, stored, attachments):
+    return {**{name: stored.get(name) for name in REUSED_FIELDS}, "attachments": attachments,
+            "duplicate_of": canonical}
+
+
+# ----------------- Helper: Generate summary -----------------
+def summary_header(keywords, topics=()):
+    header = f"🧩 Summary based on keywords: {', '.join(keywords)}.\n"
+    if topics:
+        header += f"🏷️ Topics: {', '.join(topics)}.\n"
+    return header + "\n"
+
+
+def key_points(sentences):
+    if not sentences:
+        return ""
+    return "📝 Key points:\n" + "".join(f"- {sentence}\n" for sentence in sentences) + "\n"
+
+
+def attachment_highlights(attachment_texts):
+    combined_text = " ".join(attachment_texts)
+    if combined_text:
+        return "📄 Attachment Highlights:\n" + combined_text[:700] + "..."
+    return "No attachment content found."
+
+
+def generate_summary(keywords, attachment_texts, topics=None):
+    """Header plus key sentences; the raw attachment excerpt is only a fallback when none were found."""
+    if topics is None:
+        topics = extract_topics("", attachment_texts)
+    highlights = key_points(topics["key_sentences"]) or attachment_highlights(attachment_texts)
+    return summary_header(keywords, topics["keywords"]) + highlights
+
+
+# ----------------- Output store (one atomic file per summary) -----------------
+_summary_store = None
+
+def get_summary_store():
+    global _summary_store
+    if _summary_store is None:
+        _summary_store = OutputStore(OUTPUT_STORE_DIR, "summaries")
+    return _summary_store
+
+
+def save_summary(source, result):
+    """Store `result` under the email's Gmail id (or MCP1 id); returns the path relative to RESOURCE_DIR."""
+    key = source.get("message_id") or source.get("id") or str(uuid.uuid4())
+    with metrics.span("save"):
+        path = get_summary_store().put(key, result)
+    return os.path.relpath(path, RESOURCE_DIR)
+
+
+# ----------------- Enrichment client (pooled, async) -----------------
+_enrichment_client = None
+_enrichment_lock = threading.Lock()
+
+def get_enrichment_client():
+    global _enrichment_client
+    with _enrichment_lock:
+        if _enrichment_client is None:
+            cache = EnrichmentCache(ttl=ENRICH_CACHE_TTL, negative_ttl=ENRICH_CACHE_NEGATIVE_TTL,
+                                    max_entries=ENRICH_CACHE_MAX_ENTRIES, max_bytes=ENRICH_CACHE_MAX_BYTES,
+                                    disk_path=ENRICH_CACHE_PATH)
+            keys = api_keys()
+            _enrichment_client = EnrichmentClient(
+                keys["YOUTUBE_API_KEY"], keys["GOOGLE_CX"], base_url=keys["GOOGLE_API_BASE"],
+                total_timeout=ENRICH_TOTAL_TIMEOUT, request_timeout=ENRICH_REQUEST_TIMEOUT,
+                per_host_limit=ENRICH_PER_HOST_LIMIT, cache=cache, metrics=metrics)
+        return _enrichment_client
+
+
+def submit_enrichment(keywords, max_results=5):
+    """Start enrichment on the client loop and return a future, so other work can overlap it."""
+    client = get_enrichment_client()
+    return client.submit(client.enrich(keywords, max_results))
+
+
+# ----------------- Background warm-up -----------------
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+def warm_up():
+    """Load everything the first request would otherwise pay for: keys, topic model, HTTP loop, parser workers."""
+    for name, step in (("api keys", api_keys), ("topic model", get_topic_model),
+                       ("enrichment client", lambda: get_enrichment_client().start()),
+                       ("extraction workers", lambda: get_extractor().warm_up())):
         try:
-            resp = requests.get(url).json()
-            for item in resp.get("items", []):
-                web_resources.append({
-                    "title": item.get("title"),
-                    "url": item.get("link"),
-                    "snippet": item.get("snippet", "")
-                })
+            with metrics.span("warm_up", step=name):
+                step()
         except Exception as e:
-            print(f"⚠️ Web search error for '{kw}': {e}")
-    return web_resources[:max_results]
+            print(f"⚠️ Warm-up of {name} failed: {e}")
+
+
+def start_warm_up():
+    """Run warm_up once, in the background, so the server starts accepting requests right away."""
+    global _warm_up_started
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up, name="mcp2-warm-up", daemon=True).start()
 
 
 # ----------------- MCP Tool: Summarize context -----------------
 @mcp.tool()
 def summarize_context(payload: dict, ctx: Context[ServerSession, None]):
     ctx.info("📩 Received payload from MCP1.")
+    if "emails" in payload:
+        # MCP1's send_to_mcp2 posts {"emails": [...]}: handle it as a batch
+        return summarize_batch(payload, ctx)
+
     keywords = payload.get("keywords", [])
-    attachments = payload.get("attachments", [])
+    attachments = attachment_paths(payload.get("attachments"))
     ctx.info(f"🔑 Keywords received: {keywords}")
     ctx.info(f"📎 Attachments received: {attachments}")
 
-    attachment_texts = [extract_text_from_file(f) for f in attachments]
-    summary = generate_summary(keywords, attachment_texts)
-    youtube_videos = fetch_youtube_videos(keywords)
-    web_resources = fetch_web_resources(keywords)
+    attachment_texts = extract_texts(attachments)
+    index_attachments([(payload.get("message_id"), attachments)])
+    duplicate = find_duplicate(payload, attachment_texts)
+    if duplicate is not None:
+        # a reply / forward of an email already summarized: reuse it, no topics or enrichment calls
+        result = reused_summary(*duplicate, attachments)
+        saved_to = save_summary(payload, result)
+        ctx.info(f"♻️ Near-duplicate of {duplicate[0]}; reused its summary. Saved to {saved_to}.")
+        return result
+
+    enrichment_future = submit_enrichment(keywords)
+    topics = extract_topics(payload.get("body", ""), attachment_texts, payload.get("message_id") or payload.get("id"))
+    summary = generate_summary(keywords, attachment_texts, topics)
+    with metrics.span("enrich.wait"):
+        enrichment = enrichment_future.result()
+    youtube_videos = enrichment["youtube_videos"]
+    web_resources = enrichment["web_resources"]
 
     result = {
         "summary": summary,
         "keywords": keywords,
+        "topics": topics["keywords"],
+        "key_sentences": topics["key_sentences"],
         "attachments": attachments,
         "youtube_videos": youtube_videos,
         "web_resources": web_resources
     }
 
-    os.makedirs(RESOURCE_DIR, exist_ok=True)
-    with open(os.path.join(RESOURCE_DIR, "summary.json"), "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    saved_to = save_summary(payload, result)
 
-    ctx.info("✅ Summarization complete. Saved to summary.json.")
+    ctx.info(f"✅ Summarization complete. Saved to {saved_to}.")
     ctx.debug(result)
     return result
 
 
+# ----------------- MCP Tool: Summarize a batch of emails -----------------
+KEYWORD_STOPWORDS = {"meeting", "summary", "minutes", "discussion", "re", "fw", "fwd", "the", "and",
+                     "for", "with", "from", "about", "notes", "update", "this", "that", "our", "your"}
+
+def keywords_for_email(email, shared_keywords=()):
+    """Caller-supplied keywords, else significant words from the subject line."""
+    keywords = list(email.get("keywords") or [])
+    if not keywords:
+        for word in (email.get("subject") or "").replace(":", " ").split():
+            word = word.strip(".,;!?()[]\"'").lower()
+            if len(word) > 2 and word not in KEYWORD_STOPWORDS and word not in keywords:
+                keywords.append(word)
+        keywords = keywords[:5]
+    return list(dict.fromkeys([*shared_keywords, *keywords]))
+
+
+@mcp.tool()
+def summarize_batch(payload: dict, ctx: Context[ServerSession, None]):
+    """
+    Summarizes many emails in one call. Attachments and keyword sets shared across
+    the batch are extracted / enriched once, and the work for distinct ones runs concurrently.
+    Near-duplicates (replies / forwards quoting another email, in this batch or an
+    earlier one) reuse that email's summary instead of being analyzed and enriched again.
+    """
+    emails = [dict(email, attachments=attachment_paths(email.get("attachments"))) for email in payload.get("emails", [])]
+    shared_keywords = payload.get("keywords", [])
+    ctx.info(f"📦 Received batch of {len(emails)} emails.")
+
+    unique_attachments = list(dict.fromkeys(a for email in emails for a in email.get("attachments", [])))
+    texts = dict(zip(unique_attachments, extract_texts(unique_attachments)))
+    index_attachments((email.get("message_id"), email.get("attachments", [])) for email in emails)
+
+    # collapse near-duplicates onto their canonical email before anything is enriched
+    canonicals, in_batch, stored = [], {}, {}
+    for i, email in enumerate(emails):
+        canonical = canonical_key(email, [texts[a] for a in email.get("attachments", [])])
+        if canonical is not None and canonical not in in_batch and canonical not in stored:
+            stored[canonical] = get_summary_store().get(canonical)
+        if canonical is None or (canonical not in in_batch and stored.get(canonical) is None):
+            canonical = None
+            key = email.get("message_id") or email.get("id")
+            if key:
+                in_batch.setdefault(key, i)
+        canonicals.append(canonical)
+    distinct = [i for i, canonical in enumerate(canonicals) if canonical is None]
+
+    keywords_per_email = {i: keywords_for_email(emails[i], shared_keywords) for i in distinct}
+
+    # one enrichment per distinct keyword list; order matters (web search uses the first three),
+    # lists that only differ in order still share the cached YouTube lookup
+    unique_keyword_sets = {tuple(keywords) for keywords in keywords_per_email.values()}
+    enrichment_futures = {keywords: submit_enrichment(list(keywords)) for keywords in unique_keyword_sets}
+
+    with metrics.span("enrich.wait"):
+        enrichment = {keywords: future.result() for keywords, future in enrichment_futures.items()}
+
+    results = [None] * len(emails)
+    for i in distinct:
+        email, keywords = emails[i], keywords_per_email[i]
+        attachments = email.get("attachments", [])
+        attachment_texts = [texts[a] for a in attachments]
+        topics = extract_topics(email.get("body", ""), attachment_texts, email.get("message_id") or email.get("id"))
+        enriched = enrichment[tuple(keywords)]
+        results[i] = {
+            "id": email.get("id"),
+            "message_id": email.get("message_id"),
+            "subject": email.get("subject"),
+            "summary": generate_summary(keywords, attachment_texts, topics),
+            "keywords": keywords,
+            "topics": topics["keywords"],
+            "key_sentences": topics["key_sentences"],
+            "attachments": attachments,
+            "youtube_videos": enriched["youtube_videos"],
+            "web_resources": enriched["web_resources"],
+        }
+    for i, canonical in enumerate(canonicals):
+        if canonical is not None:
+            email = emails[i]
+            source = results[in_batch[canonical]] if canonical in in_batch else stored[canonical]
+            results[i] = {"id": email.get("id"), "message_id": email.get("message_id"), "subject": email.get("subject"),
+                          **reused_summary(canonical, source, email.get("attachments", []))}
+    if len(distinct) < len(emails):
+        metrics.inc("duplicates", len(emails) - len(distinct))
+
+    batch_result = {
+        "results": results,
+        "stats": {
+            "emails": len(emails),
+            "distinct_emails": len(distinct),
+            "unique_attachments": len(unique_attachments),
+            "unique_keyword_sets": len(unique_keyword_sets),
+        },
+    }
+
+    for result in results:
+        save_summary(result, result)
+
+    ctx.info(f"✅ Batch summarization complete for {len(results)} emails. Saved to {OUTPUT_STORE_DIR}.")
+    return batch_result
+
+
+# ----------------- MCP Tool: Enrichment cache stats -----------------
+@mcp.tool()
+def enrichment_cache_stats(ctx: Context[ServerSession, None]):
+    stats = get_enrichment_client().cache.stats()
+    ctx.info(f"Enrichment cache: {stats['hits']} hits / {stats['misses']} misses, {stats['entries']} entries.")
+    return stats
+
+
 # ----------------- MCP Tool: Receive from MCP1 -----------------
 @mcp.tool()
 def receive_emails(payload: dict, ctx: Context[ServerSession, None]):
@@ -197,6 +540,7 @@ def receive_emails(payload: dict, ctx: Context[ServerSession, None]):
 
 if __name__ == "__main__":
     print("Starting MCP2 Summarizer Service...")
+    start_warm_up()
     mcp.run()
 
 
@@ -236,19 +580,217 @@ class _ASGIContext:
         self._safe_print('[MCP2 ERROR]', *args, **kwargs)
 
 
-async def _read_body(receive):
-    body = b""
+async def _read_body(receive, content_length=None, max_size=MAX_REQUEST_BYTES):
+    """
+    The request body as a bytearray. With a Content-Length it is allocated once and
+    each chunk copied into place through a memoryview; otherwise it grows in place.
+    """
+    if content_length is not None and content_length > max_size:
+        raise wire.BodyTooLarge(f"request body exceeds {max_size} bytes")
+    body = bytearray(content_length or 0)
+    view = memoryview(body)
+    size = 0
     more_body = True
-    while more_body:
-        message = await receive()
-        if message.get("type") != "http.request":
-            break
-        body += message.get("body", b"")
-        more_body = message.get("more_body", False)
+    try:
+        while more_body:
+            message = await receive()
+            if message.get("type") != "http.request":
+                break
+            chunk = message.get("body", b"")
+            end = size + len(chunk)
+            if end > max_size:
+                raise wire.BodyTooLarge(f"request body exceeds {max_size} bytes")
+            if end <= len(body):
+                view[size:end] = chunk
+            else:
+                view.release()  # a longer body than announced: fall back to growing the buffer
+                body[size:] = chunk
+                view = memoryview(body)
+            size = end
+            more_body = message.get("more_body", False)
+    finally:
+        view.release()
+    del body[size:]
     return body
 
 
+# ----------------- Streaming summarization (NDJSON events) -----------------
+async def summarize_context_events(payload, ctx):
+    """
+    Yields the summarize_context result piece by piece: summary, attachment
+    highlights, YouTube videos, then web resources. Both lookups start as soon as
+    the attachments are read and the email is known not to duplicate an earlier
+    one, so the slow external APIs overlap the topic extraction; a near-duplicate
+    streams the earlier email's stored summary without any lookup.
+    """
+    if "emails" in payload:
+        yield {"event": "batch", **(await _asyncio.to_thread(summarize_batch, payload, ctx))}
+        return
+
+    keywords = payload.get("keywords", [])
+    attachments = attachment_paths(payload.get("attachments"))
+
+    header = summary_header(keywords)
+    yield {"event": "summary", "summary": header, "keywords": keywords}
+
+    attachment_texts = await _asyncio.to_thread(extract_texts, attachments)
+    index_attachments([(payload.get("message_id"), attachments)])
+    duplicate = await _asyncio.to_thread(find_duplicate, payload, attachment_texts)
+    if duplicate is not None:
+        result = reused_summary(*duplicate, attachments)
+        yield {"event": "attachments", "attachments": attachments, "highlights": key_points(result["key_sentences"]),
+               "topics": result["topics"], "key_sentences": result["key_sentences"], "duplicate_of": duplicate[0]}
+        for name in ("youtube_videos", "web_resources"):
+            yield {"event": name, name: result[name]}
+        yield {"event": "done", "saved_to": save_summary(payload, result), "duplicate_of": duplicate[0]}
+        return
+
+    lookups = get_enrichment_client().submit_lookups(keywords)
+    topics = await _asyncio.to_thread(extract_topics, payload.get("body", ""), attachment_texts,
+                                      payload.get("message_id") or payload.get("id"))
+    highlights = key_points(topics["key_sentences"]) or attachment_highlights(attachment_texts)
+    yield {"event": "attachments", "attachments": attachments, "highlights": highlights,
+           "topics": topics["keywords"], "key_sentences": topics["key_sentences"]}
+
+    result = {"summary": generate_summary(keywords, attachment_texts, topics), "keywords": keywords,
+              "topics": topics["keywords"], "key_sentences": topics["key_sentences"], "attachments": attachments}
+    for name in ("youtube_videos", "web_resources"):
+        with metrics.span("enrich.wait"):
+            result[name] = await _asyncio.wrap_future(lookups[name])
+        yield {"event": name, name: result[name]}
+
+    yield {"event": "done", "saved_to": save_summary(payload, result)}
+
+
+def _query_flag(scope, name):
+    query = scope.get("query_string", b"").decode("latin-1")
+    return any(part in (f"{name}=1", f"{name}=true") for part in query.split("&"))
+
+
+def _wants_stream(scope):
+    if _query_flag(scope, "stream"):
+        return True
+    headers = dict(scope.get("headers") or [])
+    return b"application/x-ndjson" in headers.get(b"accept", b"")
+
+
+def _wants_timings(scope):
+    headers = dict(scope.get("headers") or [])
+    return _query_flag(scope, "timings") or headers.get(TIMINGS_HEADER, b"") in (b"1", b"true")
+
+
+async def _with_timings(events, timings):
+    """Append the request's stage breakdown to the stream's final event."""
+    async for event in events:
+        if event.get("event") in ("done", "batch"):
+            event = {**event, "timings": timings.as_dict()}
+        yield event
+
+
+async def _send_ndjson(send, events):
+    """Chunked response, one JSON object per line, flushed as each event is ready."""
+    headers = [(b"content-type", b"application/x-ndjson; charset=utf-8")]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    try:
+        async for event in events:
+            line = json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+            await send({"type": "http.response.body", "body": line, "more_body": True})
+    except Exception as e:
+        # headers are already out, so report the failure in-band
+        line = json.dumps({"event": "error", "text": str(e)}, ensure_ascii=False).encode("utf-8") + b"\n"
+        await send({"type": "http.response.body", "body": line, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+_TOOL_ROUTES = {
+    "/tools/summarize_context": summarize_context,
+    "/tools/summarize_batch": summarize_batch,
+}
+
+
+def _route_label(method, path):
+    """Bounded label set for the request metrics (summary ids would explode cardinality)."""
+    if path in _TOOL_ROUTES or path in ("/cache/stats", "/metrics"):
+        return f"{method} {path}"
+    if path.startswith("/summaries/"):
+        return f"{method} /summaries/{{key}}"
+    return "other"
+
+
+def metrics_gauges():
+    gauges = {}
+    if _extractor is not None:
+        gauges["extract_cache_hits"] = _extractor.cache.hits
+        gauges["extract_cache_misses"] = _extractor.cache.misses
+    if _enrichment_client is not None and _enrichment_client.cache is not None:
+        stats = _enrichment_client.cache.stats()
+        for name in ("hits", "misses", "negative_hits", "evictions", "entries", "bytes",
+                     "pending_writes"):
+            gauges[f"enrichment_cache_{name}"] = stats[name]
+    if _dedup_index is not None:
+        stats = _dedup_index.stats()
+        gauges["dedup_messages"] = stats["messages"]
+        gauges["dedup_distinct"] = stats["distinct"]
+    return gauges
+
+
+def shutdown():
+    """
+    Stop the background workers and save the topic model. uvicorn re-raises SIGTERM once it has shut down, so the
+    process dies by the signal and atexit never runs: without this the extraction
+    worker processes would be left behind, still waiting for work.
+    """
+    if _index_executor is not None:
+        _index_executor.shutdown(wait=True, cancel_futures=True)
+    if _extractor is not None:
+        _extractor.shutdown()
+    if _enrichment_client is not None:
+        _enrichment_client.close()
+        if _enrichment_client.cache is not None:
+            _enrichment_client.cache.close()  # write out the pending cache rows
+    if _topic_model is not None:
+        _topic_model.save()  # up to save_every - 1 documents are not on disk yet
+
+
+async def _lifespan(receive, send):
+    """Answer uvicorn's startup at once; the warm-up continues in the background."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            start_warm_up()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await _asyncio.to_thread(shutdown)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
 async def app(scope, receive, send):
+    """Times every HTTP request per route and counts responses by status around _dispatch."""
+    if scope.get("type") == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope.get("type") != "http":
+        await _dispatch(scope, receive, send)
+        return
+
+    route = _route_label(scope.get("method", "GET").upper(), scope.get("path", ""))
+    status = 500
+
+    async def send_tracked(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        await send(message)
+
+    try:
+        with metrics.span("request", route=route):
+            await _dispatch(scope, receive, send_tracked)
+    finally:
+        metrics.inc("http_requests", route=route, status=status)
+
+
+async def _dispatch(scope, receive, send):
     # Only handle HTTP
     if scope.get("type") != "http":
         await send({"type": "http.response.start", "status": 404, "headers": []})
@@ -258,32 +800,71 @@ async def app(scope, receive, send):
     method = scope.get("method", "GET").upper()
     path = scope.get("path", "")
 
-    if method == "POST" and path == "/tools/summarize_context":
+    if method == "POST" and path in _TOOL_ROUTES:
         try:
-            body_bytes = await _read_body(receive)
-            if not body_bytes:
-                payload = {}
-            else:
-                payload = json.loads(body_bytes.decode("utf-8"))
+            headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers") or []}
+            length = headers.get("content-length")
+            body_bytes = await _read_body(receive, int(length) if length and length.isdigit() else None)
+            payload = wire.unpack(body_bytes, headers.get("content-type"), headers.get("content-encoding"),
+                                  max_size=MAX_REQUEST_BYTES)
 
             ctx = _ASGIContext()
 
-            # run summarization in a thread to avoid blocking event loop
-            result = await _asyncio.to_thread(summarize_context, payload, ctx)
-
-            body = json.dumps({"status": "success", "result": result}, ensure_ascii=False).encode("utf-8")
-            headers = [(b"content-type", b"application/json; charset=utf-8")]
-            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            with collect() as timings:
+                if path == "/tools/summarize_context" and _wants_stream(scope):
+                    events = summarize_context_events(payload, ctx)
+                    if _wants_timings(scope):
+                        events = _with_timings(events, timings)
+                    await _send_ndjson(send, events)
+                    return
+
+                # run summarization in a thread to avoid blocking event loop
+                result = await _asyncio.to_thread(_TOOL_ROUTES[path], payload, ctx)
+
+            response = {"status": "success", "result": result}
+            if _wants_timings(scope):
+                response["timings"] = timings.as_dict()
+            # msgpack / JSON and zstd / gzip / identity, as the caller's Accept headers allow
+            content_type, encoding = wire.negotiate(headers.get("accept"), headers.get("accept-encoding"))
+            body, response_headers = wire.pack(response, content_type, encoding)
+            response_headers["Vary"] = "Accept, Accept-Encoding"
+            response_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response_headers.items()]
+            await send({"type": "http.response.start", "status": 200, "headers": response_headers})
             await send({"type": "http.response.body", "body": body})
         except Exception as e:
-            # On error return 500 and the error text
-            err = {"status": "error", "code": 500, "text": str(e)}
+            # On error return 500 (413 for an oversized body, 415 for an unreadable format) and the error text
+            code = 413 if isinstance(e, wire.BodyTooLarge) else 415 if isinstance(e, wire.Unsupported) else 500
+            err = {"status": "error", "code": code, "text": str(e)}
             body = json.dumps(err, ensure_ascii=False).encode("utf-8")
             headers = [(b"content-type", b"application/json; charset=utf-8")]
-            await send({"type": "http.response.start", "status": 500, "headers": headers})
+            await send({"type": "http.response.start", "status": code, "headers": headers})
             await send({"type": "http.response.body", "body": body})
         return
 
+    if method == "GET" and path == "/metrics":
+        body = metrics.render(metrics_gauges()).encode("utf-8")
+        headers = [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8")]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return
+
+    if method == "GET" and path == "/cache/stats":
+        body = json.dumps(get_enrichment_client().cache.stats()).encode("utf-8")
+        headers = [(b"content-type", b"application/json; charset=utf-8")]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return
+
+    if method == "GET" and path.startswith("/summaries/"):
+        result = get_summary_store().get(path[len("/summaries/"):])
+        status = 200 if result is not None else 404
+        body = json.dumps(result if result is not None else {"status": "error", "code": 404},
+                          ensure_ascii=False).encode("utf-8")
+        headers = [(b"content-type", b"application/json; charset=utf-8")]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return
+
     # Unknown path
     await send({"type": "http.response.start", "status": 404, "headers": []})
     await send({"type": "http.response.body", "body": b"Not Found"})
@@ -0,0 +1,155 @@
+"""Local keyword and key-sentence extraction with incremental TF-IDF.
+
+Terms (unigrams and bigrams) are mapped into a fixed-size feature space with a
+stable hash, so there is no vocabulary to grow or rebuild. Document
+frequencies live in one NumPy array that is bumped once per email (a set of
+hashed message ids remembers which were counted) and persisted to an .npz file. Scoring an email only touches the entries for
+its own terms: its sentences become a small sparse sentence x term matrix
+over just those terms, weighted by their IDF, so the cost is proportional to
+the email's length rather than the corpus size. No network, no GPU.
+"""
+import hashlib, os, re, tempfile, threading, zlib
+import numpy as np
+from scipy import sparse
+
+DEFAULT_FEATURES = 1 << 20
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers herself him himself his how i if in into is it its itself just let me more most my myself
+no nor not now of off on once only or other our ours ourselves out over own same she should so some such
+than that the their theirs them themselves then there these they this those through to too under until up
+very was we were what when where which while who whom why will with would you your yours yourself
+yourselves hi hello thanks thank regards best please dear team re fw fwd cc sent subject
+""".split())
+
+_SENTENCES = re.compile(r'(?<=[.!?])\s+|\n\s*\n|\n(?=\s*[-*•\d]+[.)]?\s)')
+_WORDS = re.compile(r"[a-z][a-z0-9+#.'-]*[a-z0-9+#]|[a-z]")
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCES.split(text or "") if s and len(s.strip()) > 1]
+
+
+def tokenize(text):
+    """Lower-cased unigrams and adjacent bigrams, stopwords and 1-2 letter words dropped."""
+    words = [w for w in _WORDS.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _doc_key(doc_id):
+    return int.from_bytes(hashlib.blake2b(str(doc_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class TopicModel:
+    def __init__(self, path=None, n_features=DEFAULT_FEATURES, save_every=50):
+        self.path = path
+        self.n_features = n_features
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.n_docs = 0
+        self.seen = set()  # _doc_key of every message id already counted into df
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with np.load(self.path) as data:
+                if int(data['n_features']) == self.n_features:
+                    self.df = data['df'].astype(np.int32)
+                    self.n_docs = int(data['n_docs'])
+                    if 'seen' in data.files:
+                        self.seen = set(data['seen'].tolist())
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ Could not load topic model {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            df, n_docs = self.df.copy(), self.n_docs
+            seen = np.fromiter(self.seen, dtype=np.uint64, count=len(self.seen))
+            self._unsaved = 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, df=df, n_docs=n_docs, n_features=self.n_features, seen=seen)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def feature(self, term):
+        return zlib.crc32(term.encode('utf-8')) % self.n_features
+
+    def _matrix(self, sentences):
+        """
+        Sparse sentence x term counts over the email's own distinct features,
+        the hashed feature id of each column and the surface form of each term.
+        """
+        indptr, features, names = [0], [], {}
+        for sentence in sentences:
+            for term in tokenize(sentence):
+                idx = self.feature(term)
+                features.append(idx)
+                names.setdefault(idx, term)
+            indptr.append(len(features))
+        cols, local_idx = np.unique(np.asarray(features, dtype=np.int64), return_inverse=True)
+        m = sparse.csr_matrix((np.ones(len(features), dtype=np.float32), local_idx, indptr),
+                              shape=(len(sentences), len(cols)))
+        m.sum_duplicates()
+        return m, cols, [names[int(c)] for c in cols]
+
+    def analyze(self, text, top_k=8, n_sentences=3, update=True, doc_id=None):
+        """
+        {"keywords": [...], "key_sentences": [...]} for `text`. With `update`,
+        the text is counted into the document frequencies first, so it is
+        scored against the corpus it now belongs to; a `doc_id` that was
+        already counted (the same email summarized again) is not counted twice.
+        """
+        sentences = split_sentences(text)
+        if not sentences:
+            return {"keywords": [], "key_sentences": []}
+        m, cols, terms = self._matrix(sentences)
+        if not len(cols):
+            return {"keywords": [], "key_sentences": []}
+        with self._lock:
+            if update and doc_id is not None:
+                key = _doc_key(doc_id)
+                update = key not in self.seen
+                self.seen.add(key)
+            if update:
+                self.df[cols] += 1
+                self.n_docs += 1
+                self._unsaved += 1
+            idf = np.log((1.0 + self.n_docs) / (1.0 + self.df[cols])) + 1.0
+            save = bool(self.path) and update and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+        tf = np.asarray(m.sum(axis=0)).ravel()
+        weights = np.log1p(tf) * idf
+        keywords, covered = [], set()
+        for j in np.argsort(-weights, kind='stable'):
+            words = terms[j].split()
+            if len(words) > 1 and tf[j] < 2:
+                continue  # a one-off word pair is rarely a topic
+            if any(w in covered for w in words):
+                continue
+            keywords.append(terms[j])
+            covered.update(words)
+            if len(keywords) >= top_k:
+                break
+
+        # sum of distinct term weights over sqrt(#terms), so long sentences don't win by size alone
+        m.data[:] = 1.0
+        counts = np.asarray(m.sum(axis=1)).ravel()
+        scores = (m @ weights) / np.sqrt(np.maximum(counts, 1.0))
+        best = sorted(np.argsort(-scores, kind='stable')[:n_sentences])
+        key_sentences = [sentences[i] for i in best if scores[i] > 0]
+        return {"keywords": keywords, "key_sentences": key_sentences}
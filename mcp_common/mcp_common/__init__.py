@@ -0,0 +1 @@
+"""Modules both services import: metrics, the output store, the search index, the wire format and SimHash dedup."""
@@ -0,0 +1,125 @@
+"""Near-duplicate detection with SimHash and a banded (LSH) SQLite index.
+
+A reply or forward that quotes a meeting summary is, word for word, mostly the
+same text. `simhash` reduces a text to a 64-bit fingerprint over its word
+3-gram shingles, after dropping quote markers (`> `) and the header lines
+replies and forwards add ("On ... wrote:", "From:", "Subject:", ...), so the
+quoted copy lands within a few bits of the original.
+
+`SimHashIndex` stores one fingerprint per message key, split into eight 8-bit
+bands that are indexed separately: two fingerprints within 7 bits of each other
+agree on at least one band, so a lookup only compares against messages sharing
+a band instead of scanning everything. Every message is mapped to a canonical
+key, the first one seen of its near-duplicate group, so callers can reuse the
+work done for the canonical message.
+"""
+import hashlib, re, sqlite3, threading
+
+BITS = 64
+BANDS = 8              # 8 x 8 bits: a distance below BANDS guarantees a shared band
+MAX_DISTANCE = 6       # differing bits still counted as a near-duplicate (a short reply on top adds ~3-8)
+SHINGLE_WORDS = 3
+MIN_WORDS = 20         # shorter texts are too unstable to fingerprint
+_BAND_BITS = BITS // BANDS
+_WORD = re.compile(r"\w+")
+_QUOTE_MARKER = re.compile(r"^\s*(>\s*)+")
+_REPLY_HEADER = re.compile(r"^\s*(on\b.{0,200}\bwrote:|-+\s*(original|forwarded) message\s*-+|"
+                           r"(from|sent|to|cc|date|subject)\s*:.*)\s*$", re.IGNORECASE)
+
+
+# ----------------- Fingerprints -----------------
+def normalize(text):
+    """Lowercase words of `text` with quote markers and reply/forward header lines removed."""
+    words = []
+    for line in (text or "").splitlines():
+        line = _QUOTE_MARKER.sub("", line)
+        if _REPLY_HEADER.match(line):
+            continue
+        words.extend(_WORD.findall(line.lower()))
+    return words
+
+
+def simhash(text):
+    """64-bit SimHash of `text`'s word shingles, or None when it has fewer than MIN_WORDS words."""
+    words = normalize(text)
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = (" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+    bits = "".join(format(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+                   for s in shingles)
+    half = len(bits) // BITS / 2
+    # bits[i::64] is bit (63 - i) of every shingle hash; keep the bits set in most of them
+    return int("".join("1" if bits[i::BITS].count("1") > half else "0" for i in range(BITS)), 2)
+
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+
+def _bands(fp):
+    mask = (1 << _BAND_BITS) - 1
+    return [(fp >> (i * _BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def _signed(fp):
+    # SQLite integers are signed 64-bit
+    return fp - (1 << BITS) if fp >= 1 << (BITS - 1) else fp
+
+
+# ----------------- Index -----------------
+class SimHashIndex:
+    def __init__(self, path, max_distance=MAX_DISTANCE):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be below {BANDS} for the band index to find every match")
+        self.path = path
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                key TEXT PRIMARY KEY,
+                fp INTEGER NOT NULL,
+                canonical TEXT NOT NULL,
+                {", ".join(f"b{i} INTEGER NOT NULL" for i in range(BANDS))}
+            );
+            {"".join(f"CREATE INDEX IF NOT EXISTS fingerprints_b{i} ON fingerprints(b{i});" for i in range(BANDS))}
+        """)
+        self._conn.commit()
+
+    def _nearest(self, fp):
+        bands = _bands(fp)
+        rows = self._conn.execute(
+            f"SELECT key, fp, canonical FROM fingerprints WHERE {' OR '.join(f'b{i} = ?' for i in range(BANDS))}",
+            bands).fetchall()
+        best = None
+        for key, other, canonical in rows:
+            d = distance(fp, other % (1 << BITS))
+            if d <= self.max_distance and (best is None or d < best[1]):
+                best = (canonical, d)
+        return best
+
+    def canonical_for(self, key, fp):
+        """
+        The canonical key of `key`'s near-duplicate group, recording `key` on first sight:
+        `key` itself when nothing stored is within `max_distance` bits (or `fp` is None).
+        A key keeps the canonical it was first given.
+        """
+        if fp is None:
+            return key
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT canonical FROM fingerprints WHERE key = ?", (key,)).fetchone()
+            if row:
+                return row[0]
+            match = self._nearest(fp)
+            canonical = match[0] if match else key
+            self._conn.execute(f"INSERT INTO fingerprints VALUES (?, ?, ?, {', '.join('?' * BANDS)})",
+                               (key, _signed(fp), canonical, *_bands(fp)))
+            return canonical
+
+    def stats(self):
+        with self._lock:
+            total, groups = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT canonical) FROM fingerprints").fetchone()
+        return {"messages": total, "distinct": groups, "duplicates": total - groups}
@@ -0,0 +1,192 @@
+"""In-process latency histograms, counters and per-request timing breakdowns.
+
+`metrics.span("extract", kind="pdf")` times a block into a histogram keyed by
+stage + labels (fixed Prometheus buckets for `_bucket/_sum/_count`, plus a
+bounded reservoir of recent samples for p50/p95/p99) and counts exceptions.
+`render()` produces the Prometheus text exposition format.
+
+`collect()` opts one request into a timing breakdown: every span that runs in
+its context (including `asyncio.to_thread` calls and coroutines wrapped with
+`bind`) is also added to the request's own totals.
+"""
+import contextvars, threading, time
+from collections import deque
+from contextlib import contextmanager
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+RESERVOIR_SIZE = 1024  # most recent samples per series used for quantiles
+
+_current = contextvars.ContextVar('metrics_request_timings', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class RequestTimings:
+    """Per-request totals: {"stage[:label...]": {"ms": total, "count": n}}."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"ms": 0.0, "count": 0})
+            entry["ms"] += seconds * 1000
+            entry["count"] += 1
+
+    def as_dict(self):
+        with self._lock:
+            stages = {k: {"ms": round(v["ms"], 2), "count": v["count"]} for k, v in self.stages.items()}
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 2), "stages": stages}
+
+
+class Metrics:
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._histograms = {}   # (stage, labels) -> Histogram
+        self._counters = {}     # (name, labels) -> float
+
+    # ----------------- Recording -----------------
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(seconds)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(':'.join([stage, *(str(v) for _, v in key[1])]), seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc('stage_errors', stage=stage, **labels)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    # ----------------- Reading -----------------
+    def snapshot(self):
+        """JSON-friendly view: per-series count/sum/p50/p95/p99 in ms, plus counters."""
+        with self._lock:
+            stages = {}
+            for (stage, labels), hist in self._histograms.items():
+                name = stage + _labels(labels)
+                q = hist.quantiles()
+                stages[name] = {"count": hist.count, "sum_ms": round(hist.sum * 1000, 2),
+                                **{f"p{int(k * 100)}_ms": round(v * 1000, 2) for k, v in q.items()}}
+            counters = {name + _labels(labels): value for (name, labels), value in self._counters.items()}
+        return {"stages": stages, "counters": counters}
+
+    def render(self, gauges=None):
+        """Prometheus text format; `gauges` adds {name: value} or {name: {labels_tuple: value}} samples."""
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            quantiles = {key: hist.quantiles() for key, hist in histograms}
+
+        lines += [f'# HELP {ns}_stage_duration_seconds Time spent per pipeline stage / external call.',
+                  f'# TYPE {ns}_stage_duration_seconds histogram']
+        for (stage, labels), hist in histograms:
+            base = [('stage', stage), *labels]
+            cumulative = 0
+            for bound, count in zip(BUCKETS, hist.counts):
+                cumulative += count
+                lines.append(f'{ns}_stage_duration_seconds_bucket{_labels(base, [("le", bound)])} {cumulative}')
+            lines.append(f'{ns}_stage_duration_seconds_bucket{_labels(base, [("le", "+Inf")])} {hist.count}')
+            lines.append(f'{ns}_stage_duration_seconds_sum{_labels(base)} {hist.sum:.6f}')
+            lines.append(f'{ns}_stage_duration_seconds_count{_labels(base)} {hist.count}')
+
+        lines += [f'# HELP {ns}_stage_latency_seconds Recent-sample quantiles per stage.',
+                  f'# TYPE {ns}_stage_latency_seconds summary']
+        for (stage, labels), hist in histograms:
+            base = [('stage', stage), *labels]
+            for q, value in quantiles[(stage, labels)].items():
+                lines.append(f'{ns}_stage_latency_seconds{_labels(base, [("quantile", q)])} {value:.6f}')
+            lines.append(f'{ns}_stage_latency_seconds_sum{_labels(base)} {hist.sum:.6f}')
+            lines.append(f'{ns}_stage_latency_seconds_count{_labels(base)} {hist.count}')
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {ns}_{name}_total counter')
+            lines.append(f'{ns}_{name}_total{_labels(labels)} {value}')
+
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE {ns}_{name} gauge')
+            samples = value.items() if isinstance(value, dict) else [((), value)]
+            for labels, sample in samples:
+                lines.append(f'{ns}_{name}{_labels(labels)} {sample}')
+        return '\n'.join(lines) + '\n'
+
+
+# ----------------- Per-request breakdown -----------------
+@contextmanager
+def collect():
+    """Record every span in this context into a fresh RequestTimings."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+async def _bound(coro, timings):
+    token = _current.set(timings)
+    try:
+        return await coro
+    finally:
+        _current.reset(token)
+
+
+def bind(coro):
+    """Carry the caller's request timings into a coroutine scheduled on another thread's loop."""
+    timings = _current.get()
+    return coro if timings is None else _bound(coro, timings)
@@ -0,0 +1,107 @@
+"""Atomic, sharded JSON output store with an append-only JSONL index.
+
+Each record is written to `<root>/<kind>/<sha1(key)[:2]>/<key>.json` through a
+temp file + os.replace, so readers never see a half-written file and
+concurrent writers can't clobber each other's records. Every write appends
+one line to `<root>/<kind>/index.jsonl`; listing and streaming reads walk that
+index instead of loading one ever-growing JSON document.
+"""
+import hashlib, json, os, re, tempfile, threading, time
+
+_SAFE_KEY = re.compile(r'[^A-Za-z0-9._-]')
+
+
+class OutputStore:
+    def __init__(self, root, kind):
+        self.root = root
+        self.kind = kind
+        self.base = os.path.join(root, kind)
+        self.index_path = os.path.join(self.base, 'index.jsonl')
+        self._lock = threading.Lock()
+        os.makedirs(self.base, exist_ok=True)
+
+    def path_for(self, key):
+        safe = _SAFE_KEY.sub('_', str(key))
+        shard = hashlib.sha1(str(key).encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.base, shard, safe + '.json')
+
+    # ----------------- Writes -----------------
+    def put(self, key, record):
+        """Atomically write `record` under `key` and append it to the index. Returns the path."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        entry = json.dumps({'key': str(key), 'path': os.path.relpath(path, self.root), 'ts': time.time()})
+        with self._lock:
+            # one short line per write with O_APPEND, so lines from other processes never interleave
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(entry + '\n')
+        return path
+
+    # ----------------- Reads -----------------
+    def get(self, key, default=None):
+        try:
+            with open(self.path_for(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def iter_index(self):
+        """Index entries oldest first, one line at a time; rewritten keys appear once per write."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def tail(self, n=10, block_size=64 * 1024):
+        """Last `n` index entries, newest first, reading the index backwards from its end."""
+        try:
+            f = open(self.index_path, 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            f.seek(0, os.SEEK_END)
+            pos, data = f.tell(), b''
+            while pos > 0 and data.count(b'\n') <= n:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        lines = [line for line in data.split(b'\n') if line.strip()]
+        if pos > 0:
+            lines = lines[1:]  # first line may be cut in half
+        return [json.loads(line) for line in reversed(lines[-n:])]
+
+    def keys(self, newest_first=False, limit=None):
+        """Distinct keys in write order (last write wins)."""
+        seen = {}
+        for entry in self.iter_index():
+            seen.pop(entry['key'], None)
+            seen[entry['key']] = entry['ts']
+        keys = list(seen)
+        if newest_first:
+            keys.reverse()
+        return keys[:limit] if limit is not None else keys
+
+    def iter_records(self, newest_first=False, limit=None):
+        """Stream (key, record) pairs without loading more than one record at a time."""
+        for key in self.keys(newest_first=newest_first, limit=limit):
+            record = self.get(key)
+            if record is not None:
+                yield key, record
+
+    def latest(self):
+        for entry in self.tail(1):
+            return self.get(entry['key'])
+        return None
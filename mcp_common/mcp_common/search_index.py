@@ -0,0 +1,287 @@
+"""Local full-text index over processed mail (SQLite FTS5).
+
+Both services open the same file (resources/search.sqlite3): MCP1 indexes
+subject, sender, recipients and body as messages are parsed, MCP2 adds the
+extracted attachment text once it has parsed the attachments (a message MCP2
+gets to first is filed under date 0 until MCP1 indexes it).
+
+`docs` holds one row per Gmail message id; `docs_fts` is an external-content
+FTS5 table over it kept current by triggers. Row ids are date-ordered
+(internal date in ms << 20, plus a hash of the id), so a date range is a rowid
+range the FTS index can seek to, "newest first" needs no sort, and ranked
+queries can cheaply limit BM25 scoring to the newest `rank_candidates`
+matches instead of every document containing a common word.
+"""
+import calendar, re, sqlite3, threading, time, zlib
+
+FIELDS = ('subject', 'sender', 'recipients', 'body', 'attachments')
+FIELD_WEIGHTS = (5.0, 3.0, 1.0, 1.0, 0.5)  # bm25 weights, in FIELDS order
+SNIPPET_TOKENS = 12
+RANK_CANDIDATES = 2000  # newest matches scored by BM25; None ranks every match
+DATE_SHIFT = 20          # rowid = internal_date << DATE_SHIFT | id hash
+
+_TERM = re.compile(r'(?:(\w+):)?("[^"]*"|[^\s"]+)')
+_FTS_OPTIONS = (f"{', '.join(FIELDS)}, content='docs', content_rowid='rowid', "
+                f"tokenize='porter unicode61', prefix='2 3'")
+
+
+def to_epoch_ms(value):
+    """Epoch milliseconds for an int/float (ms) or an ISO date / datetime string (UTC)."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%Y/%m/%d'):
+        try:
+            return calendar.timegm(time.strptime(value.rstrip('Z'), fmt)) * 1000
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value!r}")
+
+
+def date_rowid(epoch_ms):
+    return int(epoch_ms) << DATE_SHIFT
+
+
+def to_match_query(text):
+    """
+    Turn a free-text query into an FTS5 MATCH expression. Words are ANDed and
+    quoted (so punctuation can't break the syntax), "quoted phrases" are kept,
+    a trailing * makes a prefix search and `field:word` limits a word to one of
+    FIELDS (`from:` is an alias for sender).
+    """
+    terms = []
+    for field, term in _TERM.findall(text or ''):
+        prefix = term.endswith('*') and not term.startswith('"')
+        term = term.strip('"').rstrip('*').replace('"', '')
+        if not term.strip():
+            continue
+        expr = f'"{term}"' + ('*' if prefix else '')
+        field = {'from': 'sender', 'to': 'recipients'}.get(field.lower(), field.lower())
+        if field in FIELDS:
+            expr = f'{field} : {expr}'
+        elif field:
+            expr = f'"{field}:{term}"'
+        terms.append(expr)
+    return ' '.join(terms)
+
+
+class SearchIndex:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS docs (
+                rowid INTEGER PRIMARY KEY,
+                message_id TEXT UNIQUE NOT NULL,
+                internal_date INTEGER NOT NULL DEFAULT 0,
+                subject TEXT NOT NULL DEFAULT '',
+                sender TEXT NOT NULL DEFAULT '',
+                recipients TEXT NOT NULL DEFAULT '',
+                body TEXT NOT NULL DEFAULT '',
+                attachments TEXT NOT NULL DEFAULT '',
+                account_id TEXT NOT NULL DEFAULT ''
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5({_FTS_OPTIONS});
+            CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+                INSERT INTO docs_fts(rowid, {', '.join(FIELDS)})
+                VALUES (new.rowid, {', '.join('new.' + f for f in FIELDS)});
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+                INSERT INTO docs_fts(docs_fts, rowid, {', '.join(FIELDS)})
+                VALUES ('delete', old.rowid, {', '.join('old.' + f for f in FIELDS)});
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE ON docs BEGIN
+                INSERT INTO docs_fts(docs_fts, rowid, {', '.join(FIELDS)})
+                VALUES ('delete', old.rowid, {', '.join('old.' + f for f in FIELDS)});
+                INSERT INTO docs_fts(rowid, {', '.join(FIELDS)})
+                VALUES (new.rowid, {', '.join('new.' + f for f in FIELDS)});
+            END;
+        """)
+        self._migrate()
+        self._conn.execute("INSERT INTO docs_fts(docs_fts, rank) VALUES ('rank', ?)",
+                           (f"bm25({', '.join(map(str, FIELD_WEIGHTS))})",))
+        self._conn.commit()
+
+    def _migrate(self):
+        """Bring a file written by an older copy of this module up to the current layout."""
+        fts_sql = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'docs_fts'").fetchone()[0]
+        if "prefix='2 3'" not in fts_sql:
+            self._conn.execute('DROP TABLE docs_fts')
+            self._conn.execute(f'CREATE VIRTUAL TABLE docs_fts USING fts5({_FTS_OPTIONS})')
+            self._conn.execute("INSERT INTO docs_fts(docs_fts) VALUES ('rebuild')")
+        self._conn.execute('DROP INDEX IF EXISTS docs_date')  # date ranges are rowid ranges now
+        if 'account_id' not in [row[1] for row in self._conn.execute('PRAGMA table_info(docs)')]:
+            # rows from before accounts were recorded stay unowned until `adopt`ed or indexed again
+            self._conn.execute("ALTER TABLE docs ADD COLUMN account_id TEXT NOT NULL DEFAULT ''")
+        self._conn.execute('CREATE INDEX IF NOT EXISTS docs_account ON docs(account_id)')
+        # rows inserted with an auto rowid sit among the newest ones; move them to their date's slot
+        misplaced = self._conn.execute(
+            f'SELECT rowid, message_id, internal_date FROM docs WHERE rowid >> {DATE_SHIFT} != internal_date').fetchall()
+        for rowid, message_id, internal_date in misplaced:
+            self._conn.execute('UPDATE docs SET rowid = ? WHERE rowid = ?',
+                               (self._rowid_for(message_id, internal_date), rowid))
+
+    # ----------------- Writes -----------------
+    def _rowid_for(self, message_id, internal_date):
+        rowid = date_rowid(internal_date) | (zlib.crc32(message_id.encode('utf-8')) & ((1 << DATE_SHIFT) - 1))
+        while self._conn.execute('SELECT 1 FROM docs WHERE rowid = ?', (rowid,)).fetchone():
+            rowid += 1  # same millisecond and hash bucket, probe the next slot
+        return rowid
+
+    def _upsert(self, message_id, internal_date, fields):
+        """Insert or update one row, moving it to a new rowid when its date changes."""
+        row = self._conn.execute('SELECT rowid, internal_date FROM docs WHERE message_id = ?',
+                                 (message_id,)).fetchone()
+        if internal_date is None:
+            internal_date = row[1] if row else 0
+        sets = ', '.join(f'{name} = ?' for name in fields)
+        if row is None:
+            names = ', '.join(['rowid', 'message_id', 'internal_date', *fields])
+            self._conn.execute(f"INSERT INTO docs ({names}) VALUES ({', '.join('?' * (len(fields) + 3))})",
+                               (self._rowid_for(message_id, internal_date), message_id, internal_date,
+                                *fields.values()))
+        elif row[1] != internal_date:
+            self._conn.execute(f'UPDATE docs SET rowid = ?, internal_date = ?, {sets} WHERE rowid = ?',
+                               (self._rowid_for(message_id, internal_date), internal_date,
+                                *fields.values(), row[0]))
+        else:
+            self._conn.execute(f'UPDATE docs SET {sets} WHERE rowid = ?', (*fields.values(), row[0]))
+
+    def add_records(self, records, account_id=None):
+        """
+        Index parsed message records (the MailStore/parse_message shape) of mailbox `account_id`;
+        attachment text is kept.
+        """
+        count = 0
+        with self._lock, self._conn:
+            for rec in records:
+                headers = rec.get('headers', {})
+                fields = {
+                    'subject': headers.get('Subject', ''),
+                    'sender': headers.get('From', ''),
+                    'recipients': ' '.join(filter(None, [headers.get('To', ''), headers.get('Cc', '')])),
+                    'body': rec.get('body') or '',
+                }
+                if account_id is not None:
+                    fields['account_id'] = account_id
+                self._upsert(rec['message_id'], int(rec.get('internal_date') or 0), fields)
+                count += 1
+        return count
+
+    def adopt(self, message_ids, account_id):
+        """
+        Give the unowned rows among `message_ids` (indexed before accounts were recorded)
+        to `account_id`; every unowned row when `message_ids` is None.
+        """
+        if message_ids is None:
+            with self._lock, self._conn:
+                return self._conn.execute("UPDATE docs SET account_id = ? WHERE account_id = ''",
+                                          (account_id,)).rowcount
+        ids = list(message_ids)
+        count = 0
+        with self._lock, self._conn:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                count += self._conn.execute(
+                    f"UPDATE docs SET account_id = ? WHERE account_id = '' "
+                    f"AND message_id IN ({', '.join('?' * len(chunk))})", (account_id, *chunk)).rowcount
+        return count
+
+    def set_attachment_text(self, items):
+        """Store extracted attachment text for (message_id, text) pairs."""
+        count = 0
+        with self._lock, self._conn:
+            for message_id, text in items:
+                if message_id:
+                    self._upsert(message_id, None, {'attachments': text or ''})
+                    count += 1
+        return count
+
+    def delete(self, message_ids):
+        ids = list(message_ids)
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM docs WHERE message_id = ?', [(i,) for i in ids])
+        return len(ids)
+
+    def optimize(self):
+        """Merge FTS segments; worth running after a large backfill."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO docs_fts(docs_fts) VALUES ('optimize')")
+
+    # ----------------- Reads -----------------
+    def search(self, query='', after=None, before=None, order='rank', limit=20, offset=0,
+               rank_candidates=RANK_CANDIDATES, account_id=None):
+        """
+        Matching messages as dicts (message_id, internal_date, subject, sender,
+        snippet, score). `after`/`before` bound the message date (epoch ms or
+        ISO date, `before` exclusive); `order` is 'rank' (BM25) or 'date'.
+        With `account_id`, only that mailbox's messages are searched.
+        Ranked queries score only the newest `rank_candidates` matches.
+        Without a query the newest messages in the date range are returned,
+        with score None.
+        """
+        after, before = to_epoch_ms(after), to_epoch_ms(before)
+        if before is not None and after is None:
+            after = 1  # rows of unknown date (0: attachment text MCP2 indexed first) match no date range
+        match = to_match_query(query)
+        # the account lives in docs, so a scoped full-text query joins it to every FTS match
+        source, rowid = 'docs_fts', 'rowid'
+        if match and account_id is not None:
+            source, rowid = 'docs_fts JOIN docs d ON d.rowid = docs_fts.rowid', 'docs_fts.rowid'
+        clauses, params = [], []
+        if account_id is not None:
+            clauses.append('account_id = ?')
+            params.append(account_id)
+        if after is not None:
+            clauses.append(f'{rowid} >= ?')
+            params.append(date_rowid(after))
+        if before is not None:
+            clauses.append(f'{rowid} < ?')
+            params.append(date_rowid(before))
+        keys = ('message_id', 'internal_date', 'subject', 'sender', 'snippet', 'score')
+
+        with self._lock:
+            if not match:
+                where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+                rows = self._conn.execute(
+                    f"SELECT message_id, internal_date, subject, sender, substr(body, 1, 120), NULL "
+                    f"FROM docs {where} ORDER BY rowid DESC LIMIT ? OFFSET ?", (*params, limit, offset)).fetchall()
+                return [dict(zip(keys, row)) for row in rows]
+
+            where = ' AND '.join(['docs_fts MATCH ?', *clauses])
+            params = [match, *params]
+            if order == 'rank' and rank_candidates:
+                cut = self._conn.execute(
+                    f'SELECT {rowid} FROM {source} WHERE {where} ORDER BY {rowid} DESC LIMIT 1 OFFSET ?',
+                    (*params, rank_candidates - 1)).fetchone()
+                if cut:
+                    where += f' AND {rowid} >= ?'
+                    params.append(cut[0])
+            # pick the page (rowid + rank only), then build snippets for just those rows
+            hits = self._conn.execute(
+                f"SELECT {rowid}, rank FROM {source} WHERE {where} "
+                f"ORDER BY {'rank' if order == 'rank' else rowid + ' DESC'} LIMIT ? OFFSET ?",
+                (*params, limit, offset)).fetchall()
+            if not hits:
+                return []
+            rows = self._conn.execute(
+                f"SELECT docs_fts.rowid, d.message_id, d.internal_date, d.subject, d.sender, "
+                f"snippet(docs_fts, -1, '[', ']', '…', {SNIPPET_TOKENS}) "
+                f"FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid "
+                f"WHERE docs_fts MATCH ? AND docs_fts.rowid IN ({', '.join('?' * len(hits))})",
+                (match, *(rowid for rowid, _ in hits))).fetchall()
+        by_rowid = {row[0]: row[1:] for row in rows}
+        # bm25 is lower-is-better; flip it so callers see higher = more relevant
+        return [dict(zip(keys, by_rowid[rowid]), score=round(-score, 4)) for rowid, score in hits]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
@@ -0,0 +1,171 @@
+"""Wire format for the MCP1 -> MCP2 hand-off: content negotiation and compression.
+
+Bodies are JSON (serialized with orjson when it is installed, else the stdlib)
+or msgpack (when `msgpack` is installed), picked from Content-Type / Accept,
+and optionally compressed with gzip or zstd (when `zstandard` is installed)
+according to Content-Encoding / Accept-Encoding. Bodies below
+`COMPRESS_MIN_BYTES` are sent uncompressed. Decompression is bounded by
+`max_size`, so a small compressed request cannot expand without limit.
+
+Attachments travel as content-hash references, {"sha256": ..., "ext": ".pdf"},
+pointing into MCP1's content-addressed blob store; `attachment_path` turns one
+back into the blob path relative to the resource dir (plain paths from older
+senders pass through unchanged).
+"""
+import gzip, json, os, re, zlib
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 1          # fastest level: most of the size win for a fraction of the CPU
+ZSTD_LEVEL = 3
+BLOB_DIR = "blobs"
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+_EXT = re.compile(r"^(\.[A-Za-z0-9]{1,10})?$")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+class Unsupported(ValueError):
+    """A Content-Type / Content-Encoding this side can't read (answered with 415)."""
+
+
+# ----------------- Formats -----------------
+def formats():
+    """Supported media types, preferred first."""
+    return [MSGPACK, JSON] if msgpack is not None else [JSON]
+
+
+def _default(value):
+    # numpy scalars and arrays from the topic model
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def encode(obj, content_type=JSON):
+    if content_type == MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True, default=_default)
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def decode(data, content_type=JSON):
+    """Parse a bytes-like body (bytes, bytearray or memoryview) without copying it first where possible."""
+    if not data:
+        return {}
+    if content_type == MSGPACK:
+        if msgpack is None:
+            raise Unsupported("msgpack bodies are not supported here (msgpack is not installed)")
+        return msgpack.unpackb(data, raw=False)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def media_type(header):
+    """`application/json; charset=utf-8` -> `application/json` (JSON when absent)."""
+    value = header.split(";", 1)[0].strip().lower() if header else ""
+    return MSGPACK if value in (MSGPACK, "application/x-msgpack") else JSON
+
+
+# ----------------- Compression -----------------
+def encodings():
+    """Supported content codings, preferred first."""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def compress(data, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return data
+
+
+def decompress(data, encoding, max_size=None):
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("", "identity"):
+        return data
+    limit = max_size + 1 if max_size else -1
+    if encoding == "zstd":
+        if zstandard is None:
+            raise Unsupported("zstd bodies are not supported here (zstandard is not installed)")
+        out = zstandard.ZstdDecompressor().stream_reader(bytes(data)).read(limit)
+    elif encoding in ("gzip", "x-gzip"):
+        out = zlib.decompressobj(wbits=31).decompress(data, max(limit, 0))
+    else:
+        raise Unsupported(f"Unsupported Content-Encoding: {encoding}")
+    if max_size and len(out) > max_size:
+        raise BodyTooLarge(f"decompressed body exceeds {max_size} bytes")
+    return out
+
+
+# ----------------- Negotiation -----------------
+def _accepted(header):
+    """Names from an Accept / Accept-Encoding header, without those sent with q=0."""
+    names = []
+    for item in (header or "").split(","):
+        name, *params = [p.strip().lower() for p in item.split(";")]
+        if name and not any(p.replace(" ", "") in ("q=0", "q=0.0") for p in params):
+            names.append(name)
+    return names
+
+
+def negotiate(accept, accept_encoding):
+    """(content type, encoding or None) for a response, given the request's Accept headers."""
+    accepted = _accepted(accept)
+    content_type = MSGPACK if msgpack is not None and (MSGPACK in accepted or "application/x-msgpack" in accepted) \
+        else JSON
+    accepted_encodings = _accepted(accept_encoding)
+    encoding = next((e for e in encodings() if e in accepted_encodings), None)
+    return content_type, encoding
+
+
+def pack(obj, content_type=JSON, encoding=None, min_size=COMPRESS_MIN_BYTES):
+    """Serialize (and maybe compress) `obj`; returns (body, headers as {name: value})."""
+    body = encode(obj, content_type)
+    headers = {"Content-Type": content_type + ("; charset=utf-8" if content_type == JSON else "")}
+    if encoding and len(body) >= min_size:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return body, headers
+
+
+def unpack(data, content_type=None, encoding=None, max_size=None):
+    return decode(decompress(data, encoding, max_size), media_type(content_type))
+
+
+# ----------------- Attachment references -----------------
+def attachment_ref(stored):
+    """Reference for one of MCP1's stored attachments (its blob path when the extension can't be referenced)."""
+    ext = os.path.splitext(stored.get("filename") or "")[1].lower()
+    if stored.get("sha256") and _EXT.match(ext):
+        return {"sha256": stored["sha256"], "ext": ext}
+    return stored.get("relative_path")
+
+
+def attachment_path(ref):
+    """Blob path (relative to the resource dir) for a content-hash reference; plain path strings pass through."""
+    if isinstance(ref, str):
+        return ref
+    sha, ext = str(ref.get("sha256", "")).lower(), ref.get("ext") or ""
+    if not _SHA256.match(sha) or not _EXT.match(ext):
+        raise ValueError(f"Invalid attachment reference: {ref!r}")
+    return os.path.join(BLOB_DIR, sha[:2], sha + ext.lower())
@@ -0,0 +1,17 @@
+"""Neither server may import a heavy library (numpy, PyPDF2, googleapiclient, ...) at module load.
+
+Each import runs in a fresh interpreter from the server's folder, like the start commands in the README;
+benchmarks/bench_startup.py measures the timings around the same probe.
+"""
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from bench_startup import DEFERRED, SERVERS, probe  # noqa: E402
+
+
+@pytest.mark.parametrize('module', sorted(SERVERS))
+def test_server_import_defers_heavy_libraries(module):
+    loaded = probe(module, SERVERS[module])['loaded']
+    assert loaded == [], f"{module} imports {', '.join(loaded)} at module load (deferred: {', '.join(DEFERRED)})"